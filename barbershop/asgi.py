@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'barbershop.settings')
+# Асинхронные версии представлений (barbershop/urls_async.py); BARBERSHOP_ASYNC_VIEWS=0 - только синхронные
+os.environ.setdefault('BARBERSHOP_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -74,7 +74,9 @@ MIDDLEWARE = [
     "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
-ROOT_URLCONF = "barbershop.urls"
+# Под ASGI (barbershop/asgi.py) часть публичных представлений - асинхронные (core/async_views.py)
+ASYNC_VIEWS = os.getenv("BARBERSHOP_ASYNC_VIEWS", "0") == "1"
+ROOT_URLCONF = "barbershop.urls_async" if ASYNC_VIEWS else "barbershop.urls"
 
 TEMPLATES = [
     {
@@ -103,10 +105,95 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # WAL: читатели не блокируют писателя и наоборот.
+        # IMMEDIATE: транзакция сразу берет блокировку на запись - параллельные записи
+        # ждут своей очереди (timeout, сек.), а не падают с "database is locked" на середине.
+        "OPTIONS": {
+            "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL",
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
     }
 }
 
 
+# Кеш
+# По умолчанию - локальный кеш процесса: блоки главной страницы, AJAX-ответы и т.п.
+# читаются без обращения к БД. Версии закешированных данных (core/cache_versions.py)
+# хранятся в БД и видны всем процессам, поэтому локальный кеш не устаревает.
+# REDIS_URL - один общий кеш для всех процессов (меньше промахов после перезапуска).
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Сколько секунд процесс помнит прочитанные версии кеша - за это время изменение,
+# сделанное в другом процессе, становится видно
+CACHE_VERSIONS_LOCAL_TTL = 2
+
+# Время жизни закешированных блоков главной страницы (сек).
+# Ключи версионные, поэтому изменения мастеров и услуг видны сразу
+LANDING_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Время жизни кешированных JSON-ответов AJAX-эндпоинтов мастеров (core/ajax_cache.py).
+# Ключи тоже версионные - по мастеру и по услугам
+AJAX_CACHE_TIMEOUT = 60 * 60
+# Максимум мастеров в одном запросе пакетного эндпоинта api/masters-info/
+MASTER_INFO_BATCH_MAX = 50
+# Сериализатор JSON-ответов (core/json_response.py): core.json_response.fast_dumps - orjson,
+# если установлен, иначе стандартный json; core.json_response.stdlib_dumps - всегда стандартный
+JSON_RESPONSE_DUMPS = os.getenv("JSON_RESPONSE_DUMPS", "core.json_response.fast_dumps")
+
+# Как часто (сек) буфер просмотров мастеров сбрасывается в Master.view_count
+VIEW_COUNT_FLUSH_INTERVAL = 10
+
+# Учет уникальных посетителей страниц мастеров (core/unique_viewers.py)
+UNIQUE_VIEWERS_PERIOD = 60 * 60 * 24 * 14  # Период фильтра Блума (сек), как время жизни сессии
+UNIQUE_VIEWERS_BLOOM_CAPACITY = 10000  # На сколько посетителей за период рассчитан фильтр
+UNIQUE_VIEWERS_BLOOM_ERROR_RATE = 0.01  # Вероятность ложного "уже смотрел"
+UNIQUE_VIEWERS_HLL_PRECISION = 11  # 2^11 регистров = 2 КБ на мастера, погрешность ~2.3%
+
+# Поиск заказов (core/order_search.py): сколько лучших совпадений ранжируется при sort=relevance
+ORDER_SEARCH_MAX_RANKED = 500
+
+# Список заказов (курсорная пагинация, core/pagination.py)
+# Показывать оценку количества заказов без фильтра (по диапазону id, без COUNT)
+ORDERS_LIST_ESTIMATED_TOTAL = True
+
+# Запись к мастерам (core/availability.py)
+BOOKING_DAY_START_HOUR = 10  # Начало рабочего дня (час, по TIME_ZONE)
+BOOKING_DAY_END_HOUR = 21  # Конец рабочего дня
+BOOKING_WORKDAYS = (0, 1, 2, 3, 4, 5, 6)  # Рабочие дни недели (0 - понедельник)
+BOOKING_SLOT_STEP_MINUTES = 15  # Шаг сетки свободных слотов
+BOOKING_DEFAULT_DURATION_MINUTES = 20  # Длительность записи без услуг (как Service.duration по умолчанию)
+BOOKING_MAX_ORDER_HOURS = 8  # Максимальная длительность одной записи - насколько раньше периода искать заказы
+BOOKING_MAX_DAYS = 14  # Максимальный период одного запроса свободного времени
+
+# Массовая смена статусов заказов (core/order_status.py): заказов в одной транзакции
+ORDER_STATUS_CHUNK_SIZE = 1000
+
+# Выгрузка заказов (core/order_export.py): строк, читаемых из БД за одну пачку
+ORDERS_EXPORT_CHUNK_SIZE = 2000
+
+# Архивация закрытых заказов (core/archive.py, manage.py archive_orders)
+ORDER_ARCHIVE_AFTER_DAYS = 180  # Сколько дней закрытый заказ хранится в рабочей таблице
+ORDER_ARCHIVE_BATCH_SIZE = 500  # Заказов в одной транзакции
+ORDER_ARCHIVE_PAUSE_SECONDS = 0.2  # Пауза между пачками, чтобы не мешать живым запросам
+
+# Базовый отчет проверки планов запросов (manage.py check_query_plans)
+QUERY_PLANS_BASELINE = BASE_DIR / "query_plans_baseline.json"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -224,10 +311,42 @@ MISTRAL_MODERATIONS_GRADES = {
     "pii": 0.1,  # личная информация
 }
 
+# Пакетная модерация отзывов (manage.py moderate_reviews)
+# Путь к классификатору: core.mistral.MistralModerationClassifier - Mistral API,
+# core.mistral.KeywordModerationClassifier - локальный, без сети (для тестов)
+REVIEW_MODERATION_CLASSIFIER = os.getenv(
+    "REVIEW_MODERATION_CLASSIFIER", "core.mistral.MistralModerationClassifier"
+)
+REVIEW_MODERATION_BATCH_SIZE = 32  # Сколько отзывов отправлять одним запросом
+REVIEW_MODERATION_POLL_INTERVAL = 10  # Пауза (сек), когда новых отзывов нет
+REVIEW_MODERATION_LEASE_SECONDS = 300  # Через сколько отзыв "зависшей" пачки снова доступен воркеру
+# Кеш вердиктов модерации: LRU в памяти процесса + таблица ModerationVerdict в БД
+MODERATION_CACHE_MAXSIZE = 10000  # Максимум вердиктов в памяти процесса
+MODERATION_CACHE_TTL = 60 * 60  # Время жизни вердикта в памяти (сек)
+MODERATION_CACHE_DB_TTL = 60 * 60 * 24 * 30  # Время жизни вердикта в БД (30 дней)
+
 AUTH_USER_MODEL = "users.User"
 
 TELEGRAM_BOT_API_KEY = os.getenv("TELEGRAM_BOT_API_KEY")
 TELEGRAM_USER_ID = os.getenv("TELEGRAM_USER_ID")
+# Уведомления без явного чата рассылаются во все чаты из TELEGRAM_USER_ID (через запятую)
+TELEGRAM_CHAT_IDS = [chat_id.strip() for chat_id in (TELEGRAM_USER_ID or "").split(",") if chat_id.strip()]
+
+# Лимиты Telegram для отправителя (core.telegram_bot.TelegramSender)
+TELEGRAM_GLOBAL_RATE = 30  # Сообщений в секунду на бота
+TELEGRAM_CHAT_RATE = 1  # Сообщений в секунду в один личный чат
+TELEGRAM_GROUP_RATE = 20 / 60  # Сообщений в секунду в одну группу (20 в минуту)
+TELEGRAM_CONNECTION_POOL_SIZE = 16  # Размер пула HTTP-соединений воркера
+
+# Очередь уведомлений Telegram (TelegramOutbox + manage.py telegram_worker)
+TELEGRAM_OUTBOX_BATCH_SIZE = 20  # Сколько сообщений воркер забирает за раз (не больше, чем успеет за аренду)
+TELEGRAM_OUTBOX_POLL_INTERVAL = 5  # Пауза (сек), когда очередь пуста
+TELEGRAM_OUTBOX_MAX_ATTEMPTS = 8  # После стольких неудач сообщение помечается как failed
+TELEGRAM_OUTBOX_BACKOFF_SECONDS = 10  # Базовая задержка перед повтором (удваивается)
+TELEGRAM_OUTBOX_BACKOFF_MAX_SECONDS = 3600  # Максимальная задержка перед повтором
+TELEGRAM_OUTBOX_LEASE_SECONDS = 120  # Через сколько "зависшее" сообщение снова доступно воркеру
+TELEGRAM_DIGEST_WINDOW_SECONDS = 30  # Окно, за которое уведомления о заказах склеиваются в сводку
+TELEGRAM_MESSAGE_MAX_LENGTH = 4096  # Ограничение Telegram на длину сообщения
 
 AUTH_USER_MODEL = "users.User"
 
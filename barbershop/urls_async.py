@@ -0,0 +1,11 @@
+# barbershop/urls_async.py
+# Корневые маршруты для ASGI (settings.ROOT_URLCONF при BARBERSHOP_ASYNC_VIEWS=1):
+# главная и маршруты core - с асинхронными представлениями, остальное - из barbershop/urls.py
+from django.urls import path, include
+from core.async_views import AsyncLandingPageView
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("", AsyncLandingPageView.as_view(), name="landing"),
+    path("barbershop/", include("core.urls_async")),
+] + sync_urlpatterns
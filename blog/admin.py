@@ -1,9 +1,13 @@
 from django.contrib import admin
 
-from django.contrib import admin
 from .models import Category, Tag, Post, Comment
 
 admin.site.register(Category)
 admin.site.register(Tag)
 admin.site.register(Post)
-admin.site.register(Comment)
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    # __str__ комментария выводит заголовок поста - без JOIN это запрос на каждую строку
+    list_select_related = ("post",)
@@ -8,57 +8,127 @@ form — можно указать свою форму (ModelForm) с любым
 readonly_fields — позволяет сделать поле только для чтения (например, для отображения картинки или вычисляемого значения).
 """
 
-from django.contrib import admin
-from .models import Order, Master, Service, Review
+from django import forms
+from django.contrib import admin, messages
+from django.db.models import Q
+from django.utils import timezone
+from .models import Order, Master, Service, Review, TelegramOutbox, OrderStatusLog, ArchivedOrder
+from .order_status import log_status_change, transition_orders
+from .availability import get_order_duration
+from .reservations import SlotTakenError, resync_order_slots
+from .unique_viewers import get_unique_viewers
+from .phones import is_phone_like, phone_prefix_q
 
 # Регистрация в одну строку
 admin.site.register(Service)
 
+class PhoneSearchMixin:
+    """
+    Поиск по телефону в админке через индекс нормализованной колонки phone_digits.
+    Если строка поиска похожа на телефон - ищем по префиксу номера (диапазон по индексу),
+    иначе - обычный поиск по search_fields (телефона в них нет, LIKE по нему не нужен).
+    """
+    def get_search_results(self, request, queryset, search_term):
+        if search_term and is_phone_like(search_term):
+            return queryset.filter(phone_prefix_q(search_term)), False
+        return super().get_search_results(request, queryset, search_term)
+
+
 # Класс OrderAdmin для кастомизации админки для модели Order
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(PhoneSearchMixin, admin.ModelAdmin):
     # Список отображаемых полей в админке
     list_display = ("client_name", "phone", "status", "appointment_date", "master")
     # Редактируемые поля в админке
     list_editable = ("status", "master")
     filter_horizontal = ("services",)
     autocomplete_fields = ("master",)
-    # Поля, по которым можно будет искать
-    search_fields = ("client_name", "phone", "comment")
+    # Поля, по которым можно будет искать (телефон ищется через PhoneSearchMixin)
+    search_fields = ("client_name", "comment")
     # Фильтры которые Django сделает автоматически сбоку
     list_filter = ("status", "master", "appointment_date")
 
     # Нередактируемые поля в админке
     readonly_fields = ("date_created", "date_updated")
-
+    # master может быть пустым (null=True), а select_related() без аргументов такие FK не подтягивает
+    list_select_related = ("master",)
 
     list_per_page = 25
     actions = ("make_approved", "make_not_approved", "make_spam", "make_completed", "make_canceled")
 
-    # Кастомные действия 
+    # Кастомные действия. Статус меняется пачками с проверкой допустимости перехода
+    # и записью в журнал OrderStatusLog (core/order_status.py)
+    def apply_status(self, request, queryset, new_status):
+        """Переводит выбранные заказы в new_status и сообщает, сколько удалось перевести"""
+        result = transition_orders(queryset, new_status, user=request.user)
+        status_name = dict(Order.STATUS_CHOICES)[new_status]
+        self.message_user(request, f"Переведено в статус \"{status_name}\": {result.changed}", messages.SUCCESS)
+        if result.rejected:
+            self.message_user(
+                request, f"Пропущено (переход в \"{status_name}\" недопустим): {result.rejected}", messages.WARNING
+            )
+
     @admin.action(description="Подтвердить")
     def make_approved(self, request, queryset):
         """Метод для подтверждения выбранных заказов"""
-        queryset.update(status="approved")
+        self.apply_status(request, queryset, "approved")
 
     @admin.action(description="Не подтвержденные")
     def make_not_approved(self, request, queryset):
         """Метод для перевода выбранных заказов в статус "Не подтвержденные" """
-        queryset.update(status="not_approved")
+        self.apply_status(request, queryset, "not_approved")
 
     @admin.action(description="Спам")
     def make_spam(self, request, queryset):
         """Метод для перевода выбранных заказов в статус "Спам" """
-        queryset.update(status="spam")
+        self.apply_status(request, queryset, "spam")
 
     @admin.action(description="Завершить")
     def make_completed(self, request, queryset):
         """Метод для завершения выбранных заказов"""
-        queryset.update(status="completed")
+        self.apply_status(request, queryset, "completed")
 
     @admin.action(description="Отменить")
     def make_canceled(self, request, queryset):
         """Метод для отмены выбранных заказов"""
-        queryset.update(status="canceled")
+        self.apply_status(request, queryset, "canceled")
+
+    def get_changelist_form(self, request, **kwargs):
+        """
+        Форма строки списка. Виджет автодополнения мастера делает запрос за выбранным
+        мастером в каждой строке, поэтому в списке мастер выбирается обычным select
+        с вариантами, загруженными одним запросом на страницу.
+        """
+        form_class = super().get_changelist_form(request, **kwargs)
+        # Мастеров немного - сортируем по имени в Python, без сортировки во временном B-дереве SQLite
+        masters = sorted(((master.pk, str(master)) for master in Master.objects.order_by()), key=lambda choice: choice[1])
+        master_choices = [("", "---------"), *masters]
+
+        class OrderChangelistForm(form_class):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                # Виджет обернут в RelatedFieldWidgetWrapper (ссылки на добавление и изменение мастера)
+                self.fields["master"].widget.widget = forms.Select(choices=master_choices)
+
+        return OrderChangelistForm
+
+    def save_model(self, request, obj, form, change):
+        """Смену статуса через форму или list_editable тоже записываем в журнал"""
+        super().save_model(request, obj, form, change)
+        if change:
+            log_status_change(obj, getattr(obj, "_loaded_status", None), user=request.user)
+        if not change or {"status", "master", "appointment_date", "services"} & set(form.changed_data):
+            # Бронь времени мастера следует за статусом, мастером и временем записи
+            services = form.cleaned_data.get("services")
+            if services is None:
+                services = obj.services.all()
+            try:
+                resync_order_slots(obj, get_order_duration(services))
+            except SlotTakenError:
+                self.message_user(
+                    request,
+                    f"Заказ #{obj.pk} сохранен, но время мастера уже занято другим заказом - бронь не создана",
+                    messages.WARNING,
+                )
 
 
 # Класс для кастомного фильтра для фильтрации по рейтингу мастера
@@ -79,43 +149,33 @@ class RatingFilter(admin.SimpleListFilter):
             ('perfect', '⭐⭐⭐⭐⭐'),
         )
     
+    # Условия фильтрации по денормализованной колонке avg_rating (core/ratings.py) -
+    # обычный WHERE по строке мастера, без JOIN и GROUP BY по отзывам
+    RATING_BUCKETS = {
+        'no_rating': Q(avg_rating=0),
+        'low': Q(avg_rating__gt=0, avg_rating__lt=3),
+        'medium': Q(avg_rating__gte=3, avg_rating__lt=4),
+        'high': Q(avg_rating__gte=4, avg_rating__lt=5),
+        'perfect': Q(avg_rating=5),
+    }
+
     def queryset(self, request, queryset):
         """Логика фильтрации мастеров по выбранному значению"""
         # Если не выбран фильтр, возвращаем все записи
-        if not self.value():
+        if self.value() not in self.RATING_BUCKETS:
             return queryset
-            
-        # Получаем всех мастеров
-        filtered_masters = []
-        
-        # Фильтруем мастеров в зависимости от выбранного значения
-        for master in queryset:
-            rating = master.avg_rating()
-            
-            if self.value() == 'no_rating' and rating == 0:
-                filtered_masters.append(master.pk)
-            elif self.value() == 'low' and 0 < rating < 3:
-                filtered_masters.append(master.pk)
-            elif self.value() == 'medium' and 3 <= rating < 4:
-                filtered_masters.append(master.pk)
-            elif self.value() == 'high' and 4 <= rating < 5:
-                filtered_masters.append(master.pk)
-            elif self.value() == 'perfect' and rating == 5:
-                filtered_masters.append(master.pk)
-        
-        # Возвращаем отфильтрованный queryset
-        return queryset.filter(pk__in=filtered_masters)
+        return queryset.filter(self.RATING_BUCKETS[self.value()])
 
 
-class MasterAdmin(admin.ModelAdmin):
+class MasterAdmin(PhoneSearchMixin, admin.ModelAdmin):
     # Список полей, которые будут отображаться в админке в виде таблицы (в этом же порядке!)
     list_display = ("first_name", "last_name", "phone", "experience",  "avg_rating_display", "is_active")
     # Кликабельные поля - имя и фамилия мастера
     list_display_links = ("first_name", "last_name")
     # Фильтры которые Django сделает автоматически сбоку
     list_filter = ("is_active", "services", "experience", RatingFilter)
-    # Поля, по которым можно будет искать
-    search_fields = ("first_name", "last_name", "phone")
+    # Поля, по которым можно будет искать (телефон ищется через PhoneSearchMixin)
+    search_fields = ("first_name", "last_name")
     # Порядок сортировки
     ordering = ("last_name", "first_name")
     # Редактируемые поля в админке (не должны быть в list_display_links)
@@ -126,17 +186,21 @@ class MasterAdmin(admin.ModelAdmin):
     list_per_page = 25
 
     # Кастомизация детального представления мастера
-    readonly_fields = ("view_count",)
+    readonly_fields = ("view_count", "unique_viewers_display", "published_review_count", "avg_rating")
     # Поле многие ко многим для услуг мастера 
     filter_horizontal = ("services",)
 
+    @admin.display(description="Уникальных посетителей (≈)")
+    def unique_viewers_display(self, obj) -> int:
+        """Приблизительное число уникальных посетителей страницы мастера (HyperLogLog)"""
+        return get_unique_viewers(obj.pk)
 
     # Какое название будет у поля в админке
-    @admin.display(description="Средняя оценка")
+    @admin.display(description="Средняя оценка", ordering="avg_rating")
     def avg_rating_display(self, obj) -> str:
         """Форматированное отображение средней оценки"""
-        # Obj = Экземпляр модели Master
-        rating = obj.avg_rating()
+        # Obj = Экземпляр модели Master, оценка - из колонки avg_rating (core/ratings.py)
+        rating = obj.avg_rating
         if 0 < rating < 1:
             return "🎃"
         elif 1 <= rating < 2:
@@ -168,4 +232,69 @@ class MasterAdmin(admin.ModelAdmin):
     # Регистрация модели Master с кастомной админкой
 admin.site.register(Master, MasterAdmin)
 # Регистрация модели Order с кастомной админкой
-admin.site.register(Order, OrderAdmin)
\ No newline at end of file
+admin.site.register(Order, OrderAdmin)
+
+
+class TelegramOutboxAdmin(admin.ModelAdmin):
+    """Просмотр очереди уведомлений Telegram"""
+    list_display = ("id", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("message", "last_error")
+    readonly_fields = ("attempts", "last_error", "delivered_chat_ids", "created_at", "sent_at")
+    list_per_page = 50
+    actions = ("retry_now",)
+
+    @admin.action(description="Повторить отправку сейчас")
+    def retry_now(self, request, queryset):
+        """
+        Возвращает в очередь с немедленной отправкой только неудачные уведомления:
+        исчерпавшие попытки (failed) и ждущие повтора после ошибки.
+        Отправленные и арендованные воркером (processing) не трогаем - иначе сообщение уйдет дважды.
+        """
+        retryable = Q(status="failed") | Q(status="pending", attempts__gt=0)
+        skipped = queryset.exclude(retryable).count()
+        updated = queryset.filter(retryable).update(status="pending", attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f"Возвращено в очередь: {updated}", messages.SUCCESS)
+        if skipped:
+            self.message_user(
+                request, f"Пропущено (отправлены или отправляются сейчас): {skipped}", messages.WARNING
+            )
+
+
+admin.site.register(TelegramOutbox, TelegramOutboxAdmin)
+
+
+class OrderStatusLogAdmin(admin.ModelAdmin):
+    """Журнал смен статусов заказов - только для чтения"""
+    list_display = ("order_id", "old_status", "new_status", "changed_by", "changed_at")
+    list_filter = ("new_status", "old_status")
+    search_fields = ("=order_id",)
+    list_select_related = ("changed_by",)
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(OrderStatusLog, OrderStatusLogAdmin)
+
+
+class ArchivedOrderAdmin(PhoneSearchMixin, admin.ModelAdmin):
+    """Архив закрытых заказов (core/archive.py) - только для чтения"""
+    list_display = ("id", "client_name", "phone", "status", "appointment_date", "master", "archived_at")
+    list_filter = ("status",)
+    search_fields = ("=id", "client_name")
+    list_select_related = ("master",)
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
@@ -0,0 +1,128 @@
+"""
+Кеш JSON-ответов AJAX-эндпоинтов мастеров с условными GET-запросами.
+
+Форма заказа запрашивает услуги и карточку мастера при каждом выборе мастера,
+и почти все такие запросы - повторные. Ответ зависит только от мастера и от
+услуг, поэтому он кешируется целиком (готовые байты JSON) под ключом с версиями
+"master:<id>" и "services" (core/cache_versions.py). Версии сдвигают сигналы
+Master, Master.services и Service - устаревший ключ просто перестает использоваться.
+
+Из тех же версий получаются ETag и Last-Modified. Запрос с совпадающим
+If-None-Match / If-Modified-Since получает 304 по версиям, которые процесс
+уже помнит, - без запросов к БД и без чтения самого ответа.
+
+Асинхронные функции acached_* делают то же через асинхронный API кеша
+для представлений core/async_views.py (ASGI).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .cache_versions import aget_versions, get_versions
+from .json_response import get_dumps
+from .service_index import SERVICE_INDEX_VERSION
+
+SERVICES_VERSION = "services"
+CACHE_KEY_PREFIX = "ajax:"
+
+
+def master_version_name(master_id: int) -> str:
+    """Имя версии данных одного мастера"""
+    return f"master:{master_id}"
+
+
+def cached_master_json(request, view_name: str, master_id: int, build) -> HttpResponse:
+    """
+    Ответ view_name для мастера master_id из кеша или от build().
+    build() возвращает (данные, HTTP-статус) и вызывается только при промахе кеша.
+    """
+    return cached_masters_json(request, view_name, [master_id], build)
+
+
+def cached_masters_json(request, view_name: str, master_ids: list[int], build) -> HttpResponse:
+    """
+    То же для набора мастеров (пакетный эндпоинт): недостающие в памяти версии
+    мастеров читаются одним запросом, ответ устаревает при изменении любого из них.
+    """
+    versions = get_versions(*_version_names(master_ids))
+    cache_key, etag, last_modified = _get_validators(view_name, versions)
+    not_modified = _get_not_modified(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    cached = cache.get(cache_key)
+    if cached is None:
+        cached = _serialize(*build())
+        cache.set(cache_key, cached, settings.AJAX_CACHE_TIMEOUT)
+    return _build_response(cached, etag, last_modified)
+
+
+async def acached_master_json(request, view_name: str, master_id: int, build) -> HttpResponse:
+    """Асинхронная версия cached_master_json: build - корутина (core/async_views.py)"""
+    return await acached_masters_json(request, view_name, [master_id], build)
+
+
+async def acached_masters_json(request, view_name: str, master_ids: list[int], build) -> HttpResponse:
+    """Асинхронная версия cached_masters_json - те же ключи кеша и ETag"""
+    versions = await aget_versions(*_version_names(master_ids))
+    cache_key, etag, last_modified = _get_validators(view_name, versions)
+    not_modified = _get_not_modified(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    cached = await cache.aget(cache_key)
+    if cached is None:
+        cached = _serialize(*await build())
+        await cache.aset(cache_key, cached, settings.AJAX_CACHE_TIMEOUT)
+    return _build_response(cached, etag, last_modified)
+
+
+def _version_names(master_ids: list[int]) -> list[str]:
+    # Услуги в ответах берутся из индекса (core/service_index.py) - его версия сдвигается
+    # после коммита, и ответ, собранный до коммита по старому индексу, тоже устареет
+    return [master_version_name(master_id) for master_id in master_ids] + [SERVICES_VERSION, SERVICE_INDEX_VERSION]
+
+
+def _get_validators(view_name: str, versions: dict[str, int]) -> tuple[str, str, int]:
+    """Ключ кеша, ETag и Last-Modified по версиям данных"""
+    # Ключ кеша и ETag - хеш имени представления и версий мастеров (длина ключа не растет с пачкой)
+    digest = hashlib.md5(f"{view_name}:{versions}".encode()).hexdigest()
+    cache_key = f"{CACHE_KEY_PREFIX}{view_name}:{digest}"
+    # Версия - время изменения в микросекундах (core/cache_versions.py)
+    last_modified = max(versions.values()) // 1_000_000
+    return cache_key, f'"{digest}"', last_modified
+
+
+def _get_not_modified(request, etag: str, last_modified: int) -> HttpResponse | None:
+    """Ответ 304, если у клиента актуальная копия"""
+    if request.method not in ("GET", "HEAD"):
+        return None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is None:
+        return None
+    return _with_validators(not_modified, etag, last_modified)
+
+
+def _serialize(data, status: int) -> tuple[bytes, int]:
+    """То, что хранится в кеше: готовые байты JSON (core/json_response.py) и HTTP-статус"""
+    return get_dumps()(data), status
+
+
+def _build_response(cached: tuple[bytes, int], etag: str, last_modified: int) -> HttpResponse:
+    content, status = cached
+    response = HttpResponse(content, status=status, content_type="application/json")
+    if status == 200:
+        _with_validators(response, etag, last_modified)
+    return response
+
+
+def _with_validators(response: HttpResponse, etag: str, last_modified: int) -> HttpResponse:
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    # Браузер хранит ответ, но каждый раз перепроверяет его условным запросом
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,271 @@
+"""
+Аналитика заказов по дневным срезам.
+
+Вопросы вида "сколько заказов по статусам, мастерам, услугам и дням" и "какая
+выручка" раньше требовали агрегации по всей таблице заказов. Теперь ответы берутся
+из дневных срезов OrderDailyRollup (день, статус, мастер) и ServiceDailyRollup
+(день, статус, услуга): за годы работы это тысячи строк вместо миллионов заказов.
+
+Срезы поддерживаются инкрементально, в той же транзакции, что и изменение заказа:
+сигналы (core/signals.py) собирают RollupDelta - на сколько заказов и рублей
+сдвигается каждая затронутая строка среза, - и apply() выполняет
+UPDATE ... SET orders = orders + ?, revenue = revenue + ? только для этих строк.
+Новый заказ, смена статуса, мастера или дня создания переносят вклад заказа
+между строками, добавление и удаление услуг меняют выручку. Массовые переходы
+статусов (queryset.update, без сигналов) переносят вклад своих заказов явно,
+см. core/order_status.py. Архивные заказы (core/archive.py) остаются в срезах,
+поэтому архивация статистику не меняет.
+
+Выручка считается по текущей Service.price: изменение цены сдвигает выручку всех
+дней, где есть заказы с этой услугой (один агрегат по заказам услуги). Полный
+пересчет (rebuild_rollups, manage.py rebuild_order_rollups) нужен только после
+загрузки заказов в обход сигналов (bulk_create, прямой SQL).
+"""
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import ArchivedOrder, Master, Order, OrderDailyRollup, Service, ServiceDailyRollup
+
+logger = logging.getLogger(__name__)
+
+# Блок rollups_unchanged (свой для каждого потока)
+_state = threading.local()
+
+ZERO = Value(Decimal("0"), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def get_order_day(created: datetime) -> date:
+    """День заказа в срезах - локальная дата создания"""
+    return timezone.localtime(created).date()
+
+
+def _totals():
+    return defaultdict(lambda: [0, Decimal("0")])
+
+
+def _aggregate(orders) -> tuple[dict, dict]:
+    """
+    Суммы заказов queryset: {(день, статус, мастер): [заказов, выручка]}
+    и {(день, статус, услуга): [заказов, выручка]} - двумя агрегатами.
+    """
+    order_totals, service_totals = _totals(), _totals()
+    orders = orders.annotate(day=TruncDate("date_created", tzinfo=timezone.get_current_timezone())).order_by()
+    for row in orders.values("day", "status", "master_id").annotate(
+        orders=Count("pk", distinct=True),
+        revenue=Coalesce(Sum("services__price"), ZERO),
+    ):
+        _add(order_totals[row["day"], row["status"], row["master_id"]], row)
+    for row in orders.filter(services__isnull=False).values("day", "status", "services").annotate(
+        orders=Count("pk"),
+        revenue=Sum("services__price"),
+    ):
+        _add(service_totals[row["day"], row["status"], row["services"]], row)
+    return order_totals, service_totals
+
+
+def _add(total: list, row: dict) -> None:
+    total[0] += row["orders"]
+    total[1] += row["revenue"]
+
+
+def rebuild_rollups(date_from: date, date_to: date) -> int:
+    """
+    Пересчитывает срезы за дни [date_from, date_to] включительно одной транзакцией.
+    Учитываются и рабочие, и архивные заказы (core/archive.py). Возвращает число строк срезов.
+    """
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(date_from, time.min, tzinfo=tz)
+    end = datetime.combine(date_to + timedelta(days=1), time.min, tzinfo=tz)
+    order_totals, service_totals = _totals(), _totals()
+    for model in (Order, ArchivedOrder):
+        model_orders, model_services = _aggregate(model.objects.filter(date_created__gte=start, date_created__lt=end))
+        for key, (orders, revenue) in model_orders.items():
+            _add(order_totals[key], {"orders": orders, "revenue": revenue})
+        for key, (orders, revenue) in model_services.items():
+            _add(service_totals[key], {"orders": orders, "revenue": revenue})
+
+    order_rows = [
+        OrderDailyRollup(day=day, status=status, master_id=master_id, orders=orders, revenue=revenue)
+        for (day, status, master_id), (orders, revenue) in order_totals.items()
+    ]
+    service_rows = [
+        ServiceDailyRollup(day=day, status=status, service_id=service_id, orders=orders, revenue=revenue)
+        for (day, status, service_id), (orders, revenue) in service_totals.items()
+    ]
+    with transaction.atomic():
+        OrderDailyRollup.objects.filter(day__gte=date_from, day__lte=date_to).delete()
+        ServiceDailyRollup.objects.filter(day__gte=date_from, day__lte=date_to).delete()
+        OrderDailyRollup.objects.bulk_create(order_rows, batch_size=1000)
+        ServiceDailyRollup.objects.bulk_create(service_rows, batch_size=1000)
+    return len(order_rows) + len(service_rows)
+
+
+@contextmanager
+def rollups_unchanged():
+    """
+    Внутри блока изменения заказов не сдвигают срезы. Для операций, которые
+    заведомо не меняют срезы, - например, перенос заказов в архив.
+    """
+    previous = rollups_suppressed()
+    _state.suppressed = True
+    try:
+        yield
+    finally:
+        _state.suppressed = previous
+
+
+def rollups_suppressed() -> bool:
+    return getattr(_state, "suppressed", False)
+
+
+class RollupDelta:
+    """Сдвиги строк срезов: {(день, статус, мастер или услуга): [заказов, выручка]}"""
+
+    def __init__(self):
+        self.orders = _totals()
+        self.services = _totals()
+
+    def add_order(self, key: tuple, prices: dict, sign: int = 1) -> None:
+        """
+        Заказ целиком входит в строку среза key = (день, статус, мастер) (sign=-1 - выходит из нее).
+        prices - {id услуги: цена} услуг заказа.
+        """
+        self.orders[key][0] += sign
+        self.add_services(key, prices, sign)
+
+    def add_services(self, key: tuple, prices: dict, sign: int = 1) -> None:
+        """Услуги prices добавлены в заказ со строкой среза key (sign=-1 - убраны из него)"""
+        day, status, _ = key
+        for service_id, price in prices.items():
+            self.orders[key][1] += sign * price
+            total = self.services[day, status, service_id]
+            total[0] += sign
+            total[1] += sign * price
+
+    def add_totals(self, order_totals: dict, service_totals: dict, status: str | None = None, sign: int = 1) -> None:
+        """Суммы из _aggregate(); status - учесть их в строках другого статуса"""
+        for target, totals in ((self.orders, order_totals), (self.services, service_totals)):
+            for (day, row_status, key), (orders, revenue) in totals.items():
+                total = target[day, status or row_status, key]
+                total[0] += sign * orders
+                total[1] += sign * revenue
+
+    def apply(self) -> None:
+        """UPDATE только затронутых строк срезов; недостающие строки создаются"""
+        if rollups_suppressed():
+            return
+        for model, key_field, deltas in (
+            (OrderDailyRollup, "master_id", self.orders),
+            (ServiceDailyRollup, "service_id", self.services),
+        ):
+            emptied_days = set()
+            for (day, status, key), (orders, revenue) in deltas.items():
+                if not orders and not revenue:
+                    continue
+                rows = model.objects.filter(day=day, status=status, **{key_field: key})
+                if rows.update(orders=F("orders") + orders, revenue=F("revenue") + revenue):
+                    if orders < 0:
+                        emptied_days.add(day)
+                elif orders > 0:
+                    model.objects.create(day=day, status=status, orders=orders, revenue=revenue, **{key_field: key})
+                else:
+                    logger.warning(f"Нет строки среза {model.__name__} {day} {status} {key} - "
+                                   f"срезы расходятся с заказами, запустите manage.py rebuild_order_rollups")
+            if emptied_days:
+                model.objects.filter(day__in=emptied_days, orders=0).delete()
+
+
+def get_order_key(order) -> tuple:
+    """Строка OrderDailyRollup, в которую входит заказ: (день, статус, мастер)"""
+    return get_order_day(order.date_created), order.status, order.master_id
+
+
+def get_order_prices(order_ids) -> dict[int, dict[int, Decimal]]:
+    """Услуги заказов с ценами одним запросом: {id заказа: {id услуги: цена}}"""
+    prices = defaultdict(dict)
+    links = Order.services.through.objects.filter(order_id__in=order_ids)
+    for order_id, service_id, price in links.values_list("order_id", "service_id", "service__price"):
+        prices[order_id][service_id] = price
+    return prices
+
+
+def apply_status_change(order_ids, old_status: str) -> None:
+    """
+    Переносит вклад заказов, уже переведенных queryset.update() из old_status в другой
+    статус, в строки нового статуса (два агрегата только по этим заказам).
+    """
+    if rollups_suppressed() or not order_ids:
+        return
+    order_totals, service_totals = _aggregate(Order.objects.filter(pk__in=order_ids))
+    delta = RollupDelta()
+    delta.add_totals(order_totals, service_totals)
+    delta.add_totals(order_totals, service_totals, status=old_status, sign=-1)
+    delta.apply()
+
+
+def apply_price_change(service_id: int, difference: Decimal) -> None:
+    """Цена услуги изменилась на difference - сдвигает выручку дней с заказами этой услуги"""
+    if rollups_suppressed() or not difference:
+        return
+    delta = RollupDelta()
+    for model in (Order, ArchivedOrder):
+        orders = (
+            model.objects.filter(services=service_id)
+            .annotate(day=TruncDate("date_created", tzinfo=timezone.get_current_timezone()))
+            .order_by()
+        )
+        for row in orders.values("day", "status", "master_id").annotate(orders=Count("pk")):
+            delta.orders[row["day"], row["status"], row["master_id"]][1] += row["orders"] * difference
+            delta.services[row["day"], row["status"], service_id][1] += row["orders"] * difference
+    delta.apply()
+
+
+def get_dashboard_data(date_from: date, date_to: date, statuses=None) -> dict:
+    """
+    Данные дашборда за [date_from, date_to] только из срезов.
+    statuses - учитывать только эти статусы (None - все).
+    """
+    order_rollups = OrderDailyRollup.objects.filter(day__gte=date_from, day__lte=date_to).order_by()
+    service_rollups = ServiceDailyRollup.objects.filter(day__gte=date_from, day__lte=date_to).order_by()
+    totals = {"orders": Sum("orders"), "revenue": Coalesce(Sum("revenue"), ZERO)}
+
+    # Разбивка по статусам всегда по всем статусам - чтобы было видно, что отфильтровано
+    status_names = dict(Order.STATUS_CHOICES)
+    by_status = [
+        {**row, "name": status_names.get(row["status"], row["status"])}
+        for row in order_rollups.values("status").annotate(**totals).order_by("-orders")
+    ]
+    if statuses:
+        order_rollups = order_rollups.filter(status__in=statuses)
+        service_rollups = service_rollups.filter(status__in=statuses)
+
+    by_master = list(order_rollups.values("master_id").annotate(**totals).order_by("-revenue"))
+    masters = Master.objects.in_bulk([row["master_id"] for row in by_master if row["master_id"]])
+    for row in by_master:
+        master = masters.get(row["master_id"])
+        row["name"] = f"{master.first_name} {master.last_name}" if master else "Без мастера"
+
+    by_service = list(service_rollups.values("service_id").annotate(**totals).order_by("-revenue"))
+    services = Service.objects.in_bulk([row["service_id"] for row in by_service])
+    for row in by_service:
+        service = services.get(row["service_id"])
+        row["name"] = service.name if service else f"Услуга #{row['service_id']} (удалена)"
+
+    by_day = list(order_rollups.values("day").annotate(**totals).order_by("day"))
+    summary = order_rollups.aggregate(**totals)
+    return {
+        "summary": {"orders": summary["orders"] or 0, "revenue": summary["revenue"]},
+        "by_status": by_status,
+        "by_master": by_master,
+        "by_service": by_service,
+        "by_day": by_day,
+    }
@@ -0,0 +1,82 @@
+"""
+Архивация закрытых заказов.
+
+Завершенные, отмененные и спам-заказы раньше навсегда оставались в core_order -
+в той же таблице, которую сканируют список заказов, админка и поиск. Заказы в
+закрытых статусах, не менявшиеся дольше ORDER_ARCHIVE_AFTER_DAYS дней, переносятся
+вместе со связями услуг в ArchivedOrder и удаляются из рабочей таблицы.
+
+Перенос идет пачками по pk (keyset): каждая пачка - своя короткая транзакция
+(вставка в архив и удаление из Order атомарны), между пачками - пауза, чтобы
+не держать блокировку записи SQLite и не мешать живым запросам. Удаление заказа
+убирает его и из полнотекстового индекса (триггер core_order_fts_ad), а срезы
+аналитики учитывают архив (core/analytics.py), поэтому статистика не меняется.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import rollups_unchanged
+from .models import ArchivedOrder, Order
+
+# Статусы, заказы в которых можно архивировать
+CLOSED_STATUSES = ("completed", "canceled", "spam")
+
+ARCHIVED_FIELDS = (
+    "id", "client_name", "phone", "phone_digits", "comment", "status",
+    "date_created", "date_updated", "master_id", "appointment_date",
+)
+
+
+def get_archive_candidates(older_than_days: int | None = None):
+    """Заказы в закрытых статусах, не менявшиеся дольше срока хранения"""
+    days = settings.ORDER_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = timezone.now() - timedelta(days=days)
+    return Order.objects.filter(status__in=CLOSED_STATUSES, date_updated__lt=cutoff).order_by("pk")
+
+
+def archive_orders(older_than_days: int | None = None, batch_size: int | None = None,
+                   pause: float | None = None, max_batches: int | None = None, progress=None) -> int:
+    """
+    Переносит заказы-кандидаты в архив пачками. Возвращает число перенесенных заказов.
+    progress - необязательный колбэк progress(archived_total) после каждой пачки.
+    """
+    batch_size = batch_size or settings.ORDER_ARCHIVE_BATCH_SIZE
+    pause = settings.ORDER_ARCHIVE_PAUSE_SECONDS if pause is None else pause
+    candidates = get_archive_candidates(older_than_days)
+    archived = 0
+    batches = 0
+    last_pk = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            rows = list(candidates.filter(pk__gt=last_pk).values(*ARCHIVED_FIELDS)[:batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1]["id"]
+            _move_batch(rows)
+        archived += len(rows)
+        batches += 1
+        if progress:
+            progress(archived)
+        if pause:
+            time.sleep(pause)
+    return archived
+
+
+def _move_batch(rows: list[dict]) -> None:
+    """Вставка пачки в архив и удаление из рабочих таблиц (внутри транзакции)"""
+    now = timezone.now()
+    ids = [row["id"] for row in rows]
+    links = Order.services.through.objects.filter(order_id__in=ids)
+    ArchivedOrder.objects.bulk_create([ArchivedOrder(archived_at=now, **row) for row in rows])
+    ArchivedOrder.services.through.objects.bulk_create([
+        ArchivedOrder.services.through(archivedorder_id=order_id, service_id=service_id)
+        for order_id, service_id in links.values_list("order_id", "service_id")
+    ])
+    links.delete()
+    # Срезы аналитики считаются по рабочим и архивным заказам вместе - пересчитывать нечего
+    with rollups_unchanged():
+        Order.objects.filter(pk__in=ids).delete()
@@ -0,0 +1,115 @@
+"""
+Асинхронные версии самых частых публичных представлений для запуска под ASGI.
+
+Синхронное представление под ASGI выполняется в пуле потоков (sync_to_async),
+и каждый запрос занимает поток на все время обработки. Эти версии работают в
+цикле событий и обращаются к БД и кешу через асинхронный API Django (acount,
+async for, cache.aget), услуги мастеров берут из индекса в памяти
+(core/service_index.py). Ответы и ключи кеша у них те же, что у синхронных.
+
+Подключаются маршрутами barbershop/urls_async.py - их выбирает barbershop/asgi.py
+(переменная окружения BARBERSHOP_ASYNC_VIEWS, см. settings.ROOT_URLCONF).
+Сравнение с WSGI: python manage.py asgi_benchmark.
+"""
+import json
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from .ajax_cache import acached_master_json
+from .cache_versions import aget_version
+from .json_response import FastJsonResponse
+from .master_info import aget_masters_info
+from .models import Master, Service
+from .service_index import aget_service_index
+from .views import LandingPageView, MasterInfoAjaxView, MastersServicesAjaxView, ThanksView
+
+# Блоки главной страницы, закешированные тегом {% cache %} в core/landing.html
+LANDING_FRAGMENTS = {"masters": "landing_masters", "services": "landing_services"}
+
+
+class AsyncLandingPageView(LandingPageView):
+    """
+    Главная страница: версия кеша блоков читается асинхронно, мастера и услуги
+    загружаются через async for только для блоков, которых нет в кеше. Шаблон
+    рендерится как обычно - Django делает это в потоке (контекстные процессоры
+    обращаются к сессии и пользователю синхронно), но уже без запросов за данными.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        version = await aget_version("landing")
+        keys = {name: make_template_fragment_key(fragment, [version]) for name, fragment in LANDING_FRAGMENTS.items()}
+        cached = await cache.aget_many(keys.values())
+        # Ленивые QuerySet для закешированных блоков не вычисляются
+        self.landing_data = {"masters": Master.objects.all(), "services": Service.objects.all(),
+                             "landing_version": version}
+        if keys["masters"] not in cached:
+            self.landing_data["masters"] = [master async for master in Master.objects.all()]
+        if keys["services"] not in cached:
+            self.landing_data["services"] = [service async for service in Service.objects.all()]
+        return super().get(request, *args, **kwargs)
+
+    def get_landing_data(self) -> dict:
+        return self.landing_data
+
+
+class AsyncThanksView(ThanksView):
+    """Страница благодарности: количество активных мастеров считается через acount()"""
+
+    async def get(self, request, *args, **kwargs):
+        self.masters_count = await Master.objects.filter(is_active=True).acount()
+        return super().get(request, *args, **kwargs)
+
+    def get_masters_count(self) -> int:
+        return self.masters_count
+
+
+class AsyncMastersServicesAjaxView(MastersServicesAjaxView):
+    """Асинхронная версия MastersServicesAjaxView (тот же ответ и тот же кеш)"""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.get_services_json_response(request.GET.get("master_id"))
+
+    async def post(self, request, *args, **kwargs):
+        data = json.loads(request.body)
+        return await self.get_services_json_response(data.get("master_id"))
+
+    async def get_services_json_response(self, master_id):
+        if not master_id:
+            return FastJsonResponse({"error": "master_id is required"}, status=400)
+        try:
+            master_id = int(master_id)
+        except (TypeError, ValueError):
+            return FastJsonResponse({"error": "master_id must be an integer"}, status=400)
+
+        async def build():
+            index = await aget_service_index()
+            if not index.has_master(master_id):
+                return {"error": "Master not found"}, 404
+            return [{"id": service.id, "name": service.name} for service in index.get_services(master_id)], 200
+
+        return await acached_master_json(self.request, "masters_services", master_id, build)
+
+
+class AsyncMasterInfoAjaxView(MasterInfoAjaxView):
+    """Асинхронная версия MasterInfoAjaxView (тот же ответ и тот же кеш)"""
+
+    async def get(self, request, *args, **kwargs):
+        if not request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            return FastJsonResponse({"success": False, "error": "Недопустимый запрос"}, status=400)
+
+        master_id = request.GET.get("master_id")
+        if not master_id:
+            return FastJsonResponse({"success": False, "error": "Не указан ID мастера"}, status=400)
+        try:
+            master_id = int(master_id)
+        except ValueError:
+            return FastJsonResponse({"success": False, "error": "Неверный ID мастера"}, status=400)
+
+        async def build():
+            master_data = (await aget_masters_info([master_id])).get(master_id)
+            if master_data is None:
+                return {"success": False, "error": "Мастер не найден"}, 404
+            return {"success": True, "master": master_data}, 200
+
+        return await acached_master_json(request, "master_info", master_id, build)
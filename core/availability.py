@@ -0,0 +1,204 @@
+"""
+Свободное время мастеров.
+
+Order.appointment_date - свободная дата, и раньше ничего не мешало записать
+двух клиентов к одному мастеру на одно время. Здесь по существующим заказам и
+длительностям их услуг (Service.duration) строится отсортированный индекс занятых
+интервалов мастера (BusyIntervals), а по нему - свободные слоты рабочего дня.
+
+Все заказы всех мастеров за период читаются одним запросом (индекс
+master_appointment_idx), дальше расчет идет в памяти: проверка слота -
+бинарный поиск (bisect), перечисление слотов - один проход по промежуткам
+между занятыми интервалами. Неделя для всех мастеров считается за один запрос к БД.
+
+Время мастера делится на слоты сетки BOOKING_SLOT_STEP_MINUTES, и запись занимает
+все слоты, которых касается (так же бронируется SlotReservation в core/reservations.py).
+Поэтому и занятые интервалы, и проверяемое время расширяются до границ сетки
+(align_to_grid): после заказа 10:00-10:20 ближайшее свободное время - 10:30.
+"""
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Order
+from .service_index import get_service_index
+
+# Заказы в этих статусах время мастера не занимают
+NON_BLOCKING_STATUSES = ("spam", "canceled")
+
+# Сетка слотов отсчитывается от фиксированного момента в UTC - один и тот же момент времени
+# попадает в один и тот же слот независимо от временной зоны datetime
+SLOT_GRID_EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def align_to_grid(start: datetime, end: datetime) -> tuple[datetime, datetime]:
+    """Расширяет [start, end) до границ сетки слотов: начало округляется вниз, конец - вверх"""
+    step = timedelta(minutes=settings.BOOKING_SLOT_STEP_MINUTES)
+    aligned_start = SLOT_GRID_EPOCH + ((start - SLOT_GRID_EPOCH) // step) * step
+    aligned_end = SLOT_GRID_EPOCH + -(-(end - SLOT_GRID_EPOCH) // step) * step  # Округление вверх
+    return aligned_start, aligned_end
+
+
+class BusyIntervals:
+    """
+    Отсортированные непересекающиеся интервалы занятости [start, end).
+    Пересекающиеся и смежные интервалы при построении сливаются в один.
+    """
+
+    def __init__(self, intervals=()):
+        self.starts: list[datetime] = []
+        self.ends: list[datetime] = []
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1]:
+                if end > self.ends[-1]:
+                    self.ends[-1] = end
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        """Не пересекается ли [start, end) ни с одним занятым интервалом - O(log n)"""
+        # Последний интервал, начавшийся не позже start, не должен заходить за start,
+        # а следующий за ним - начинаться раньше end
+        i = bisect_right(self.starts, start) - 1
+        if i >= 0 and self.ends[i] > start:
+            return False
+        return i + 1 >= len(self.starts) or self.starts[i + 1] >= end
+
+    def free_slots(self, day_start: datetime, day_end: datetime, duration: timedelta, step: timedelta):
+        """
+        Начала свободных слотов длительностью duration с шагом step внутри [day_start, day_end).
+        Слоты выровнены по сетке от day_start; перебираются только промежутки между интервалами.
+        """
+        slots = []
+        cursor = day_start
+        i = bisect_right(self.ends, day_start)
+        while cursor + duration <= day_end:
+            if i < len(self.starts) and self.starts[i] < cursor + duration:
+                # Слот упирается в занятый интервал - переходим на первый шаг сетки после него
+                busy_end = self.ends[i]
+                i += 1
+                if busy_end > cursor:
+                    steps = -(-(busy_end - day_start) // step)  # Округление вверх
+                    cursor = day_start + steps * step
+                continue
+            slots.append(cursor)
+            cursor += step
+        return slots
+
+
+def get_working_hours(day: date) -> tuple[datetime, datetime] | None:
+    """Начало и конец рабочего дня в текущей временной зоне; None - выходной"""
+    if day.weekday() not in settings.BOOKING_WORKDAYS:
+        return None
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(day, time(settings.BOOKING_DAY_START_HOUR), tzinfo=tz)
+    end = datetime.combine(day, time(settings.BOOKING_DAY_END_HOUR), tzinfo=tz)
+    return start, end
+
+
+def get_order_duration(services) -> timedelta:
+    """Длительность записи по уже загруженным услугам (без запроса к БД)"""
+    minutes = sum(service.duration or 0 for service in services)
+    return timedelta(minutes=minutes or settings.BOOKING_DEFAULT_DURATION_MINUTES)
+
+
+def get_services_duration(service_ids) -> timedelta:
+    """Суммарная длительность выбранных услуг (или длительность по умолчанию) - по индексу услуг, без запроса"""
+    services = get_service_index().services
+    return get_order_duration([services[pk] for pk in set(service_ids) if pk in services])
+
+
+def load_busy_intervals(master_ids, period_start: datetime, period_end: datetime, exclude_order_id=None) -> dict:
+    """
+    Занятые интервалы мастеров за период одним запросом: {master_id: BusyIntervals}.
+    Длительность заказа - сумма длительностей его услуг (заказ без услуг - длительность по умолчанию),
+    интервал расширен до границ сетки слотов.
+    Заказ мог начаться до period_start и еще длиться, поэтому нижняя граница отодвинута
+    на BOOKING_MAX_ORDER_HOURS.
+    """
+    orders = (
+        Order.objects.filter(
+            master_id__in=master_ids,
+            appointment_date__gte=period_start - timedelta(hours=settings.BOOKING_MAX_ORDER_HOURS),
+            appointment_date__lt=period_end,
+        )
+        .exclude(status__in=NON_BLOCKING_STATUSES)
+        .order_by()
+        .annotate(total_duration=Coalesce(Sum("services__duration"), 0))
+        .values_list("master_id", "appointment_date", "total_duration")
+    )
+    if exclude_order_id:
+        orders = orders.exclude(pk=exclude_order_id)
+
+    default_minutes = settings.BOOKING_DEFAULT_DURATION_MINUTES
+    intervals = {master_id: [] for master_id in master_ids}
+    for master_id, start, minutes in orders:
+        intervals[master_id].append(align_to_grid(start, start + timedelta(minutes=minutes or default_minutes)))
+    return {master_id: BusyIntervals(items) for master_id, items in intervals.items()}
+
+
+def get_availability(master_ids, date_from: date, days: int, duration: timedelta) -> dict:
+    """
+    Свободные слоты мастеров: {master_id: {"YYYY-MM-DD": ["10:00", "10:15", ...]}}.
+    Слоты в прошлом не предлагаются.
+    """
+    master_ids = list(master_ids)
+    step = timedelta(minutes=settings.BOOKING_SLOT_STEP_MINUTES)
+    tz = timezone.get_current_timezone()
+    period_start = datetime.combine(date_from, time.min, tzinfo=tz)
+    busy = load_busy_intervals(master_ids, period_start, period_start + timedelta(days=days))
+    now = timezone.now()
+
+    result = {master_id: {} for master_id in master_ids}
+    for offset in range(days):
+        day = date_from + timedelta(days=offset)
+        hours = get_working_hours(day)
+        if hours is None:
+            for master_id in master_ids:
+                result[master_id][day.isoformat()] = []
+            continue
+        day_start, day_end = hours
+        if day_start < now:
+            # Сегодня - начинаем с ближайшего шага сетки после текущего момента
+            if now >= day_end:
+                day_start = day_end
+            else:
+                day_start = day_start + -(-(now - day_start) // step) * step
+        for master_id in master_ids:
+            slots = busy[master_id].free_slots(day_start, day_end, duration, step)
+            result[master_id][day.isoformat()] = [timezone.localtime(slot, tz).strftime("%H:%M") for slot in slots]
+    return result
+
+
+def check_slot(master_id: int, start: datetime, duration: timedelta, exclude_order_id=None,
+               check_hours: bool = True) -> str | None:
+    """
+    Проверяет, можно ли записаться к мастеру на [start, start + duration).
+    check_hours=False - только пересечение с другими заказами, без рабочих часов.
+    Возвращает текст ошибки или None, если время свободно.
+    """
+    if check_hours:
+        local_start = timezone.localtime(start)
+        hours = get_working_hours(local_start.date())
+        if hours is None:
+            return "В этот день мастер не работает"
+        day_start, day_end = hours
+        if local_start < day_start or local_start + duration > day_end:
+            return (
+                f"Запись возможна с {settings.BOOKING_DAY_START_HOUR}:00 до {settings.BOOKING_DAY_END_HOUR}:00 "
+                f"(с учетом длительности услуг)"
+            )
+    # Запись займет все слоты сетки, которых касается, - их и проверяем
+    slot_start, slot_end = align_to_grid(start, start + duration)
+    busy = load_busy_intervals([master_id], slot_start, slot_end, exclude_order_id=exclude_order_id)
+    if not busy[master_id].is_free(slot_start, slot_end):
+        return "Это время у мастера уже занято"
+    return None
@@ -0,0 +1,60 @@
+"""
+Фоновый сброс буферов процесса в БД (core/view_counter.py, core/unique_viewers.py).
+
+Буфер копит изменения в памяти процесса - запрос пользователя в БД не пишет, -
+а фоновый поток раз в flush_interval секунд вызывает flush(). При штатной
+остановке процесса (atexit) буфер сбрасывается последний раз. Процесс, убитый
+SIGKILL или OOM, теряет изменения не более чем за один интервал сброса.
+"""
+import atexit
+import logging
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicFlushBuffer:
+    """Основа буфера: поток сброса запускается при первом изменении (_ensure_started)"""
+
+    thread_name = "buffer-flush"
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def flush(self):
+        """Записывает накопленное в БД"""
+        raise NotImplementedError
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                # Поток не должен умирать - накопленное запишется при следующем сбросе
+                logger.exception(f"{self.thread_name}: сброс не удался")
+            close_old_connections()
+
+    def shutdown(self) -> None:
+        """Останавливает фоновый поток и сбрасывает остаток буфера в БД"""
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            # При выходе процесса БД может быть уже недоступна
+            logger.error(f"{self.thread_name}: не удалось сбросить буфер при остановке: {e}")
@@ -0,0 +1,113 @@
+"""
+Версии закешированных данных.
+
+Вместо поиска и удаления всех ключей кеша при изменении данных мы храним
+"версию" каждого набора данных и включаем ее в ключи кеша. Сигналы моделей
+вызывают bump_version(), после чего старые ключи просто перестают
+использоваться и со временем вытесняются.
+
+Версия - время последнего изменения в микросекундах, поэтому из нее же
+получается заголовок Last-Modified. Версии лежат в таблице CacheVersion: сдвиг
+пишется в той же транзакции, что и изменение данных, и виден всем процессам
+gunicorn/uvicorn, даже если кеш у каждого процесса свой (LocMemCache).
+
+Чтобы чтение версии не стоило запроса к БД на каждой странице, процесс помнит
+прочитанные версии CACHE_VERSIONS_LOCAL_TTL секунд. Изменение, сделанное в этом
+процессе, видно сразу, в других процессах - не позже чем через этот интервал.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .models import CacheVersion
+
+# {имя набора данных: (версия, до какого time.monotonic() она актуальна)}
+_local: dict[str, tuple[int, float]] = {}
+
+
+def _now_version() -> int:
+    return time.time_ns() // 1000
+
+
+def _get_local(names) -> tuple[dict[str, int], list[str]]:
+    """Версии из памяти процесса и имена, которые нужно прочитать из БД"""
+    now = time.monotonic()
+    found, missing = {}, []
+    for name in names:
+        local = _local.get(name)
+        if local is not None and local[1] > now:
+            found[name] = local[0]
+        else:
+            missing.append(name)
+    return found, missing
+
+
+def _remember(versions: dict[str, int]) -> None:
+    expires_at = time.monotonic() + settings.CACHE_VERSIONS_LOCAL_TTL
+    for name, version in versions.items():
+        _local[name] = (version, expires_at)
+
+
+def _load(names: list[str]) -> dict[str, int]:
+    """Версии из БД; для новых наборов данных версия создается"""
+    found = dict(CacheVersion.objects.filter(name__in=names).values_list("name", "version"))
+    new = [name for name in names if name not in found]
+    if new:
+        # ignore_conflicts не затрет версию, которую параллельно успел записать другой процесс
+        version = _now_version()
+        CacheVersion.objects.bulk_create([CacheVersion(name=name, version=version) for name in new],
+                                         ignore_conflicts=True)
+        found.update(CacheVersion.objects.filter(name__in=new).values_list("name", "version"))
+    return found
+
+
+def get_version(name: str) -> int:
+    """Текущая версия набора данных name (создается при первом обращении)"""
+    return get_versions(name)[name]
+
+
+def get_versions(*names: str) -> dict[str, int]:
+    """
+    Версии нескольких наборов данных: из памяти процесса, недостающие - одним запросом.
+    Порядок ключей - как в names (из словаря строятся ключи кеша и ETag).
+    """
+    result, missing = _get_local(names)
+    if missing:
+        loaded = _load(missing)
+        _remember(loaded)
+        result.update(loaded)
+        result = {name: result[name] for name in names}
+    return result
+
+
+def bump_version(*names: str) -> None:
+    """Сдвигает версии наборов данных - все ключи со старой версией становятся неактуальны"""
+    version = _now_version()
+    CacheVersion.objects.bulk_create(
+        [CacheVersion(name=name, version=version) for name in names],
+        update_conflicts=True, unique_fields=["name"], update_fields=["version"],
+    )
+    # Этот поток перечитает версию из БД (видит свою транзакцию), остальные получат ее после коммита
+    for name in names:
+        _local.pop(name, None)
+    transaction.on_commit(lambda: _remember(dict.fromkeys(names, version)))
+
+
+def reset_local_versions() -> None:
+    """Забывает версии, прочитанные процессом (следующее чтение пойдет в БД)"""
+    _local.clear()
+
+
+async def aget_version(name: str) -> int:
+    """Асинхронная версия get_version (для представлений core/async_views.py)"""
+    return (await aget_versions(name))[name]
+
+
+async def aget_versions(*names: str) -> dict[str, int]:
+    """Асинхронная версия get_versions: из памяти - без перехода в поток"""
+    result, missing = _get_local(names)
+    if not missing:
+        return result
+    return await sync_to_async(get_versions)(*names)
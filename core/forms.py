@@ -1,9 +1,12 @@
 # Импорт служебных объектов Form
 from typing import Any
 from django import forms
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.forms import ClearableFileInput
 from .models import Service, Master, Order, Review
+from .availability import check_slot, get_order_duration
+from .service_index import get_service_index
 
 
 class ServiceForm(forms.ModelForm):
@@ -45,10 +48,42 @@ class OrderForm(forms.ModelForm):
         for field_name, field in self.fields.items():
             field.widget.attrs.update({"class": "form-control"})
 
-    # def save(self):
-    #     # Сохраняем объект заказа
-    #     Сюда можно вклинить логику валидации на бекенде (проверить что мастер предоставляет ВСЕ выбранные услуги)
-    #     super().save()
+    def clean(self):
+        """
+        Проверки заказа по нескольким полям сразу:
+        - мастер оказывает все выбранные услуги (check_master_services);
+        - время записи свободно у мастера, а у новой записи - еще не в прошлом и в рабочих часах (check_appointment).
+        """
+        cleaned_data = super().clean()
+        master = cleaned_data.get("master")
+        if master:
+            self.check_master_services(master, cleaned_data.get("services") or [])
+            if cleaned_data.get("appointment_date"):
+                self.check_appointment(master, cleaned_data["appointment_date"], cleaned_data.get("services") or [])
+        return cleaned_data
+
+    def check_master_services(self, master, services) -> None:
+        """Услуги, которых нет у мастера, - ошибка поля services (по индексу core/service_index.py, без запроса к БД)"""
+        master_service_ids = get_service_index().get_service_ids(master.pk)
+        foreign = [service.name for service in services if service.pk not in master_service_ids]
+        if foreign:
+            self.add_error("services", f"Мастер не оказывает услуги: {', '.join(foreign)}")
+
+    def check_appointment(self, master, appointment_date, services) -> None:
+        """
+        Прошедшее, нерабочее или занятое время записи - ошибка поля appointment_date (core/availability.py).
+        Прошедшее время и рабочие часы проверяются только у новой записи: у существующего заказа
+        время могло уже пройти или быть назначено персоналом вне расписания.
+        """
+        is_new = self.instance.pk is None
+        if is_new and appointment_date < timezone.now():
+            self.add_error("appointment_date", "Нельзя записаться на прошедшее время")
+            return
+        duration = get_order_duration(services)
+        error = check_slot(master.pk, appointment_date, duration, exclude_order_id=self.instance.pk,
+                           check_hours=is_new)
+        if error:
+            self.add_error("appointment_date", error)
 
     class Meta:
         model = Order
@@ -84,8 +119,9 @@ class ReviewForm(forms.ModelForm):
 
     class Meta:
         model = Review
-        # Исключаем поле is_published из формы для пользователей
-        exclude = ["is_published"]
+        # Исключаем поля публикации и модерации из формы для пользователей:
+        # новый отзыв всегда ждет пакетной модерации (moderation_status="pending")
+        exclude = ["is_published", "moderation_status"]
         widgets = {
             "client_name": forms.TextInput(
                 attrs={"placeholder": "Как к вам обращаться?", "class": "form-control"}
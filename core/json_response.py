@@ -0,0 +1,90 @@
+"""
+JSON-ответы AJAX-эндпоинтов с быстрым сериализатором.
+
+JsonResponse Django сериализует стандартным json с DjangoJSONEncoder: медленно
+на больших списках, а каждая цена Service.price (Decimal) проходит через
+Python-вызов default(). FastJsonResponse сериализует функцией из настройки
+JSON_RESPONSE_DUMPS:
+
+- core.json_response.fast_dumps - orjson, если он установлен, иначе stdlib_dumps;
+- core.json_response.stdlib_dumps - стандартный json.
+
+Вывод обоих одинаков: компактный UTF-8 без \\uXXXX-экранирования, Decimal - строкой
+(как у DjangoJSONEncoder, цены не теряют точность), datetime - ISO 8601 с "Z" для UTC.
+Поэтому закешированные ответы (core/ajax_cache.py) не зависят от того, в каком
+процессе их собрали. Сравнение скорости: python manage.py json_benchmark.
+"""
+import datetime
+import json
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:  # orjson - необязательная зависимость (extra fast-json)
+    orjson = None
+
+
+class JSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder с форматом datetime как у orjson (микросекунды не отбрасываются)"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            result = o.isoformat()
+            return result[:-6] + "Z" if result.endswith("+00:00") else result
+        if isinstance(o, datetime.time):
+            return o.isoformat()
+        return super().default(o)
+
+
+_encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def stdlib_dumps(data) -> bytes:
+    """Сериализация стандартным json"""
+    return _encoder.encode(data).encode()
+
+
+def _orjson_default(value):
+    # Типы, которых orjson не знает: Decimal, timedelta, ленивые строки переводов
+    if isinstance(value, Decimal):
+        return str(value)
+    return _encoder.default(value)
+
+
+def orjson_dumps(data) -> bytes:
+    """Сериализация orjson (datetime, date, UUID - нативно, остальное через _orjson_default)"""
+    return orjson.dumps(data, default=_orjson_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def fast_dumps(data) -> bytes:
+    """orjson, если установлен, иначе стандартный json"""
+    return (orjson_dumps if orjson is not None else stdlib_dumps)(data)
+
+
+@lru_cache
+def _load_dumps(path: str):
+    return import_string(path)
+
+
+def get_dumps():
+    """Сериализатор из настройки JSON_RESPONSE_DUMPS"""
+    return _load_dumps(settings.JSON_RESPONSE_DUMPS)
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    Замена JsonResponse с сериализатором JSON_RESPONSE_DUMPS (или dumps из аргумента).
+    Как и у JsonResponse, при safe=True сериализуются только словари.
+    """
+
+    def __init__(self, data, safe=True, dumps=None, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=(dumps or get_dumps())(data), **kwargs)
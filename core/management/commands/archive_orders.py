@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archive import archive_orders, get_archive_candidates
+
+
+class Command(BaseCommand):
+    """
+    Переносит закрытые заказы (завершен, отменен, спам), не менявшиеся дольше срока
+    хранения, в архив ArchivedOrder (core/archive.py). Запускается по расписанию (cron).
+
+    Примеры:
+        python manage.py archive_orders --dry-run
+        python manage.py archive_orders --days 365 --batch-size 1000 --pause 0.5
+    """
+    help = "Архивирует закрытые заказы старше срока хранения пачками с паузами"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help="Архивировать заказы, не менявшиеся дольше стольких дней",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE,
+            help="Заказов в одной транзакции",
+        )
+        parser.add_argument(
+            "--pause", type=float, default=settings.ORDER_ARCHIVE_PAUSE_SECONDS,
+            help="Пауза между пачками, сек.",
+        )
+        parser.add_argument(
+            "--max-batches", type=int, default=None,
+            help="Остановиться после стольких пачек (для ограничения времени запуска)",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Только показать, сколько заказов будет архивировано",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика команды"""
+        if options["days"] < 0 or options["batch_size"] < 1:
+            raise CommandError("--days не может быть отрицательным, --batch-size должен быть положительным")
+        if options["dry_run"]:
+            count = get_archive_candidates(options["days"]).count()
+            self.stdout.write(f"К архивации: {count} заказов")
+            return
+
+        archived = archive_orders(
+            older_than_days=options["days"],
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            max_batches=options["max_batches"],
+            progress=lambda total: self.stdout.write(f"Архивировано: {total}"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Готово, архивировано заказов: {archived}"))
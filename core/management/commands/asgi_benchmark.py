@@ -0,0 +1,197 @@
+import asyncio
+import io
+import logging
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from core.models import Master
+from core.query_plans import AJAX, seed
+
+ISOLATED_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "asgi-benchmark",
+    }
+}
+
+# Режимы: точка входа и корневые маршруты
+MODES = {
+    "wsgi": ("wsgi", "barbershop.urls"),
+    "asgi-sync": ("asgi", "barbershop.urls"),
+    "asgi-async": ("asgi", "barbershop.urls_async"),
+}
+
+# Сценарии: имя -> (функция URL по id мастера, заголовки)
+SCENARIOS = {
+    "landing": (lambda master_id: reverse("landing"), {}),
+    "thanks": (lambda master_id: reverse("thanks_with_source", kwargs={"source": "order"}), {}),
+    "masters_services_ajax": (lambda master_id: reverse("masters_services_by_id_ajax") + f"?master_id={master_id}", {}),
+    "master_info_ajax": (lambda master_id: reverse("get_master_info") + f"?master_id={master_id}", AJAX),
+}
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает синхронный WSGI и ASGI с асинхронными представлениями (core/async_views.py)
+    на одном наборе данных: запросов в секунду и задержки p50/p99 для каждого сценария.
+
+    Запросы подаются прямо в WSGI/ASGI-приложение Django в этом же процессе (без
+    HTTP-сервера), с заданной параллельностью: для WSGI - пул потоков, как у gunicorn
+    с --threads, для ASGI - задачи asyncio в одном цикле событий, как у uvicorn.
+    Режим asgi-sync - ASGI с синхронными представлениями, для оценки цены пула потоков.
+
+    Работает во временной файловой тестовой БД, основная БД не затрагивается.
+
+    Пример:
+        python manage.py asgi_benchmark --requests 2000 --concurrency 32
+        python manage.py asgi_benchmark --scenario master_info_ajax --mode wsgi --mode asgi-async
+    """
+    help = "Сравнивает RPS и p99 синхронного WSGI и асинхронного ASGI на одном наборе данных"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=5000, help="Размер набора данных (заказов)")
+        parser.add_argument("--requests", type=int, default=1000, help="Запросов на сценарий в каждом режиме")
+        parser.add_argument("--concurrency", type=int, default=16, help="Одновременных запросов")
+        parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), default=None,
+                            help="Только этот сценарий (можно несколько раз)")
+        parser.add_argument("--mode", action="append", choices=list(MODES), default=None,
+                            help="Только этот режим (можно несколько раз)")
+
+    def handle(self, *args, **options):
+        """Основная логика команды"""
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests и --concurrency должны быть положительными")
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+        test_settings = settings.DATABASES["default"].setdefault("TEST", {})
+        old_test_name = test_settings.get("NAME")
+        tmp_dir = tempfile.TemporaryDirectory()
+        # Файловая БД: у потоков WSGI и у потока sync_to_async свои соединения с общей БД
+        test_settings["NAME"] = str(Path(tmp_dir.name) / "asgi_benchmark.sqlite3")
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CACHES=ISOLATED_CACHES):
+                self.stdout.write(f"Набор данных: {options['orders']} заказов...")
+                seed(orders=options["orders"])
+                master_ids = list(Master.objects.values_list("pk", flat=True))
+                self.run_all(master_ids, options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            test_settings["NAME"] = old_test_name
+            tmp_dir.cleanup()
+
+    def run_all(self, master_ids: list[int], options: dict):
+        scenarios = options["scenario"] or list(SCENARIOS)
+        modes = options["mode"] or list(MODES)
+        apps = {"wsgi": get_wsgi_application(), "asgi": get_asgi_application()}
+        header = f"{'сценарий':<24}{'режим':<12}{'RPS':>9}{'p50, мс':>10}{'p99, мс':>10}{'ошибок':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name in scenarios:
+            build_url, headers = SCENARIOS[name]
+            # Один и тот же порядок запросов во всех режимах: мастера по кругу
+            urls = [build_url(master_ids[i % len(master_ids)]) for i in range(options["requests"])]
+            for mode in modes:
+                entry, urlconf = MODES[mode]
+                with override_settings(ROOT_URLCONF=urlconf):
+                    run = self.run_wsgi if entry == "wsgi" else self.run_asgi
+                    # Прогрев: кеши шаблонов, ответов и соединения с БД
+                    run(apps[entry], urls[:len(master_ids)], headers, options["concurrency"])
+                    elapsed, latencies, errors = run(apps[entry], urls, headers, options["concurrency"])
+                self.report(name, mode, elapsed, latencies, errors)
+
+    def run_wsgi(self, app, urls: list[str], headers: dict, concurrency: int):
+        """Запросы к WSGI-приложению из пула потоков"""
+        environ_headers = {f"HTTP_{key.upper().replace('-', '_')}": value for key, value in headers.items()}
+
+        def request(url):
+            path, _, query = url.partition("?")
+            environ = {
+                "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query, "SCRIPT_NAME": "",
+                "SERVER_NAME": "testserver", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+                "HTTP_HOST": "testserver", "REMOTE_ADDR": "127.0.0.1",
+                "wsgi.input": io.BytesIO(), "wsgi.errors": io.StringIO(), "wsgi.url_scheme": "http",
+                "wsgi.version": (1, 0), "wsgi.multithread": True, "wsgi.multiprocess": False,
+                "wsgi.run_once": False, **environ_headers,
+            }
+            status = []
+            started = time.perf_counter()
+            response = app(environ, lambda status_line, response_headers: status.append(status_line))
+            try:
+                b"".join(response)
+            finally:
+                # close() отправляет request_finished - как у настоящего WSGI-сервера
+                response.close()
+            return time.perf_counter() - started, status[0].startswith("200")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(request, urls))
+        elapsed = time.perf_counter() - started
+        return elapsed, [latency for latency, _ in results], sum(not ok for _, ok in results)
+
+    def run_asgi(self, app, urls: list[str], headers: dict, concurrency: int):
+        """Запросы к ASGI-приложению задачами asyncio в одном цикле событий"""
+        raw_headers = [(b"host", b"testserver")] + [
+            (key.lower().encode(), value.encode()) for key, value in headers.items()
+        ]
+
+        async def request(url, semaphore):
+            path, _, query = url.partition("?")
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+                "root_path": "", "headers": raw_headers, "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+            }
+            body_sent = False
+            disconnected = asyncio.Event()
+            status = []
+
+            async def receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                # Клиент не отключается - Django сам отменит ожидание после ответа
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await app(scope, receive, send)
+                return time.perf_counter() - started, status[0] == 200
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(request(url, semaphore) for url in urls))
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - started
+        return elapsed, [latency for latency, _ in results], sum(not ok for _, ok in results)
+
+    def report(self, name: str, mode: str, elapsed: float, latencies: list[float], errors: int):
+        ms = sorted(value * 1000 for value in latencies)
+        quantiles = statistics.quantiles(ms, n=100) if len(ms) > 1 else ms * 99
+        self.stdout.write(
+            f"{name:<24}{mode:<12}{len(ms) / elapsed:>9.0f}{quantiles[49]:>10.2f}{quantiles[98]:>10.2f}"
+            + (self.style.ERROR(f"{errors:>8}") if errors else f"{errors:>8}")
+        )
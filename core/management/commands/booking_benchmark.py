@@ -0,0 +1,144 @@
+import logging
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Master, Order, Service, SlotReservation
+
+ISOLATED_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "booking-benchmark",
+    }
+}
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочная проверка записи: N клиентов одновременно отправляют форму заказа
+    к одному мастеру на одно и то же время. Ожидается ровно один созданный заказ,
+    остальные получают ошибку формы, и ни одного "database is locked".
+
+    Работает во временной файловой тестовой БД (несколько потоков - несколько соединений),
+    основная БД не затрагивается.
+
+    Пример:
+        python manage.py booking_benchmark --clients 20 --rounds 10
+    """
+    help = "Проверяет отсутствие двойных записей при одновременных заказах на одно время"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=16, help="Сколько одновременных запросов на один слот")
+        parser.add_argument("--rounds", type=int, default=5, help="Сколько раз повторить (каждый раз - новый слот)")
+
+    def handle(self, *args, **options):
+        """Основная логика команды"""
+        if connection.vendor != "sqlite":
+            raise CommandError("Проверка рассчитана на SQLite")
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+        test_settings = settings.DATABASES["default"].setdefault("TEST", {})
+        old_test_name = test_settings.get("NAME")
+        tmp_dir = tempfile.TemporaryDirectory()
+        # Файловая БД вместо in-memory: у каждого потока свое соединение с общей БД
+        test_settings["NAME"] = str(Path(tmp_dir.name) / "booking_benchmark.sqlite3")
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CACHES=ISOLATED_CACHES):
+                results = self.run_rounds(options["clients"], options["rounds"])
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            test_settings["NAME"] = old_test_name
+            tmp_dir.cleanup()
+
+        self.report(results, options["clients"], options["rounds"])
+
+    def run_rounds(self, clients: int, rounds: int) -> dict:
+        """Создает мастера и услугу, затем для каждого раунда - одновременные запросы на один слот"""
+        service = Service.objects.create(name="Стрижка", description="Тестовая услуга", price=1000, duration=30)
+        master = Master.objects.create(first_name="Тест", last_name="Мастер", phone="+7 701 000 00 00",
+                                       address="Адрес", experience=5)
+        master.services.add(service)
+
+        tz = timezone.get_current_timezone()
+        first_day = timezone.localdate() + timedelta(days=1)
+        while first_day.weekday() not in settings.BOOKING_WORKDAYS:
+            first_day += timedelta(days=1)
+        base = datetime(first_day.year, first_day.month, first_day.day, settings.BOOKING_DAY_START_HOUR, tzinfo=tz)
+
+        results = {"created": 0, "rejected": 0, "errors": 0, "latencies": [], "double_booked": 0}
+        lock = threading.Lock()
+        url = reverse("order_create")
+
+        for round_no in range(rounds):
+            slot = base + timedelta(minutes=30 * round_no)
+            barrier = threading.Barrier(clients)
+
+            def book(client_no):
+                client = Client(raise_request_exception=False)
+                data = {
+                    "client_name": f"Клиент {round_no}-{client_no}",
+                    "phone": f"+7 702 {round_no:03d} {client_no:04d}",
+                    "comment": "",
+                    "master": master.pk,
+                    "services": [service.pk],
+                    "appointment_date": timezone.localtime(slot, tz).strftime("%Y-%m-%dT%H:%M"),
+                }
+                barrier.wait()
+                started = time.perf_counter()
+                try:
+                    response = client.post(url, data)
+                finally:
+                    connections.close_all()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    results["latencies"].append(elapsed)
+                    if response.status_code == 302:
+                        results["created"] += 1
+                    elif response.status_code == 200:
+                        results["rejected"] += 1
+                    else:
+                        results["errors"] += 1
+
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                list(pool.map(book, range(clients)))
+
+            booked = Order.objects.filter(master=master, appointment_date=slot).count()
+            if booked > 1:
+                results["double_booked"] += 1
+
+        results["reservations"] = SlotReservation.objects.count()
+        return results
+
+    def report(self, results: dict, clients: int, rounds: int):
+        latencies = sorted(results["latencies"])
+        ms = [value * 1000 for value in latencies]
+        quantiles = statistics.quantiles(ms, n=100) if len(ms) > 1 else ms * 99
+        self.stdout.write(f"Запросов: {len(ms)} ({rounds} раундов по {clients} клиентов на один слот)")
+        self.stdout.write(f"Создано заказов: {results['created']}, отклонено формой: {results['rejected']}, "
+                          f"ошибок сервера: {results['errors']}")
+        self.stdout.write(f"Броней слотов: {results['reservations']}")
+        self.stdout.write(f"Задержка, мс: p50={quantiles[49]:.1f} p95={quantiles[94]:.1f} "
+                          f"p99={quantiles[98]:.1f} max={ms[-1]:.1f}")
+
+        if results["double_booked"] or results["created"] != rounds or results["errors"]:
+            raise CommandError(
+                f"Ожидался ровно один заказ на слот без ошибок: раундов с двойной записью - "
+                f"{results['double_booked']}, создано {results['created']} из {rounds}, ошибок {results['errors']}"
+            )
+        self.stdout.write(self.style.SUCCESS("Двойных записей нет"))
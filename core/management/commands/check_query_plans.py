@@ -0,0 +1,157 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core import query_plans
+from core.unique_viewers import viewer_sketches
+from core.view_counter import view_counter
+
+ISOLATED_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "check-query-plans",
+    }
+}
+
+
+class Command(BaseCommand):
+    """
+    Регрессионная проверка планов запросов всех представлений и списков админки.
+    Работает во временной тестовой БД (основная не затрагивается), см. core/query_plans.py.
+
+    Примеры:
+        python manage.py check_query_plans                    # сравнить с базовым отчетом
+        python manage.py check_query_plans --update-baseline  # записать новый базовый отчет
+    """
+    help = "Проверяет планы SQL-запросов представлений и списков админки на большом наборе данных"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--orders", type=int, default=20000,
+            help="Сколько заказов создать в тестовой БД",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3,
+            help="Сколько раз выполнять каждый сценарий для замера времени",
+        )
+        parser.add_argument(
+            "--baseline", default=str(settings.QUERY_PLANS_BASELINE),
+            help="Путь к базовому JSON-отчету",
+        )
+        parser.add_argument(
+            "--update-baseline", action="store_true",
+            help="Записать текущий отчет как базовый вместо сравнения",
+        )
+        parser.add_argument(
+            "--only", nargs="*", default=None,
+            help="Выполнить только сценарии с указанными именами",
+        )
+        parser.add_argument(
+            "--json", dest="json_output", default=None,
+            help="Дополнительно сохранить текущий отчет в файл",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика команды"""
+        if connection.vendor != "sqlite":
+            raise CommandError("Проверка планов рассчитана на SQLite (EXPLAIN QUERY PLAN)")
+        if options["update_baseline"] and options["only"]:
+            raise CommandError("Базовый отчет записывается только по всем сценариям (без --only)")
+
+        # Трейсбеки ошибок представлений не нужны в выводе - код ответа попадает в отчет
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+        # Отчет не должен зависеть от DEBUG_MODE: без DEBUG и без debug_toolbar
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        middleware = [path for path in settings.MIDDLEWARE if not path.startswith("debug_toolbar.")]
+        try:
+            # Сценарии очищают кеш - работаем с отдельным локальным кешем, а не с общим Redis
+            with override_settings(CACHES=ISOLATED_CACHES, DEBUG=False, MIDDLEWARE=middleware):
+                report, statuses = self.collect(options)
+                # Просмотры и посетители мастеров из сценариев должны попасть в тестовую БД, а не в основную
+                view_counter.flush()
+                viewer_sketches.flush()
+                viewer_sketches.clear()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["json_output"]:
+            query_plans.save_baseline(options["json_output"], report)
+
+        errors = [name for name, status in statuses.items() if status >= 500]
+        for name in errors:
+            self.stdout.write(self.style.ERROR(f"{name}: ответ {statuses[name]}"))
+
+        if options["update_baseline"]:
+            if errors:
+                # Падающее представление не должно попасть в базовый отчет как норма
+                raise CommandError(f"Базовый отчет не записан - ошибки сервера: {', '.join(errors)}")
+            query_plans.save_baseline(options["baseline"], report)
+            self.stdout.write(self.style.SUCCESS(f"Базовый отчет записан: {options['baseline']}"))
+            return
+
+        baseline = query_plans.load_baseline(options["baseline"])
+        if baseline is None:
+            raise CommandError(f"Нет базового отчета {options['baseline']} - запустите с --update-baseline")
+
+        self.print_diff(report, baseline)
+        problems = query_plans.compare_with_baseline(report, baseline, check_indexes=not options["only"])
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(f"✗ {problem}"))
+            raise CommandError(f"Найдено регрессий: {len(problems)}")
+        self.stdout.write(self.style.SUCCESS("✓ Регрессий планов запросов нет"))
+
+    def collect(self, options):
+        self.stdout.write(f"Заполняем тестовую БД ({options['orders']} заказов)...")
+        seed_data = query_plans.seed(orders=options["orders"])
+
+        def make_client(user=None):
+            # Ошибки представлений не прерывают проверку - они попадают в отчет как код 500
+            client = Client(HTTP_HOST="localhost", raise_request_exception=False)
+            if user is not None:
+                client.force_login(user)
+            return client
+
+        # Новый клиент на каждый сценарий: без cookie от предыдущих сценариев
+        clients = {"anon": make_client, "staff": lambda: make_client(seed_data["staff"])}
+
+        scenarios = query_plans.VIEW_SCENARIOS + query_plans.admin_scenarios()
+        if options["only"]:
+            scenarios = [scenario for scenario in scenarios if scenario.name in options["only"]]
+
+        results = []
+        self.stdout.write(f"{'Сценарий':<40} {'код':>4} {'запросов':>9} {'мс':>9}  полные проходы")
+        for scenario in scenarios:
+            result = query_plans.run_scenario(scenario, clients, seed_data, repeat=options["repeat"])
+            results.append(result)
+            scans = ", ".join(result.full_scans) or "-"
+            self.stdout.write(
+                f"{result.name:<40} {result.status:>4} {result.queries:>9} {result.time_ms:>9.1f}  {scans}"
+            )
+
+        report = query_plans.build_report(results)
+        if report["unused_indexes"]:
+            self.stdout.write(
+                self.style.WARNING("Индексы, не использованные ни одним сценарием: " + ", ".join(report["unused_indexes"]))
+            )
+        return report, {result.name: result.status for result in results}
+
+    def print_diff(self, report, baseline):
+        """Изменения числа запросов и времени относительно базового отчета"""
+        base_scenarios = baseline.get("scenarios", {})
+        for name, current in report["scenarios"].items():
+            base = base_scenarios.get(name)
+            if base is None:
+                self.stdout.write(self.style.WARNING(f"{name}: нет в базовом отчете"))
+                continue
+            if current["queries"] != base["queries"] or abs(current["time_ms"] - base["time_ms"]) > base["time_ms"] * 0.5:
+                self.stdout.write(
+                    f"{name}: запросов {base['queries']} → {current['queries']}, "
+                    f"мс {base['time_ms']} → {current['time_ms']}"
+                )
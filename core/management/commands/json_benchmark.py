@@ -0,0 +1,112 @@
+import random
+import timeit
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import JsonResponse
+from django.utils import timezone
+
+from core import json_response
+
+
+def master_info_batch(rng: random.Random) -> dict:
+    """Ответ api/masters-info/ на MASTER_INFO_BATCH_MAX мастеров по 8 услуг"""
+    masters = {}
+    for master_id in range(1, 51):
+        masters[str(master_id)] = {
+            "id": master_id,
+            "name": f"Мастер{master_id} Фамилия{master_id}",
+            "experience": rng.randint(1, 20),
+            "photo": f"/media/masters/master_{master_id}.jpg",
+            "services": [
+                {"id": service_id, "name": f"Стрижка и укладка {service_id}",
+                 "price": Decimal(rng.randint(500, 5000)).quantize(Decimal("0.01"))}
+                for service_id in rng.sample(range(1, 31), 8)
+            ],
+        }
+    return {"success": True, "masters": masters, "not_found": []}
+
+
+def availability_week(rng: random.Random) -> dict:
+    """Ответ masters_availability/?days=7 на 20 мастеров"""
+    today = timezone.localdate()
+    slots = [f"{hour:02d}:{minute:02d}" for hour in range(10, 21) for minute in (0, 30)]
+    return {
+        "date": today.isoformat(), "days": 7, "duration": 60, "step": 30,
+        "masters": {
+            str(master_id): {
+                (today + timedelta(days=day)).isoformat(): sorted(rng.sample(slots, rng.randint(5, len(slots))))
+                for day in range(7)
+            }
+            for master_id in range(1, 21)
+        },
+    }
+
+
+def orders_page(rng: random.Random) -> list:
+    """Страница заказов с датами и суммами - 500 строк"""
+    now = timezone.now()
+    return [
+        {"id": order_id, "client_name": f"Клиент {order_id}", "phone": f"+7 701 {order_id:07d}",
+         "status": rng.choice(["new", "confirmed", "completed", "canceled"]),
+         "date_created": now - timedelta(minutes=rng.randint(0, 100000), microseconds=rng.randint(0, 999999)),
+         "appointment_date": now + timedelta(hours=rng.randint(1, 500)),
+         "total": Decimal(rng.randint(500, 15000)).quantize(Decimal("0.01"))}
+        for order_id in range(1, 501)
+    ]
+
+
+PAYLOADS = {
+    "master_info_batch": master_info_batch,
+    "availability_week": availability_week,
+    "orders_page": orders_page,
+}
+
+
+class Command(BaseCommand):
+    """
+    Микробенчмарк сериализации JSON-ответов (core/json_response.py): JsonResponse Django
+    против FastJsonResponse со стандартным json и с orjson на payload-ах реальной формы.
+    Заодно проверяет, что оба сериализатора FastJsonResponse выдают одинаковые байты.
+
+    Пример:
+        python manage.py json_benchmark --number 500
+    """
+    help = "Сравнивает скорость сериализации JSON-ответов: JsonResponse, stdlib и orjson"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=200, help="Сериализаций на замер")
+        parser.add_argument("--repeat", type=int, default=5, help="Замеров (берется лучший)")
+
+    def handle(self, *args, **options):
+        """Основная логика команды"""
+        if options["number"] < 1 or options["repeat"] < 1:
+            raise CommandError("--number и --repeat должны быть положительными")
+        encoders = {
+            "JsonResponse": lambda data: JsonResponse(data, safe=False).content,
+            "stdlib_dumps": lambda data: json_response.FastJsonResponse(
+                data, safe=False, dumps=json_response.stdlib_dumps).content,
+        }
+        if json_response.orjson is not None:
+            encoders["orjson_dumps"] = lambda data: json_response.FastJsonResponse(
+                data, safe=False, dumps=json_response.orjson_dumps).content
+        else:
+            self.stdout.write(self.style.WARNING("orjson не установлен - сравнивается только стандартный json"))
+
+        rng = random.Random(42)
+        header = f"{'payload':<20}{'сериализатор':<16}{'мкс/ответ':>12}{'байт':>10}{'ускорение':>11}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for name, build in PAYLOADS.items():
+            data = build(rng)
+            outputs = {encoder: encode(data) for encoder, encode in encoders.items()}
+            if "orjson_dumps" in outputs and outputs["orjson_dumps"] != outputs["stdlib_dumps"]:
+                raise CommandError(f"{name}: вывод orjson и стандартного json различается")
+            base = None
+            for encoder, encode in encoders.items():
+                timer = timeit.Timer(lambda: encode(data))
+                best = min(timer.repeat(repeat=options["repeat"], number=options["number"])) / options["number"]
+                base = base or best
+                self.stdout.write(f"{name:<20}{encoder:<16}{best * 1e6:>12.1f}{len(outputs[encoder]):>10}"
+                                  f"{base / best:>10.1f}x")
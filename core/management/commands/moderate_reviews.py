@@ -0,0 +1,77 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.mistral import get_moderation_classifier
+from core.moderation import moderate_pending_reviews
+from core.moderation_cache import verdict_cache
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Воркер пакетной модерации отзывов.
+    Арендует отзывы со статусом "pending" пачками (core/moderation.py) и проверяет
+    каждую пачку одним запросом к классификатору. Воркеров можно запускать несколько.
+    """
+    help = "Модерирует ожидающие отзывы пачками и публикует прошедшие проверку"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.REVIEW_MODERATION_BATCH_SIZE,
+            help="Сколько отзывов проверять одним запросом",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=settings.REVIEW_MODERATION_POLL_INTERVAL,
+            help="Пауза в секундах, если ожидающих отзывов нет",
+        )
+        parser.add_argument(
+            "--classifier", default="",
+            help="Путь импорта классификатора, например core.mistral.KeywordModerationClassifier",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Обработать все ожидающие отзывы и завершиться",
+        )
+
+    def handle(self, *args, **options):
+        """Основной цикл воркера"""
+        classifier = get_moderation_classifier(options["classifier"])
+        purged = verdict_cache.purge_expired()
+        if purged:
+            self.stdout.write(f"Удалено просроченных вердиктов из кеша: {purged}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Модерация отзывов запущена ({classifier.__class__.__name__})")
+        )
+
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    approved, rejected = moderate_pending_reviews(options["batch_size"], classifier=classifier)
+                except Exception as e:
+                    # Отзывы пачки возвращаются в статус pending и будут проверены в следующем проходе
+                    logger.error(f"Ошибка модерации пачки отзывов: {e}")
+                    if options["once"]:
+                        raise
+                    time.sleep(options["interval"])
+                    continue
+
+                if approved or rejected:
+                    stats = verdict_cache.stats()
+                    self.stdout.write(
+                        f"Опубликовано: {approved}, отклонено: {rejected} "
+                        f"(кеш: память {stats['memory_hits']}, БД {stats['db_hits']}, "
+                        f"промахи {stats['misses']}, hit rate {stats['hit_rate']})"
+                    )
+
+                if approved + rejected < options["batch_size"]:
+                    if options["once"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Модерация остановлена"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Master, Order
+from core.phones import backfill_phone_digits
+
+
+class Command(BaseCommand):
+    """
+    Заполняет нормализованные телефоны (phone_digits) заказов и мастеров.
+    Нужна после загрузки данных в обход save() (bulk_create, loaddata, прямой SQL)
+    или после изменения правил нормализации в core/phones.py.
+    """
+    help = "Пересчитывает phone_digits для заказов и мастеров пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Размер пачки для bulk_update",
+        )
+        parser.add_argument(
+            "--only-missing", action="store_true",
+            help="Обрабатывать только строки с пустым phone_digits",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика команды"""
+        for model in (Order, Master):
+            updated = backfill_phone_digits(
+                model, batch_size=options["batch_size"], only_missing=options["only_missing"]
+            )
+            self.stdout.write(self.style.SUCCESS(f"{model._meta.verbose_name_plural}: обновлено {updated}"))
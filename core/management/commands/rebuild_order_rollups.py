@@ -0,0 +1,63 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from core.analytics import get_order_day, rebuild_rollups
+from core.models import ArchivedOrder, Order, OrderDailyRollup, ServiceDailyRollup
+
+
+class Command(BaseCommand):
+    """
+    Перестраивает дневные срезы аналитики заказов (core/analytics.py).
+    Нужна при первом запуске и после загрузки заказов в обход сигналов
+    (bulk_create, прямой SQL).
+
+    Примеры:
+        python manage.py rebuild_order_rollups                          # вся история
+        python manage.py rebuild_order_rollups --from 2025-01-01 --to 2025-03-31
+    """
+    help = "Перестраивает дневные срезы заказов и услуг окнами по несколько дней"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat, default=None,
+                            help="Первый день (YYYY-MM-DD), по умолчанию - день самого старого заказа")
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat, default=None,
+                            help="Последний день (YYYY-MM-DD), по умолчанию - день самого нового заказа")
+        parser.add_argument("--window-days", type=int, default=31,
+                            help="Сколько дней пересчитывать за одну транзакцию")
+
+    def handle(self, *args, **options):
+        """Основная логика команды"""
+        if options["window_days"] < 1:
+            raise CommandError("--window-days должен быть положительным")
+        # Границы истории - по рабочим и архивным заказам
+        bounds = {"first": None, "last": None}
+        for model in (Order, ArchivedOrder):
+            model_bounds = model.objects.aggregate(first=Min("date_created"), last=Max("date_created"))
+            if model_bounds["first"] is not None:
+                bounds["first"] = min(filter(None, (bounds["first"], model_bounds["first"])))
+                bounds["last"] = max(filter(None, (bounds["last"], model_bounds["last"])))
+        full_rebuild = options["date_from"] is None and options["date_to"] is None
+        if full_rebuild:
+            # Срезы дней, заказов которых уже нет, удаляем целиком
+            OrderDailyRollup.objects.all().delete()
+            ServiceDailyRollup.objects.all().delete()
+            if bounds["first"] is None:
+                self.stdout.write("Заказов нет - срезы очищены")
+                return
+
+        date_from = options["date_from"] or get_order_day(bounds["first"])
+        date_to = options["date_to"] or (get_order_day(bounds["last"]) if bounds["last"] else date_from)
+        if date_from > date_to:
+            raise CommandError("--from позже --to")
+
+        window = timedelta(days=options["window_days"])
+        written = 0
+        start = date_from
+        while start <= date_to:
+            end = min(start + window - timedelta(days=1), date_to)
+            written += rebuild_rollups(start, end)
+            self.stdout.write(f"{start} - {end}: строк срезов {written}")
+            start = end + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Готово: {date_from} - {date_to}, строк срезов {written}"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.order_search import create_search_index, is_search_index_available
+
+
+class Command(BaseCommand):
+    """
+    Полная перестройка полнотекстового индекса заказов (core_order_fts).
+    В обычной работе индекс обновляется триггерами построчно - команда нужна
+    после восстановления БД из копии, ручных правок, потери триггеров или для сжатия индекса.
+    """
+    help = "Перестраивает полнотекстовый индекс поиска заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", default="default",
+            help="Алиас базы данных",
+        )
+        parser.add_argument(
+            "--no-optimize", action="store_true",
+            help="Не сливать сегменты индекса после перестройки",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика команды"""
+        connection = connections[options["database"]]
+        existed = is_search_index_available(options["database"])
+        # CREATE ... IF NOT EXISTS: заодно восстанавливаются триггеры, потерянные при пересоздании core_order
+        if not create_search_index(connection, optimize=not options["no_optimize"]):
+            raise CommandError("SQLite FTS5 с токенизатором trigram недоступен - поиск работает через icontains")
+        if not existed:
+            # Индекса не было (например, БД создана до миграции на другой СУБД)
+            is_search_index_available.cache_clear()
+            self.stdout.write(self.style.SUCCESS("Индекс поиска заказов создан"))
+            return
+        self.stdout.write(self.style.SUCCESS("Индекс поиска заказов перестроен"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.ratings import recalculate_ratings
+
+
+class Command(BaseCommand):
+    """
+    Полный пересчет денормализованного рейтинга мастеров
+    (published_review_count, rating_sum, avg_rating) по опубликованным отзывам.
+    """
+    help = "Пересчитывает агрегаты рейтинга всех мастеров одним проходом"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Размер пачки для bulk_update",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика команды"""
+        with transaction.atomic():
+            updated = recalculate_ratings(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Рейтинг пересчитан для мастеров: {updated}"))
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.outbox import get_batch_limit, process_outbox_batch
+from core.telegram_bot import FakeTelegramTransport, TelegramBotTransport, TelegramSender
+
+
+class Command(BaseCommand):
+    """
+    Воркер очереди уведомлений Telegram.
+    Забирает из TelegramOutbox пачки сообщений и отправляет их через один долгоживущий
+    TelegramSender (пул соединений + ограничение частоты), повторяя неудачные попытки
+    с экспоненциальной задержкой.
+    """
+    help = "Отправляет уведомления из очереди TelegramOutbox в Telegram"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.TELEGRAM_OUTBOX_BATCH_SIZE,
+            help="Сколько сообщений забирать за один проход",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=settings.TELEGRAM_OUTBOX_POLL_INTERVAL,
+            help="Пауза в секундах, если очередь пуста",
+        )
+        parser.add_argument(
+            "--max-attempts", type=int, default=settings.TELEGRAM_OUTBOX_MAX_ATTEMPTS,
+            help="После стольких неудачных попыток сообщение получает статус failed",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Обработать очередь один раз и завершиться (удобно для cron)",
+        )
+        parser.add_argument(
+            "--fake", action="store_true",
+            help="Не ходить в Telegram, а только выводить сообщения (FakeTelegramTransport)",
+        )
+
+    def handle(self, *args, **options):
+        """Основной цикл воркера"""
+        # Один event loop и один отправитель (с пулом соединений) на все время жизни воркера
+        loop = asyncio.new_event_loop()
+        if options["fake"]:
+            transport = FakeTelegramTransport()
+        else:
+            transport = TelegramBotTransport(
+                settings.TELEGRAM_BOT_API_KEY, pool_size=settings.TELEGRAM_CONNECTION_POOL_SIZE
+            )
+        sender = TelegramSender(
+            transport,
+            global_rate=settings.TELEGRAM_GLOBAL_RATE,
+            chat_rate=settings.TELEGRAM_CHAT_RATE,
+            group_rate=settings.TELEGRAM_GROUP_RATE,
+        )
+
+        # Пачка, которая не успевает отправиться за время аренды, урезается (см. get_batch_limit)
+        batch_size = get_batch_limit(options["batch_size"])
+        if batch_size < options["batch_size"]:
+            self.stdout.write(self.style.WARNING(
+                f"Размер пачки уменьшен до {batch_size}: больше не успеть отправить "
+                f"за TELEGRAM_OUTBOX_LEASE_SECONDS={settings.TELEGRAM_OUTBOX_LEASE_SECONDS}"
+            ))
+
+        def send_batch(deliveries):
+            return loop.run_until_complete(sender.deliver(deliveries))
+
+        self.stdout.write(self.style.SUCCESS("Воркер уведомлений Telegram запущен"))
+        try:
+            while True:
+                close_old_connections()
+                sent, failed = process_outbox_batch(send_batch, batch_size, options["max_attempts"])
+                if sent or failed:
+                    self.stdout.write(f"Отправлено: {sent}, ошибок: {failed}")
+
+                if options["once"]:
+                    # В режиме --once дочищаем очередь, пока есть готовые сообщения
+                    if not sent and not failed:
+                        break
+                    continue
+
+                # Если пачка была неполной - очередь пуста, можно подождать
+                if sent + failed < batch_size:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Воркер остановлен"))
+        finally:
+            loop.run_until_complete(sender.close())
+            loop.close()
+            if options["fake"]:
+                for chat_id, text, _ in transport.sent:
+                    self.stdout.write(f"[{chat_id}] {text}")
@@ -0,0 +1,39 @@
+"""
+Карточка мастера для AJAX-эндпоинтов (одиночного и пакетного).
+
+Оба эндпоинта строят данные одной функцией: мастера выбираются одним запросом,
+их услуги берутся из индекса в памяти (core/service_index.py) без запросов к БД,
+независимо от количества мастеров.
+"""
+from .models import Master
+from .service_index import ServiceIndex, aget_service_index, get_service_index
+
+
+def serialize_master(master: Master, index: ServiceIndex) -> dict:
+    """Данные мастера для JSON, услуги - из индекса"""
+    return {
+        "id": master.id,
+        "name": f"{master.first_name} {master.last_name}",
+        "experience": master.experience,
+        "photo": master.photo.url if master.photo else None,
+        "services": [
+            {"id": service.id, "name": service.name, "price": service.price}
+            for service in index.get_services(master.id)
+        ],
+    }
+
+
+def _get_masters(master_ids):
+    return Master.objects.filter(pk__in=master_ids)
+
+
+def get_masters_info(master_ids) -> dict[int, dict]:
+    """{master_id: данные мастера} для найденных мастеров - один запрос на любую пачку"""
+    index = get_service_index()
+    return {master.id: serialize_master(master, index) for master in _get_masters(master_ids)}
+
+
+async def aget_masters_info(master_ids) -> dict[int, dict]:
+    """Асинхронная версия get_masters_info"""
+    index = await aget_service_index()
+    return {master.id: serialize_master(master, index) async for master in _get_masters(master_ids)}
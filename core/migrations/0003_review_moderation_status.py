@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:19
+
+from django.db import migrations, models
+
+
+def mark_existing_reviews_moderated(apps, schema_editor):
+    """Старые отзывы уже прошли модерацию в сигнале - переносим ее результат"""
+    Review = apps.get_model("core", "Review")
+    Review.objects.filter(is_published=True).update(moderation_status="approved")
+    Review.objects.filter(is_published=False).update(moderation_status="rejected")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_telegram_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='moderation_status',
+            field=models.CharField(choices=[('pending', 'Ожидает модерации'), ('approved', 'Одобрен'), ('rejected', 'Отклонен')], db_index=True, default='pending', max_length=20, verbose_name='Статус модерации'),
+        ),
+        migrations.RunPython(mark_existing_reviews_moderated, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_review_moderation_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationVerdict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Ключ')),
+                ('is_bad', models.BooleanField(verbose_name='Не прошел модерацию')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата проверки')),
+            ],
+            options={
+                'verbose_name': 'Вердикт модерации',
+                'verbose_name_plural': 'Вердикты модерации',
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:20
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    """Заполняем агрегаты для уже существующих опубликованных отзывов"""
+    Master = apps.get_model("core", "Master")
+    Review = apps.get_model("core", "Review")
+    stats = (
+        Review.objects.filter(is_published=True)
+        .values("master_id")
+        .annotate(review_count=Count("id"), total=Sum("rating"))
+    )
+    for row in stats:
+        Master.objects.filter(pk=row["master_id"]).update(
+            published_review_count=row["review_count"],
+            rating_sum=row["total"],
+            avg_rating=round(row["total"] / row["review_count"], 1),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_moderation_verdict'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='master',
+            name='avg_rating',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='Средняя оценка'),
+        ),
+        migrations.AddField(
+            model_name='master',
+            name='published_review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Опубликованных отзывов'),
+        ),
+        migrations.AddField(
+            model_name='master',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_master_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramoutbox',
+            name='digest_group',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Группа сводки'),
+        ),
+        migrations.AlterField(
+            model_name='telegramoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Полнотекстовый индекс заказов (SQLite FTS5, триграммы) и триггеры его синхронизации.
+# См. core/order_search.py. На других СУБД и без FTS5 миграция ничего не делает - поиск работает через icontains.
+# SQL скопирован сюда, чтобы миграция не зависела от текущего кода core.order_search.
+
+from django.db import migrations
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_order_fts USING fts5(
+        phone, client_name, comment,
+        content='core_order', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_order_fts_ai AFTER INSERT ON core_order BEGIN
+        INSERT INTO core_order_fts(rowid, phone, client_name, comment)
+        VALUES (new.id, new.phone, new.client_name, new.comment);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_order_fts_ad AFTER DELETE ON core_order BEGIN
+        INSERT INTO core_order_fts(core_order_fts, rowid, phone, client_name, comment)
+        VALUES ('delete', old.id, old.phone, old.client_name, old.comment);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_order_fts_au AFTER UPDATE OF phone, client_name, comment ON core_order BEGIN
+        INSERT INTO core_order_fts(core_order_fts, rowid, phone, client_name, comment)
+        VALUES ('delete', old.id, old.phone, old.client_name, old.comment);
+        INSERT INTO core_order_fts(rowid, phone, client_name, comment)
+        VALUES (new.id, new.phone, new.client_name, new.comment);
+    END
+    """,
+    "INSERT INTO core_order_fts(core_order_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS core_order_fts_ai",
+    "DROP TRIGGER IF EXISTS core_order_fts_ad",
+    "DROP TRIGGER IF EXISTS core_order_fts_au",
+    "DROP TABLE IF EXISTS core_order_fts",
+]
+
+
+def supports_fts(connection) -> bool:
+    """Есть ли в SQLite модуль FTS5 с триграммным токенизатором (SQLite 3.34+)"""
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+            cursor.execute("DROP TABLE temp.fts_probe")
+        except Exception:
+            return False
+    return True
+
+
+def create_index(apps, schema_editor):
+    if not supports_fts(schema_editor.connection):
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_outbox_digest_group'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:29
+
+import re
+
+from django.db import migrations, models
+
+
+# SQLite добавляет колонку в core_order, пересоздавая таблицу, - триггеры полнотекстового
+# индекса (миграция 0007) при этом пропадают. Создаем их заново; SQL скопирован из 0007
+SEARCH_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_order_fts_ai AFTER INSERT ON core_order BEGIN
+        INSERT INTO core_order_fts(rowid, phone, client_name, comment)
+        VALUES (new.id, new.phone, new.client_name, new.comment);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_order_fts_ad AFTER DELETE ON core_order BEGIN
+        INSERT INTO core_order_fts(core_order_fts, rowid, phone, client_name, comment)
+        VALUES ('delete', old.id, old.phone, old.client_name, old.comment);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_order_fts_au AFTER UPDATE OF phone, client_name, comment ON core_order BEGIN
+        INSERT INTO core_order_fts(core_order_fts, rowid, phone, client_name, comment)
+        VALUES ('delete', old.id, old.phone, old.client_name, old.comment);
+        INSERT INTO core_order_fts(rowid, phone, client_name, comment)
+        VALUES (new.id, new.phone, new.client_name, new.comment);
+    END
+    """,
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    """Триггеры нужны, только если индекс создан (SQLite с FTS5)"""
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite" or "core_order_fts" not in connection.introspection.table_names():
+        return
+    for sql in SEARCH_TRIGGERS_SQL:
+        schema_editor.execute(sql)
+
+
+def normalize_phone(phone):
+    """Правило нормализации на момент миграции (копия core.phones.normalize_phone)"""
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    return digits
+
+
+def fill_phone_digits(apps, schema_editor):
+    # Исторические модели не вызывают save(), поэтому заполняем колонку пачками по pk
+    for model_name in ("Order", "Master"):
+        model = apps.get_model("core", model_name)
+        queryset = model.objects.order_by("pk").only("pk", "phone", "phone_digits")
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:1000])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            for obj in chunk:
+                obj.phone_digits = normalize_phone(obj.phone)
+            model.objects.bulk_update(chunk, ["phone_digits"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_order_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='master',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20, verbose_name='Телефон (цифры)'),
+        ),
+        # Откат AddField ниже тоже пересоздает core_order - тогда триггеры восстанавливает эта операция
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='order',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20, verbose_name='Телефон (цифры)'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+    ]
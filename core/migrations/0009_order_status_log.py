@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_phone_digits'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.PositiveBigIntegerField(db_index=True, verbose_name='ID заказа')),
+                ('old_status', models.CharField(max_length=20, verbose_name='Старый статус')),
+                ('new_status', models.CharField(max_length=20, verbose_name='Новый статус')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Когда изменен')),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Кто изменил')),
+            ],
+            options={
+                'verbose_name': 'Смена статуса заказа',
+                'verbose_name_plural': 'Журнал статусов заказов',
+                'ordering': ['-changed_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_order_status_log'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['master', 'appointment_date'], name='master_appointment_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:44
+
+import django.db.models.deletion
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# Значения на момент миграции - чтобы изменения настроек и core.reservations ее не меняли
+SLOT_STEP = timedelta(minutes=15)
+DEFAULT_DURATION = timedelta(minutes=20)
+RELEASING_STATUSES = ("spam", "canceled")
+SLOT_GRID_EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_slot_starts(start, duration):
+    """Слоты сетки, которых касается запись [start, start + duration)"""
+    slot = SLOT_GRID_EPOCH + ((start - SLOT_GRID_EPOCH) // SLOT_STEP) * SLOT_STEP
+    slots = []
+    while slot < start + duration:
+        slots.append(slot)
+        slot += SLOT_STEP
+    return slots
+
+
+def reserve_future_orders(apps, schema_editor):
+    """Бронируем время уже существующих будущих заказов; старые двойные записи пропускаются"""
+    Order = apps.get_model("core", "Order")
+    SlotReservation = apps.get_model("core", "SlotReservation")
+    orders = (
+        Order.objects.filter(master__isnull=False, appointment_date__gte=timezone.now())
+        .exclude(status__in=RELEASING_STATUSES)
+        .annotate(total_duration=Coalesce(Sum("services__duration"), 0))
+        .values_list("pk", "master_id", "appointment_date", "total_duration")
+        .order_by("appointment_date")
+    )
+    reservations = []
+    for pk, master_id, start, minutes in orders:
+        duration = timedelta(minutes=minutes) if minutes else DEFAULT_DURATION
+        reservations += [
+            SlotReservation(master_id=master_id, slot_start=slot, order_id=pk)
+            for slot in get_slot_starts(start, duration)
+        ]
+    SlotReservation.objects.bulk_create(reservations, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_order_master_appointment_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_start', models.DateTimeField(verbose_name='Начало слота')),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_reservations', to='core.master', verbose_name='Мастер')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_reservations', to='core.order', verbose_name='Заказ')),
+            ],
+            options={
+                'verbose_name': 'Бронь слота',
+                'verbose_name_plural': 'Брони слотов',
+                'constraints': [models.UniqueConstraint(fields=('master', 'slot_start'), name='unique_master_slot')],
+            },
+        ),
+        migrations.RunPython(reserve_future_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_slot_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True, verbose_name='День')),
+                ('status', models.CharField(max_length=20, verbose_name='Статус')),
+                ('master_id', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='ID мастера')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Дневной срез заказов',
+                'verbose_name_plural': 'Дневные срезы заказов',
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True, verbose_name='День')),
+                ('status', models.CharField(max_length=20, verbose_name='Статус')),
+                ('service_id', models.PositiveBigIntegerField(verbose_name='ID услуги')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Дневной срез по услугам',
+                'verbose_name_plural': 'Дневные срезы по услугам',
+            },
+        ),
+    ]
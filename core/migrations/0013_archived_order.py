@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_order_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID заказа')),
+                ('client_name', models.CharField(db_index=True, max_length=100, verbose_name='Имя клиента')),
+                ('phone', models.CharField(max_length=20, verbose_name='Телефон клиента')),
+                ('phone_digits', models.CharField(blank=True, db_index=True, max_length=20, verbose_name='Телефон (цифры)')),
+                ('comment', models.TextField(blank=True, verbose_name='Комментарий клиента')),
+                ('status', models.CharField(choices=[('not_approved', 'Не подтвержден'), ('moderated', 'Прошел модерацию'), ('spam', 'Спам'), ('approved', 'Подтвержден'), ('in_awaiting', 'В ожидании'), ('completed', 'Завершен'), ('canceled', 'Отменен')], max_length=50, verbose_name='Статус заказа')),
+                ('date_created', models.DateTimeField(db_index=True, verbose_name='Дата создания')),
+                ('date_updated', models.DateTimeField(verbose_name='Дата обновления')),
+                ('appointment_date', models.DateTimeField(blank=True, null=True, verbose_name='Дата записи')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата архивации')),
+                ('master', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to='core.master', verbose_name='Мастер')),
+                ('services', models.ManyToManyField(blank=True, related_name='archived_orders', to='core.service', verbose_name='Услуги')),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архив заказов',
+                'ordering': ['-date_created'],
+            },
+        ),
+    ]
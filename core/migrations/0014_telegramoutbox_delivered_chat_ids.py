@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_archived_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramoutbox',
+            name='delivered_chat_ids',
+            field=models.TextField(blank=True, verbose_name='Доставлено в чаты'),
+        ),
+    ]
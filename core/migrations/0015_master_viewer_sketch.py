@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_telegramoutbox_delivered_chat_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MasterViewerSketch',
+            fields=[
+                ('master', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='viewer_sketch', serialize=False, to='core.master', verbose_name='Мастер')),
+                ('bloom_period', models.PositiveIntegerField(default=0, verbose_name='Период фильтра Блума')),
+                ('bloom', models.BinaryField(blank=True, default=b'', verbose_name='Фильтр Блума')),
+                ('hll', models.BinaryField(blank=True, default=b'', verbose_name='HyperLogLog')),
+            ],
+            options={
+                'verbose_name': 'Посетители мастера',
+                'verbose_name_plural': 'Посетители мастеров',
+            },
+        ),
+    ]
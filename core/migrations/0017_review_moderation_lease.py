@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_cache_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='moderation_lease_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Аренда модерации до'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='moderation_status',
+            field=models.CharField(choices=[('pending', 'Ожидает модерации'), ('processing', 'Проверяется'), ('approved', 'Одобрен'), ('rejected', 'Отклонен')], db_index=True, default='pending', max_length=20, verbose_name='Статус модерации'),
+        ),
+    ]
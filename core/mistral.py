@@ -1,39 +1,101 @@
 # импорт из настроек MISTRAL_MODERATIONS_GRADES
 from barbershop.settings import MISTRAL_MODERATIONS_GRADES
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
+from django.conf import settings
+from django.utils.module_loading import import_string
 from mistralai import Mistral
 from pprint import pprint
+from .moderation_cache import verdict_cache
 
 
 load_dotenv()
 
 
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+MISTRAL_MODERATION_MODEL = "mistral-moderation-latest"
 
-def is_bad_review(review_text: str, api_key: str= MISTRAL_API_KEY, grades:dict =MISTRAL_MODERATIONS_GRADES) -> bool:
-    # Создаем клиента Mistral с переданным API ключом
-    client = Mistral(api_key=api_key)
 
-    # Формируем запрос
-    response = client.classifiers.moderate_chat(
-        model="mistral-moderation-latest",
-        inputs=[{"role": "user", "content": review_text}],
-    )
-    # Вытаскиваем данные с оценкой
-    result = response.results[0].category_scores
+class MistralModerationClassifier:
+    """
+    Классификатор отзывов через Mistral moderation API.
+    Клиент создается один раз, а все тексты пачки уходят одним запросом moderate_chat
+    (каждый текст - отдельный "диалог" в inputs).
+    """
+
+    def __init__(self, api_key: str = MISTRAL_API_KEY):
+        self.client = Mistral(api_key=api_key)
+
+    def classify(self, texts: list[str]) -> list[dict[str, float]]:
+        """Возвращает оценки категорий для каждого текста в том же порядке"""
+        response = self.client.classifiers.moderate_chat(
+            model=MISTRAL_MODERATION_MODEL,
+            inputs=[[{"role": "user", "content": text}] for text in texts],
+        )
+        return [result.category_scores for result in response.results]
+
+
+class KeywordModerationClassifier:
+    """
+    Локальный классификатор без обращения к API - для тестов и офлайн-разработки.
+    Текст со "стоп-словами" получает максимальную оценку по всем категориям.
+    """
+
+    bad_words = ("плохо", "ужасно")
+
+    def classify(self, texts: list[str]) -> list[dict[str, float]]:
+        """Возвращает оценки категорий для каждого текста в том же порядке"""
+        results = []
+        for text in texts:
+            score = 1.0 if any(word in text.lower() for word in self.bad_words) else 0.0
+            results.append({key: score for key in MISTRAL_MODERATIONS_GRADES})
+        return results
+
 
-    # Округляем значения до двух знаков после запятой
-    result = {key: round(value, 2) for key, value in result.items()}
+@lru_cache(maxsize=None)
+def get_moderation_classifier(path: str = "") -> object:
+    """
+    Возвращает классификатор по пути импорта (по умолчанию settings.REVIEW_MODERATION_CLASSIFIER).
+    Экземпляр кешируется, поэтому клиент API создается один раз на процесс.
+    """
+    return import_string(path or settings.REVIEW_MODERATION_CLASSIFIER)()
 
-    pprint(result)
 
-    # Словарь под результаты проверки
-    checked_result = {}
+def is_bad_scores(scores: dict, grades: dict = MISTRAL_MODERATIONS_GRADES) -> bool:
+    """Проверяет оценки категорий по порогам grades. True - отзыв не проходит модерацию"""
+    # Округляем значения до двух знаков после запятой и сравниваем с порогами
+    return any(round(value, 2) >= grades[key] for key, value in scores.items() if key in grades)
+
+
+def classify_reviews(
+    texts: list[str], grades: dict = MISTRAL_MODERATIONS_GRADES, classifier=None, use_cache: bool = True
+) -> list[bool]:
+    """
+    Пакетная проверка отзывов. Возвращает список вердиктов (True - плохой отзыв).
+    Повторяющиеся тексты берутся из кеша вердиктов без обращения к классификатору.
+    """
+    if not texts:
+        return []
+    classifier = classifier or get_moderation_classifier()
+
+    def classify_batch(batch: list[str]) -> list[bool]:
+        return [is_bad_scores(scores, grades) for scores in classifier.classify(batch)]
+
+    if not use_cache:
+        return classify_batch(texts)
+    return verdict_cache.classify(texts, grades, classify_batch, classifier.__class__.__name__)
+
+
+def is_bad_review(review_text: str, api_key: str= MISTRAL_API_KEY, grades:dict =MISTRAL_MODERATIONS_GRADES) -> bool:
+    classifier = MistralModerationClassifier(api_key=api_key)
 
-    for key, value in result.items():
-        if key in grades:
-            checked_result[key] = value >= grades[key]
+    def classify_batch(batch: list[str]) -> list[bool]:
+        # Проверяем текст тем же классификатором, что и пакетная модерация
+        scores = classifier.classify(batch)[0]
+        pprint({key: round(value, 2) for key, value in scores.items()})
+        # Если одно из значений превышает порог, то отзыв не проходит модерацию
+        return [is_bad_scores(scores, grades)]
 
-    # Если одно из значений True, то отзыв не проходит модерацию
-    return any(checked_result.values())
\ No newline at end of file
+    # Повторный текст не требует запроса к API
+    return verdict_cache.classify([review_text], grades, classify_batch, classifier.__class__.__name__)[0]
@@ -1,7 +1,11 @@
 from doctest import master
 from django import db
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .phones import normalize_phone
 
 
 class Order(models.Model):
@@ -16,9 +20,21 @@ class Order(models.Model):
         ("completed", "Завершен"),
         ("canceled", "Отменен"),
     ]
+    # Допустимые переходы статусов (core/order_status.py). Завершенный заказ - конечное состояние
+    STATUS_TRANSITIONS = {
+        "not_approved": {"moderated", "approved", "spam", "canceled"},
+        "moderated": {"not_approved", "approved", "spam", "canceled"},
+        "spam": {"not_approved", "moderated"},
+        "approved": {"in_awaiting", "completed", "canceled"},
+        "in_awaiting": {"approved", "completed", "canceled"},
+        "completed": set(),
+        "canceled": {"not_approved"},
+    }
     # verboose_name - название модели в админке и в форме связанной с моделью
     client_name = models.CharField(max_length=100, db_index=True, verbose_name="Имя клиента")
     phone = models.CharField(max_length=20, db_index=True, verbose_name="Телефон клиента")
+    # Только цифры телефона для индексного поиска (core/phones.py), заполняется в save()
+    phone_digits = models.CharField(max_length=20, blank=True, db_index=True, editable=False, verbose_name="Телефон (цифры)")
     comment = models.TextField(blank=True, db_index=True, verbose_name="Комментарий клиента")
     # Для поля choices будет добавлен метод get_<field>_display() - в данном случае get_status_display() - возвращает человеческое название статуса
     status = models.CharField(
@@ -37,6 +53,38 @@ class Order(models.Model):
     def __str__(self):
         return f"Заказ {self.id} от {self.client_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки - чтобы проверить переход при сохранении формы
+        if "status" in field_names:
+            instance._loaded_status = values[field_names.index("status")]
+        # День создания, статус и мастер на момент загрузки - строка среза аналитики,
+        # из которой заказ уходит при сохранении (core/analytics.py)
+        if {"date_created", "status", "master_id"}.issubset(field_names):
+            instance._loaded_rollup = tuple(values[field_names.index(name)] for name in ("date_created", "status", "master_id"))
+        return instance
+
+    def clean(self):
+        super().clean()
+        loaded_status = getattr(self, "_loaded_status", None)
+        if loaded_status and self.status != loaded_status and not self.can_transition(loaded_status, self.status):
+            raise ValidationError({
+                "status": f"Нельзя перевести заказ из статуса "
+                          f"\"{dict(self.STATUS_CHOICES)[loaded_status]}\" в \"{self.get_status_display()}\""
+            })
+
+    @classmethod
+    def can_transition(cls, old_status: str, new_status: str) -> bool:
+        return new_status in cls.STATUS_TRANSITIONS.get(old_status, set())
+
+    def save(self, *args, **kwargs):
+        self.phone_digits = normalize_phone(self.phone)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_digits"}
+        super().save(*args, **kwargs)
+
     class Meta:
         # Название модели в админке в ед. числе и в множественном числе
         verbose_name = "Заказ"
@@ -56,6 +104,8 @@ class Order(models.Model):
                 fields=["client_name", "phone", "comment"],
                 name="client_phone_comment_idx",
             ),
+            # Записи мастера за период - расчет свободного времени (core/availability.py)
+            models.Index(fields=["master", "appointment_date"], name="master_appointment_idx"),
         ]
 
 
@@ -64,6 +114,7 @@ class Master(models.Model):
     last_name = models.CharField(max_length=100, verbose_name="Фамилия мастера")
     photo = models.ImageField(upload_to="images/masters/", blank=True, null=True, verbose_name="Фото мастера")
     phone = models.CharField(max_length=20, db_index=True, verbose_name="Телефон мастера")
+    phone_digits = models.CharField(max_length=20, blank=True, db_index=True, editable=False, verbose_name="Телефон (цифры)")
     address = models.CharField(max_length=255, verbose_name="Адрес мастера")
     email = models.EmailField(blank=True, verbose_name="Email мастера")
     experience = models.PositiveIntegerField(verbose_name="Опыт работы (лет)")
@@ -74,21 +125,23 @@ class Master(models.Model):
         default=0, verbose_name="Количество просмотров"
     )
 
-    def avg_rating(self)-> float:
-        """Вычисляет среднюю оценку мастера на основе опубликованных отзывов"""
-    # Получаем только опубликованные отзывы
-        published_reviews = self.reviews.filter(is_published=True)
-        
-        # Проверяем, есть ли отзывы
-        if published_reviews.exists():
-            # Вычисляем среднее значение и округляем до 1 знака после запятой
-            return round(sum(review.rating for review in published_reviews) / published_reviews.count(), 1)
-        else:
-            # Если отзывов нет, возвращаем 0 или None
-            return 0.0
+    # Денормализованные агрегаты опубликованных отзывов.
+    # Поддерживаются сигналами Review (core/ratings.py), пересчет: manage.py recalculate_ratings
+    published_review_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Опубликованных отзывов"
+    )
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="Сумма оценок")
+    avg_rating = models.FloatField(default=0.0, editable=False, verbose_name="Средняя оценка")
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
+
+    def save(self, *args, **kwargs):
+        self.phone_digits = normalize_phone(self.phone)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_digits"}
+        super().save(*args, **kwargs)
     
     class Meta:
         # Название модели в админке в ед. числе и в множественном числе
@@ -120,6 +173,11 @@ class Service(models.Model):
     def __str__(self):
         return f"{self.name} - {self.price} руб."
 
+    @property
+    def image_url(self):
+        """URL изображения или None (то же поле есть у ServiceRow в core/service_index.py)"""
+        return self.image.url if self.image else None
+
     class Meta:
         verbose_name = "Услуга"
         verbose_name_plural = "Услуги"
@@ -130,6 +188,14 @@ class Review(models.Model):
     Модель для хранения отзывов клиентов о мастерах
     """
 
+    # Статусы модерации
+    MODERATION_STATUS_CHOICES = [
+        ("pending", "Ожидает модерации"),
+        ("processing", "Проверяется"),
+        ("approved", "Одобрен"),
+        ("rejected", "Отклонен"),
+    ]
+
     client_name = models.CharField(max_length=100, verbose_name="Имя клиента")
     text = models.TextField(verbose_name="Текст отзыва")
     rating = models.IntegerField(
@@ -145,6 +211,19 @@ class Review(models.Model):
         upload_to="images/reviews/", blank=True, null=True, verbose_name="Фотография"
     )
     is_published = models.BooleanField(default=False, verbose_name="Опубликован")
+    # Новый отзыв ждет пакетной модерации (manage.py moderate_reviews)
+    moderation_status = models.CharField(
+        max_length=20,
+        choices=MODERATION_STATUS_CHOICES,
+        default="pending",
+        db_index=True,
+        verbose_name="Статус модерации",
+    )
+    # До какого времени отзыв "арендован" воркером модерации (статус processing).
+    # Если воркер упадет, после этого времени отзыв снова доступен другим воркерам
+    moderation_lease_until = models.DateTimeField(
+        blank=True, null=True, editable=False, verbose_name="Аренда модерации до"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
 
     def __str__(self):
@@ -154,3 +233,230 @@ class Review(models.Model):
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
         ordering = ["-created_at"]
+
+
+class TelegramOutbox(models.Model):
+    """
+    Очередь исходящих уведомлений в Telegram (паттерн Transactional Outbox).
+    Запись создается в той же транзакции, что и заказ/отзыв,
+    а отправкой занимается отдельный воркер (manage.py telegram_worker).
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "В очереди"),
+        ("processing", "Отправляется"),
+        ("sent", "Отправлено"),
+        ("failed", "Ошибка"),
+    ]
+
+    # Пустой chat_id - отправка в чат по умолчанию (settings.TELEGRAM_USER_ID)
+    chat_id = models.CharField(max_length=64, blank=True, verbose_name="ID чата")
+    message = models.TextField(verbose_name="Текст сообщения")
+    parse_mode = models.CharField(max_length=20, default="Markdown", verbose_name="Режим разметки")
+    # Сообщения одной группы (например, "order"), готовые одновременно, воркер склеивает в одну сводку
+    digest_group = models.CharField(max_length=50, blank=True, verbose_name="Группа сводки")
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name="Статус"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Количество попыток")
+    # Время, раньше которого воркер не возьмет запись (используется для backoff)
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    # Чаты (через запятую), куда сообщение уже доставлено: повтор после ошибки в одном
+    # из чатов рассылки отправляется только в оставшиеся
+    delivered_chat_ids = models.TextField(blank=True, verbose_name="Доставлено в чаты")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    sent_at = models.DateTimeField(blank=True, null=True, verbose_name="Дата отправки")
+
+    def __str__(self):
+        return f"Уведомление {self.id} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Уведомление Telegram"
+        verbose_name_plural = "Уведомления Telegram"
+        ordering = ["next_attempt_at", "id"]
+        indexes = [
+            # Воркер выбирает записи по статусу и времени следующей попытки
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_next_idx"),
+        ]
+
+
+class ModerationVerdict(models.Model):
+    """
+    Общий (между процессами) кеш вердиктов модерации.
+    Ключ - хеш нормализованного текста, порогов MISTRAL_MODERATIONS_GRADES и классификатора.
+    """
+
+    key = models.CharField(max_length=64, unique=True, verbose_name="Ключ")
+    is_bad = models.BooleanField(verbose_name="Не прошел модерацию")
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Дата проверки")
+
+    def __str__(self):
+        return f"Вердикт {self.key[:12]}: {'плохой' if self.is_bad else 'хороший'}"
+
+    class Meta:
+        verbose_name = "Вердикт модерации"
+        verbose_name_plural = "Вердикты модерации"
+
+
+class MasterViewerSketch(models.Model):
+    """
+    Фильтр Блума и HyperLogLog посетителей страницы мастера (core/unique_viewers.py).
+    Процессы проверяют и дополняют свои копии в памяти и периодически сливают их
+    с этой строкой - она общая для всех процессов и переживает их перезапуск.
+    """
+
+    master = models.OneToOneField(
+        Master, on_delete=models.CASCADE, primary_key=True, related_name="viewer_sketch", verbose_name="Мастер"
+    )
+    # Номер периода UNIQUE_VIEWERS_PERIOD, к которому относится фильтр Блума
+    bloom_period = models.PositiveIntegerField(default=0, verbose_name="Период фильтра Блума")
+    bloom = models.BinaryField(blank=True, default=b"", verbose_name="Фильтр Блума")
+    hll = models.BinaryField(blank=True, default=b"", verbose_name="HyperLogLog")
+
+    def __str__(self):
+        return f"Посетители мастера {self.master_id}"
+
+    class Meta:
+        verbose_name = "Посетители мастера"
+        verbose_name_plural = "Посетители мастеров"
+
+
+class CacheVersion(models.Model):
+    """
+    Версия закешированного набора данных (core/cache_versions.py). Хранится в БД,
+    чтобы сдвиг версии в одном процессе gunicorn/uvicorn увидели все остальные,
+    даже когда сам кеш локальный для процесса.
+    """
+
+    name = models.CharField(max_length=100, primary_key=True, verbose_name="Набор данных")
+    # Время последнего изменения в микросекундах
+    version = models.BigIntegerField(verbose_name="Версия")
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
+
+    class Meta:
+        verbose_name = "Версия кеша"
+        verbose_name_plural = "Версии кеша"
+
+
+class OrderStatusLog(models.Model):
+    """
+    Журнал смен статусов заказов. Пишется пачками (bulk_create) при массовых переходах
+    в админке (core/order_status.py). Заказ хранится как order_id без внешнего ключа:
+    запись журнала переживает удаление или архивацию заказа, а вставка не проверяет FK.
+    """
+
+    order_id = models.PositiveBigIntegerField(db_index=True, verbose_name="ID заказа")
+    old_status = models.CharField(max_length=20, verbose_name="Старый статус")
+    new_status = models.CharField(max_length=20, verbose_name="Новый статус")
+    changed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="+", verbose_name="Кто изменил",
+    )
+    changed_at = models.DateTimeField(default=timezone.now, verbose_name="Когда изменен")
+
+    def __str__(self):
+        return f"Заказ {self.order_id}: {self.old_status} → {self.new_status}"
+
+    class Meta:
+        verbose_name = "Смена статуса заказа"
+        verbose_name_plural = "Журнал статусов заказов"
+        ordering = ["-changed_at"]
+
+
+class SlotReservation(models.Model):
+    """
+    Занятые заказом слоты сетки времени мастера (шаг BOOKING_SLOT_STEP_MINUTES).
+    Уникальность (master, slot_start) гарантирует сама БД: из двух одновременных
+    записей на одно время вторая получит IntegrityError и откатится (core/reservations.py).
+    """
+
+    master = models.ForeignKey("Master", on_delete=models.CASCADE, related_name="slot_reservations", verbose_name="Мастер")
+    slot_start = models.DateTimeField(verbose_name="Начало слота")
+    order = models.ForeignKey("Order", on_delete=models.CASCADE, related_name="slot_reservations", verbose_name="Заказ")
+
+    def __str__(self):
+        return f"{self.master_id}: {self.slot_start:%Y-%m-%d %H:%M} (заказ {self.order_id})"
+
+    class Meta:
+        verbose_name = "Бронь слота"
+        verbose_name_plural = "Брони слотов"
+        constraints = [
+            models.UniqueConstraint(fields=["master", "slot_start"], name="unique_master_slot"),
+        ]
+
+
+class OrderDailyRollup(models.Model):
+    """
+    Дневной срез заказов: число заказов и выручка (сумма Service.price услуг заказов)
+    по дню создания, статусу и мастеру. Поддерживается инкрементально (core/analytics.py),
+    дашборд аналитики читает только срезы, не сканируя таблицу заказов.
+    Мастер хранится как master_id без внешнего ключа - срез пересчитывается целиком за день.
+    """
+
+    day = models.DateField(db_index=True, verbose_name="День")
+    status = models.CharField(max_length=20, verbose_name="Статус")
+    master_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="ID мастера")
+    orders = models.PositiveIntegerField(default=0, verbose_name="Заказов")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+
+    def __str__(self):
+        return f"{self.day} {self.status} мастер {self.master_id}: {self.orders}"
+
+    class Meta:
+        verbose_name = "Дневной срез заказов"
+        verbose_name_plural = "Дневные срезы заказов"
+
+
+class ServiceDailyRollup(models.Model):
+    """
+    Дневной срез по услугам: сколько заказов включали услугу и выручка по ней,
+    по дню создания заказа и статусу. Заказ с несколькими услугами учитывается в каждой.
+    """
+
+    day = models.DateField(db_index=True, verbose_name="День")
+    status = models.CharField(max_length=20, verbose_name="Статус")
+    service_id = models.PositiveBigIntegerField(verbose_name="ID услуги")
+    orders = models.PositiveIntegerField(default=0, verbose_name="Заказов")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+
+    def __str__(self):
+        return f"{self.day} {self.status} услуга {self.service_id}: {self.orders}"
+
+    class Meta:
+        verbose_name = "Дневной срез по услугам"
+        verbose_name_plural = "Дневные срезы по услугам"
+
+
+class ArchivedOrder(models.Model):
+    """
+    Закрытый заказ (завершен, отменен, спам), перенесенный из Order командой
+    manage.py archive_orders (core/archive.py). id совпадает с id исходного заказа.
+    Рабочая таблица заказов остается маленькой, а архив доступен для поиска
+    на отдельной странице.
+    """
+
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID заказа")
+    client_name = models.CharField(max_length=100, db_index=True, verbose_name="Имя клиента")
+    phone = models.CharField(max_length=20, verbose_name="Телефон клиента")
+    phone_digits = models.CharField(max_length=20, blank=True, db_index=True, verbose_name="Телефон (цифры)")
+    comment = models.TextField(blank=True, verbose_name="Комментарий клиента")
+    status = models.CharField(max_length=50, choices=Order.STATUS_CHOICES, verbose_name="Статус заказа")
+    date_created = models.DateTimeField(db_index=True, verbose_name="Дата создания")
+    date_updated = models.DateTimeField(verbose_name="Дата обновления")
+    master = models.ForeignKey(
+        "Master", on_delete=models.SET_NULL, null=True, blank=True, related_name="archived_orders", verbose_name="Мастер"
+    )
+    services = models.ManyToManyField("Service", related_name="archived_orders", blank=True, verbose_name="Услуги")
+    appointment_date = models.DateTimeField(blank=True, null=True, verbose_name="Дата записи")
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name="Дата архивации")
+
+    def __str__(self):
+        return f"Архивный заказ {self.id} от {self.client_name}"
+
+    class Meta:
+        verbose_name = "Архивный заказ"
+        verbose_name_plural = "Архив заказов"
+        ordering = ["-date_created"]
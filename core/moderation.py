@@ -0,0 +1,130 @@
+"""
+Пакетная модерация отзывов.
+
+Новый отзыв сохраняется со статусом "pending" и не публикуется. Воркер
+(manage.py moderate_reviews) собирает ожидающие отзывы в пачки, проверяет их
+одним запросом к классификатору, применяет пороги MISTRAL_MODERATIONS_GRADES
+к каждому отзыву и одним bulk_update публикует или отклоняет всю пачку.
+
+Пачка "арендуется" так же, как записи очереди Telegram (core/outbox.py):
+отзывы получают статус processing и moderation_lease_until, поэтому два воркера
+не проверяют один отзыв дважды. Если воркер упадет, отзывы снова станут
+доступны после окончания аренды.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .mistral import classify_reviews
+from .models import Review, TelegramOutbox
+from .ratings import apply_contribution_change, apply_published_reviews
+
+logger = logging.getLogger(__name__)
+
+
+def build_review_message(review: Review) -> str:
+    """Текст уведомления в Telegram об опубликованном отзыве"""
+    return f"""
+*Новый отзыв от клиента*
+*Имя:* {review.client_name}
+*Текст:* {review.text}
+*Оценка:* {review.rating}
+*Ссылка на отзыв:* http://127.0.0.1:8000/admin/core/review/{review.id}/change/
+
+#отзыв
+"""
+
+
+def claim_pending_reviews(batch_size: int) -> tuple[list[Review], datetime]:
+    """
+    Забирает пачку ожидающих отзывов: отзывы получают статус processing и
+    аренду на REVIEW_MODERATION_LEASE_SECONDS. Отзывы, аренда которых истекла
+    (воркер упал посреди пачки), забираются снова.
+    Возвращает отзывы и время окончания аренды.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=settings.REVIEW_MODERATION_LEASE_SECONDS)
+
+    with transaction.atomic():
+        # skip_locked работает на PostgreSQL; на SQLite транзакции и так сериализуются
+        reviews = list(
+            Review.objects.select_for_update(skip_locked=True)
+            .filter(Q(moderation_status="pending")
+                    | Q(moderation_status="processing", moderation_lease_until__lte=now))
+            .order_by("created_at", "id")[:batch_size]
+        )
+        if reviews:
+            Review.objects.filter(pk__in=[review.pk for review in reviews]).update(
+                moderation_status="processing", moderation_lease_until=lease_until
+            )
+    return reviews, lease_until
+
+
+def release_reviews(reviews: list[Review], lease_until: datetime) -> None:
+    """Возвращает арендованные отзывы в очередь (например, если классификатор недоступен)"""
+    Review.objects.filter(
+        pk__in=[review.pk for review in reviews],
+        moderation_status="processing", moderation_lease_until=lease_until,
+    ).update(moderation_status="pending", moderation_lease_until=None)
+
+
+def moderate_pending_reviews(batch_size: int, classifier=None, grades: dict | None = None) -> tuple[int, int]:
+    """
+    Модерирует одну пачку ожидающих отзывов.
+    Возвращает кортеж (опубликовано, отклонено).
+    """
+    reviews, lease_until = claim_pending_reviews(batch_size)
+    if not reviews:
+        return 0, 0
+
+    try:
+        verdicts = classify_reviews(
+            [review.text for review in reviews],
+            grades=grades or settings.MISTRAL_MODERATIONS_GRADES,
+            classifier=classifier,
+        )
+    except Exception:
+        release_reviews(reviews, lease_until)
+        raise
+    verdict_by_id = {review.pk: is_bad for review, is_bad in zip(reviews, verdicts)}
+
+    # Статусы отзывов, рейтинг мастеров и уведомления об опубликованных - одной транзакцией
+    with transaction.atomic():
+        # Пока шла проверка, отзыв могли изменить в админке или удалить, а аренду -
+        # перехватить после ее окончания. Берем только отзывы, которые все еще за нами,
+        # и флаг публикации читаем заново: иначе рейтинг мастера изменится дважды
+        reviews = list(
+            Review.objects.select_for_update()
+            .filter(pk__in=verdict_by_id, moderation_status="processing", moderation_lease_until=lease_until)
+            .order_by("created_at", "id")
+        )
+
+        approved = []
+        # Отзывы, у которых меняется флаг публикации, - для обновления рейтинга мастеров
+        newly_published, newly_hidden = [], []
+        for review in reviews:
+            is_bad = verdict_by_id[review.pk]
+            if review.is_published == is_bad:
+                (newly_hidden if is_bad else newly_published).append(review)
+            review.is_published = not is_bad
+            review.moderation_status = "rejected" if is_bad else "approved"
+            review.moderation_lease_until = None
+            if is_bad:
+                logger.info(f"Отзыв {review.pk} ({review.client_name}) отклонен модерацией")
+            else:
+                approved.append(review)
+
+        Review.objects.bulk_update(reviews, ["is_published", "moderation_status", "moderation_lease_until"])
+        # bulk_update не вызывает сигналы - рейтинг обновляем явно
+        apply_published_reviews(newly_published)
+        for review in newly_hidden:
+            apply_contribution_change((review.master_id, review.rating), None)
+        TelegramOutbox.objects.bulk_create(
+            [TelegramOutbox(message=build_review_message(review)) for review in approved]
+        )
+
+    return len(approved), len(reviews) - len(approved)
@@ -0,0 +1,148 @@
+"""
+Кеш вердиктов модерации отзывов.
+
+Спам приходит пачками одинаковых текстов, и каждая копия стоила отдельного
+запроса к Mistral. Вердикт зависит только от текста, порогов и классификатора,
+поэтому кешируется по хешу от них в два уровня:
+
+1. LRU + TTL в памяти процесса - ответ за микросекунды;
+2. таблица ModerationVerdict в БД - общая для всех процессов и переживает перезапуск.
+
+Счетчики попаданий/промахов доступны через verdict_cache.stats().
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ModerationVerdict
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация текста: регистр и пробелы не влияют на вердикт"""
+    return " ".join(text.casefold().split())
+
+
+def make_verdict_key(text: str, grades: dict, classifier_name: str = "") -> str:
+    """Ключ кеша: sha256 от классификатора, порогов и нормализованного текста"""
+    payload = json.dumps([classifier_name, grades, normalize_text(text)], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ModerationVerdictCache:
+    """Двухуровневый кеш вердиктов (память процесса + БД) со счетчиками"""
+
+    def __init__(self, maxsize: int, ttl: float, db_ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.db_ttl = db_ttl
+        # key -> (вердикт, время истечения); порядок элементов = порядок использования (LRU)
+        self._entries: OrderedDict[str, tuple[bool, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "evictions": 0}
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def get_local(self, key: str) -> bool | None:
+        """Вердикт из памяти процесса или None (просроченные записи удаляются)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            verdict, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return verdict
+
+    def set_local(self, key: str, verdict: bool) -> None:
+        """Кладет вердикт в память, вытесняя самые давно использованные записи"""
+        with self._lock:
+            self._entries[key] = (verdict, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def classify(self, texts: list[str], grades: dict, classify_batch, classifier_name: str = "") -> list[bool]:
+        """
+        Возвращает вердикты для texts, обращаясь к classify_batch только за текстами,
+        которых нет ни в одном уровне кеша. Одинаковые тексты внутри пачки
+        отправляются на проверку один раз.
+        """
+        keys = [make_verdict_key(text, grades, classifier_name) for text in texts]
+        verdicts: dict[str, bool] = {}
+
+        # 1. Память процесса
+        for key in keys:
+            verdict = self.get_local(key)
+            if verdict is not None:
+                verdicts[key] = verdict
+        self._count("memory_hits", sum(1 for key in keys if key in verdicts))
+
+        # 2. Общая таблица в БД - одним запросом на всю пачку
+        missing = {key for key in keys if key not in verdicts}
+        if missing:
+            fresh_since = timezone.now() - timedelta(seconds=self.db_ttl)
+            for key, is_bad in ModerationVerdict.objects.filter(
+                key__in=missing, created_at__gte=fresh_since
+            ).values_list("key", "is_bad"):
+                verdicts[key] = is_bad
+                self.set_local(key, is_bad)
+            self._count("db_hits", sum(1 for key in keys if key in missing and key in verdicts))
+
+        # 3. Классификатор - только уникальные тексты, которых нет в кеше
+        to_classify = {}
+        for key, text in zip(keys, texts):
+            if key not in verdicts:
+                to_classify.setdefault(key, text)
+        self._count("misses", sum(1 for key in keys if key not in verdicts))
+
+        if to_classify:
+            results = classify_batch(list(to_classify.values()))
+            now = timezone.now()
+            new_rows = []
+            for key, is_bad in zip(to_classify, results):
+                verdicts[key] = is_bad
+                self.set_local(key, is_bad)
+                new_rows.append(ModerationVerdict(key=key, is_bad=is_bad, created_at=now))
+            # Просроченные записи перезаписываются свежим вердиктом
+            ModerationVerdict.objects.bulk_create(
+                new_rows, update_conflicts=True, unique_fields=["key"], update_fields=["is_bad", "created_at"]
+            )
+
+        return [verdicts[key] for key in keys]
+
+    def purge_expired(self) -> int:
+        """Удаляет просроченные вердикты из БД. Возвращает количество удаленных"""
+        expired_before = timezone.now() - timedelta(seconds=self.db_ttl)
+        deleted, _ = ModerationVerdict.objects.filter(created_at__lt=expired_before).delete()
+        return deleted
+
+    def clear_local(self) -> None:
+        """Очищает кеш в памяти процесса (БД не затрагивается)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Счетчики кеша и доля попаданий"""
+        with self._lock:
+            stats = dict(self._counters, size=len(self._entries))
+        total = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["db_hits"]) / total, 3) if total else 0.0
+        return stats
+
+
+verdict_cache = ModerationVerdictCache(
+    maxsize=settings.MODERATION_CACHE_MAXSIZE,
+    ttl=settings.MODERATION_CACHE_TTL,
+    db_ttl=settings.MODERATION_CACHE_DB_TTL,
+)
@@ -0,0 +1,90 @@
+"""
+Уведомления о новых заказах.
+
+Сигнал m2m_changed срабатывает на каждое добавление услуг в заказ. Первое
+срабатывание сразу пишет строку в очередь (TelegramOutbox) - в той же транзакции,
+что и заказ, поэтому уведомление не теряется при падении процесса после коммита
+и исчезает вместе с откатом заказа. Следующие срабатывания той же транзакции
+дописывают id услуг и переписывают текст той же строки. Сообщение собирается
+из уже загруженных данных (мастер из кеша связи, услуги из формы) и ставится
+в очередь с digest_group="order" - заказы, пришедшие в одно окно, воркер
+отправит одной сводкой.
+"""
+from django.db import transaction
+
+from .models import Order, Service, TelegramOutbox
+from .outbox import enqueue_telegram_message
+
+ORDER_DIGEST_GROUP = "order"
+
+
+def build_order_message(order: Order, service_names: list[str]) -> str:
+    """Текст уведомления о новой записи"""
+    # Форматирование даты и времени для желаемой даты записи, и даты создания услуги
+    if order.appointment_date:
+        appointment_date = order.appointment_date.strftime("%d.%m.%Y %H:%M")
+    else:
+        appointment_date = 'не указана'
+
+    # Форматируем дату создания
+    date_created = order.date_created.strftime("%d.%m.%Y %H:%M")
+
+    master = order.master
+    master_name = f"{master.first_name} {master.last_name}" if master else "не выбран"
+    master_tag = f" #{master.last_name.lower()}" if master else ""
+
+    return f"""
+*Новая запись на консультацию*
+
+*Имя:* {order.client_name}
+*Телефон:* {order.phone or 'не указан'}
+*Комментарий:* {order.comment or 'не указан'}
+*Услуги:* {', '.join(service_names) or 'не указаны'}
+*Дата создания:* {date_created}
+*Мастер:* {master_name}
+*Желаемая дата записи:* {appointment_date}
+*Ссылка на админ-панель:* http://127.0.0.1:8000/admin/core/order/{order.id}/change/
+
+#запись{master_tag}
+-------------------------------------------------------------
+"""
+
+
+def get_service_names(order: Order, service_ids: set[int]) -> list[str]:
+    """
+    Названия добавленных услуг. Если форма передала уже загруженные услуги
+    (order._loaded_services), запрос к БД не нужен.
+    """
+    loaded = getattr(order, "_loaded_services", None)
+    if loaded is not None:
+        names = [service.name for service in loaded if service.pk in service_ids]
+        if len(names) == len(service_ids):
+            return names
+    return list(Service.objects.filter(pk__in=service_ids).values_list("name", flat=True))
+
+
+def schedule_order_notification(order: Order, service_ids) -> None:
+    """
+    Ставит одно уведомление на заказ в очередь в текущей транзакции.
+    Повторные вызовы для того же заказа дополняют список услуг в уже созданной записи.
+    """
+    pending_ids = getattr(order, "_notification_service_ids", None)
+    if pending_ids is not None:
+        if set(service_ids) <= pending_ids:
+            return
+        pending_ids.update(service_ids)
+        message = build_order_message(order, get_service_names(order, pending_ids))
+        # update() по pk: после отката транзакции записи уже нет - тогда ничего не делаем
+        TelegramOutbox.objects.filter(pk=order._notification_entry_id).update(message=message)
+        return
+
+    order._notification_service_ids = set(service_ids)
+    message = build_order_message(order, get_service_names(order, order._notification_service_ids))
+    order._notification_entry_id = enqueue_telegram_message(message, digest_group=ORDER_DIGEST_GROUP).pk
+    # После коммита следующие изменения этого экземпляра заказа - уже новое событие
+    transaction.on_commit(lambda: _forget_notification(order))
+
+
+def _forget_notification(order: Order) -> None:
+    order.__dict__.pop("_notification_service_ids", None)
+    order.__dict__.pop("_notification_entry_id", None)
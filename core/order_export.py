@@ -0,0 +1,227 @@
+"""
+Потоковая выгрузка заказов в CSV и XLSX.
+
+Выгрузка идет одним SQL-запросом: мастер - через JOIN, услуги и их суммарная
+стоимость - коррелированными подзапросами по индексу order_id таблицы связей
+(без GROUP BY, поэтому порядок строк берется прямо из индекса created_at_idx).
+Строки читаются курсором пачками по ORDERS_EXPORT_CHUNK_SIZE (.iterator()),
+ответ отдается через StreamingHttpResponse. В памяти процесса одновременно
+находится только одна пачка строк, сколько бы заказов ни попало в выгрузку.
+
+XLSX собирается без сторонних библиотек: zipfile умеет писать архив в поток без
+seek, а лист пишется построчно inline-строками (без таблицы sharedStrings).
+
+Данные в выгрузку пишут клиенты (имя, комментарий), поэтому текстовые ячейки CSV,
+начинающиеся с =, +, - или @, экранируются апострофом - иначе Excel выполнит их как
+формулу (CSV injection). Телефоны ("+7 (701) 123-45-67") выгружаются как есть: кроме
+цифр, пробелов, скобок и дефисов в них ничего нет, исполнять там нечего. Ячейки XLSX - inline-строки, формулами они не бывают, но из них
+удаляются управляющие символы, недопустимые в XML 1.0: с ними Excel не откроет файл.
+"""
+import csv
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Aggregate, CharField, DecimalField, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import Order
+
+# Заголовки колонок выгрузки
+EXPORT_COLUMNS = [
+    "ID", "Создан", "Дата записи", "Статус", "Клиент", "Телефон",
+    "Мастер", "Услуги", "Стоимость", "Комментарий",
+]
+
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# Управляющие символы, запрещенные в XML 1.0 (разрешены только \t, \n и \r)
+XML_ILLEGAL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+# Первые символы, с которых Excel и LibreOffice начинают формулу
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+# Значение целиком похоже на телефон - экранировать не нужно
+CSV_PHONE_RE = re.compile(r"^\+?[\d\s()-]+$")
+
+
+class GroupConcat(Aggregate):
+    """
+    Значения группы одной строкой через запятую - названия услуг заказа.
+    Своя функция у каждого встроенного бэкенда Django: GROUP_CONCAT (SQLite, MySQL),
+    STRING_AGG (PostgreSQL), LISTAGG (Oracle).
+    """
+    function = "GROUP_CONCAT"
+    template = "%(function)s(%(expressions)s, ', ')"
+    output_field = CharField()
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        # В MySQL второй аргумент GROUP_CONCAT - еще одно значение, а не разделитель
+        return self.as_sql(compiler, connection, template="%(function)s(%(expressions)s SEPARATOR ', ')",
+                           **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function="STRING_AGG",
+                           template="%(function)s(%(expressions)s::text, ', ')", **extra_context)
+
+    def as_oracle(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function="LISTAGG",
+                           template="%(function)s(%(expressions)s, ', ') WITHIN GROUP (ORDER BY %(expressions)s)",
+                           **extra_context)
+
+
+def export_rows(queryset, chunk_size: int | None = None):
+    """
+    Строки выгрузки (списки значений в порядке EXPORT_COLUMNS) для отфильтрованного queryset.
+    Сортировка - от новых заказов к старым, как в списке заказов.
+    """
+    chunk_size = chunk_size or settings.ORDERS_EXPORT_CHUNK_SIZE
+    links = Order.services.through.objects.filter(order_id=OuterRef("pk")).order_by().values("order_id")
+    rows = (
+        queryset.order_by("-date_created", "-pk")
+        .annotate(
+            services_names=Subquery(links.annotate(names=GroupConcat("service__name")).values("names")),
+            services_total=Subquery(
+                links.annotate(total=Sum("service__price")).values("total"),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+        .values_list(
+            "pk", "date_created", "appointment_date", "status", "client_name", "phone",
+            "master__first_name", "master__last_name", "services_names", "services_total", "comment",
+        )
+    )
+    statuses = dict(Order.STATUS_CHOICES)
+    for (pk, created, appointment, status, client_name, phone,
+         first_name, last_name, services, total, comment) in rows.iterator(chunk_size=chunk_size):
+        yield [
+            pk,
+            _format_datetime(created),
+            _format_datetime(appointment),
+            statuses.get(status, status),
+            client_name,
+            phone,
+            f"{first_name} {last_name}" if first_name else "",
+            services or "",
+            total or 0,
+            comment or "",
+        ]
+
+
+def _format_datetime(value) -> str:
+    return timezone.localtime(value).strftime("%Y-%m-%d %H:%M") if value else ""
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: write() возвращает строку, а не пишет ее"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    """Текст, который табличный редактор принял бы за формулу, начинается с апострофа (кроме телефонов)"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES) and not CSV_PHONE_RE.fullmatch(value):
+        return "'" + value
+    return value
+
+
+def stream_csv(rows):
+    """Генератор CSV. BOM в начале - чтобы Excel открыл кириллицу в UTF-8"""
+    writer = csv.writer(_Echo())
+    yield "\ufeff" + writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+class _ZipStream:
+    """Файлоподобный приемник для zipfile без seek: накопленные байты забираются через drain()"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+_XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Заказы" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(values) -> str:
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float, Decimal)):
+            cells.append(f"<c t=\"n\"><v>{value}</v></c>")
+        else:
+            text = escape(XML_ILLEGAL_CHARS.sub("", str(value)))
+            cells.append(f"<c t=\"inlineStr\"><is><t xml:space=\"preserve\">{text}</t></is></c>")
+    return "<row>" + "".join(cells) + "</row>"
+
+
+def stream_xlsx(rows, flush_every: int = 500):
+    """Генератор XLSX: архив пишется в память порциями и сразу отдается клиенту"""
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(EXPORT_COLUMNS).encode())
+            for index, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row).encode())
+                if index % flush_every == 0:
+                    yield stream.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield stream.drain()
@@ -0,0 +1,200 @@
+"""
+Полнотекстовый поиск заказов.
+
+Раньше OrdersListView искал через phone/client_name/comment__icontains - на SQLite
+это LIKE '%...%' и полный проход по таблице при каждом поиске. Теперь поиск идет по
+виртуальной таблице SQLite FTS5 с триграммным токенизатором (core_order_fts):
+триграммы находят подстроку в любом месте строки, как и icontains, но по индексу.
+
+Таблица хранит только индекс (content='core_order'), а в синхронизации с core_order
+ее держат триггеры БД (миграция 0007): индекс обновляется построчно при каждом
+INSERT/DELETE и UPDATE полей поиска - в том числе при queryset.update() и bulk_create,
+которые не вызывают сигналы. Полная перестройка - manage.py rebuild_order_search.
+
+Важно: миграции SQLite, меняющие колонки core_order, пересоздают таблицу, и триггеры
+при этом пропадают. Такая миграция должна сама создать их заново - SQL триггеров
+копируется в миграцию (как в 0008_phone_digits), а не импортируется отсюда, чтобы
+старые миграции не зависели от текущего кода. Если триггеры все же потерялись,
+manage.py rebuild_order_search восстановит их и перестроит индекс.
+
+На других СУБД и для запросов короче трех символов (триграммам не из чего
+собраться) используется прежний поиск через icontains.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, QuerySet, When
+from django.db.models.expressions import RawSQL
+
+from .models import Order
+from .phones import is_phone_like, phone_prefix_q
+
+FTS_TABLE = "core_order_fts"
+
+# Поля поиска: значение чекбокса search_in -> колонка индекса / поле модели
+SEARCH_FIELDS = {
+    "phone": "phone",
+    "name": "client_name",
+    "comment": "comment",
+}
+
+MIN_QUERY_LENGTH = 3  # Триграммный индекс не ищет строки короче трех символов
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        phone, client_name, comment,
+        content='core_order', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON core_order BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, phone, client_name, comment)
+        VALUES (new.id, new.phone, new.client_name, new.comment);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON core_order BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, phone, client_name, comment)
+        VALUES ('delete', old.id, old.phone, old.client_name, old.comment);
+    END
+    """,
+    # Смена статуса и прочих полей индекс не трогает - только поля поиска
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF phone, client_name, comment ON core_order BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, phone, client_name, comment)
+        VALUES ('delete', old.id, old.phone, old.client_name, old.comment);
+        INSERT INTO {FTS_TABLE}(rowid, phone, client_name, comment)
+        VALUES (new.id, new.phone, new.client_name, new.comment);
+    END
+    """,
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def supports_fts(connection) -> bool:
+    """Есть ли в SQLite модуль FTS5 с триграммным токенизатором (SQLite 3.34+)"""
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+            cursor.execute("DROP TABLE temp.fts_probe")
+        except Exception:
+            return False
+    return True
+
+
+def create_search_index(connection, optimize: bool = True) -> bool:
+    """
+    Создает индекс и недостающие триггеры синхронизации и заполняет индекс.
+    False - если FTS недоступен.
+    """
+    if not supports_fts(connection):
+        return False
+    with connection.cursor() as cursor:
+        for sql in CREATE_SQL:
+            cursor.execute(sql)
+    rebuild_search_index(connection, optimize=optimize)
+    return True
+
+
+def drop_search_index(connection) -> None:
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+def rebuild_search_index(connection, optimize: bool = True) -> None:
+    """Перестраивает индекс по текущему содержимому core_order"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        if optimize:
+            # Сливает сегменты индекса в один - поиск после массовой загрузки быстрее
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+@lru_cache(maxsize=None)
+def is_search_index_available(alias: str = "default") -> bool:
+    """Создан ли индекс в БД (проверяется один раз на процесс)"""
+    connection = connections[alias]
+    return connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names()
+
+
+def build_match_query(search_query: str, fields: list[str]) -> str:
+    """
+    Строит выражение MATCH: поисковая строка целиком как фраза (кавычки экранируются),
+    ограниченная выбранными колонками - {phone client_name}: "..."
+    """
+    phrase = '"' + search_query.replace('"', '""') + '"'
+    return "{" + " ".join(fields) + "}: " + phrase
+
+
+def _icontains_filter(search_query: str, fields: list[str]) -> Q:
+    filters = Q()
+    for field in fields:
+        filters |= Q(**{f"{field}__icontains": search_query})
+    return filters
+
+
+def search_orders(queryset: QuerySet, search_query: str, search_in: list[str], by_relevance: bool = False) -> QuerySet:
+    """
+    Фильтрует заказы по поисковой строке в выбранных полях (значения чекбоксов search_in).
+
+    Если строка похожа на телефон, поле "phone" ищется не полнотекстово, а по префиксу
+    нормализованного phone_digits (индексный диапазон, см. core/phones.py) - тогда
+    "+7 (701) 123" и "8701123" находят одни и те же заказы.
+
+    by_relevance=True - сортировка по bm25 (лучшие совпадения первыми, совпадения по
+    телефону - выше всех). Ранжированный список id ограничен ORDER_SEARCH_MAX_RANKED,
+    чтобы не тянуть в Python весь результат.
+    """
+    search_query = search_query.strip()
+    fields = [SEARCH_FIELDS[key] for key in search_in if key in SEARCH_FIELDS]
+    if not search_query or not fields:
+        return queryset
+
+    phone_q = None
+    if "phone" in fields and is_phone_like(search_query):
+        phone_q = phone_prefix_q(search_query)
+        fields.remove("phone")
+
+    if not fields:
+        return queryset.filter(phone_q)
+
+    # Полнотекстовый индекс есть только у рабочей таблицы заказов; архив (ArchivedOrder) ищется через LIKE
+    if (len(search_query) < MIN_QUERY_LENGTH or queryset.model is not Order
+            or not is_search_index_available(queryset.db)):
+        text_q = _icontains_filter(search_query, fields)
+        return queryset.filter(text_q | phone_q if phone_q else text_q)
+
+    match = build_match_query(search_query, fields)
+    if not by_relevance:
+        text_q = Q(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+        return queryset.filter(text_q | phone_q if phone_q else text_q)
+
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}) LIMIT %s",
+            [match, settings.ORDER_SEARCH_MAX_RANKED],
+        )
+        ranked_ids = [row[0] for row in cursor.fetchall()]
+
+    whens = [When(pk=pk, then=position) for position, pk in enumerate(ranked_ids)]
+    if phone_q:
+        whens.insert(0, When(phone_q, then=-1))
+    elif not ranked_ids:
+        return queryset.none()
+
+    text_q = Q(pk__in=ranked_ids)
+    ranking = Case(*whens, default=len(ranked_ids), output_field=IntegerField())
+    return queryset.filter(text_q | phone_q if phone_q else text_q).annotate(search_rank=ranking).order_by("search_rank", "-date_created")
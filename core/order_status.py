@@ -0,0 +1,102 @@
+"""
+Массовая смена статусов заказов.
+
+Раньше действия админки делали queryset.update(status=...): без проверки
+допустимости перехода, без истории, и date_updated не менялся (update() не
+учитывает auto_now). Теперь переход проверяется по Order.STATUS_TRANSITIONS,
+выполняется пачками по chunk_size заказов (каждая пачка - своя короткая
+транзакция, SQLite не блокируется на все время операции), а каждая смена
+статуса записывается в OrderStatusLog одним bulk_create на пачку.
+Отмена и спам освобождают забронированное время мастера (core/reservations.py)
+в той же транзакции пачки, и в ней же вклад заказов пачки переносится в срезы
+аналитики нового статуса (core/analytics.py).
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderStatusLog
+from .reservations import RELEASING_STATUSES, release_order_slots
+from .analytics import apply_status_change
+
+
+@dataclass
+class TransitionResult:
+    changed: int = 0  # Заказы, переведенные в новый статус
+    unchanged: int = 0  # Заказы, уже находившиеся в этом статусе
+    rejected: int = 0  # Заказы, для которых переход недопустим
+
+
+def allowed_sources(new_status: str) -> list[str]:
+    """Статусы, из которых допустим переход в new_status"""
+    return [status for status, targets in Order.STATUS_TRANSITIONS.items() if new_status in targets]
+
+
+def transition_orders(queryset, new_status: str, user=None, chunk_size: int | None = None) -> TransitionResult:
+    """
+    Переводит заказы из queryset в new_status там, где переход допустим.
+    Заказы выбираются пачками по pk (keyset), поэтому размер выборки не ограничен.
+    """
+    if new_status not in dict(Order.STATUS_CHOICES):
+        raise ValueError(f"Неизвестный статус заказа: {new_status}")
+    chunk_size = chunk_size or settings.ORDER_STATUS_CHUNK_SIZE
+    sources = allowed_sources(new_status)
+    # Заказы, которые не двигаем, считаем до перехода двумя агрегатами, без перебора строк
+    remaining = queryset.order_by().exclude(status__in=sources)
+    result = TransitionResult(
+        unchanged=remaining.filter(status=new_status).count(),
+        rejected=remaining.exclude(status=new_status).count(),
+    )
+
+    candidates = queryset.order_by().filter(status__in=sources).order_by("pk")
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                candidates.select_for_update().filter(pk__gt=last_pk).values_list("pk", "status")[:chunk_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            result.changed += _apply_chunk(rows, new_status, user)
+
+    return result
+
+
+def _apply_chunk(rows: list[tuple[int, str]], new_status: str, user) -> int:
+    """Один UPDATE на каждый исходный статус пачки + одна вставка в журнал"""
+    now = timezone.now()
+    by_status: dict[str, list[int]] = {}
+    for pk, status in rows:
+        by_status.setdefault(status, []).append(pk)
+
+    logs = []
+    for old_status, ids in by_status.items():
+        # status=old_status в условии защищает от параллельной смены статуса между SELECT и UPDATE
+        updated = Order.objects.filter(pk__in=ids, status=old_status).update(status=new_status, date_updated=now)
+        if updated != len(ids):
+            # Часть заказов успели изменить - в журнал пишем только реально переведенные
+            ids = list(Order.objects.filter(pk__in=ids, status=new_status, date_updated=now).values_list("pk", flat=True))
+        logs += [
+            OrderStatusLog(order_id=pk, old_status=old_status, new_status=new_status,
+                           changed_by=user, changed_at=now)
+            for pk in ids
+        ]
+        # update() не отправляет сигналы - срезы аналитики сдвигаем явно
+        apply_status_change(ids, old_status)
+    OrderStatusLog.objects.bulk_create(logs)
+    changed_ids = [log.order_id for log in logs]
+    if new_status in RELEASING_STATUSES:
+        release_order_slots(changed_ids)
+    return len(logs)
+
+
+def log_status_change(order, old_status: str, user=None) -> None:
+    """Запись в журнал для одиночного сохранения заказа (форма админки, list_editable)"""
+    if old_status and old_status != order.status:
+        OrderStatusLog.objects.create(
+            order_id=order.pk, old_status=old_status, new_status=order.status,
+            changed_by=user, changed_at=order.date_updated or timezone.now(),
+        )
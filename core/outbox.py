@@ -0,0 +1,234 @@
+"""
+Очередь уведомлений Telegram (Transactional Outbox).
+
+Сигналы не ходят в Telegram сами - они только пишут строку в TelegramOutbox
+в той же транзакции, что и заказ или отзыв. Отправкой занимается воркер
+(manage.py telegram_worker), который забирает записи пачками, а при ошибке
+откладывает повторную попытку с экспоненциальной задержкой.
+
+Сообщения с digest_group (например, уведомления о заказах) ждут короткое "окно":
+все сообщения группы, пришедшие за это окно, воркер отправит одной сводкой.
+
+Сообщение без явного чата рассылается во все чаты TELEGRAM_CHAT_IDS. Доставка
+отмечается по каждому чату (delivered_chat_ids), поэтому после ошибки в одном
+чате повтор уходит только в те, куда сообщение еще не дошло.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import TelegramOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def get_digest_send_time(digest_group: str, chat_id: str = ""):
+    """
+    Время отправки сообщения группы: если окно сводки уже открыто (в очереди есть
+    сообщение группы, ожидающее отправки), присоединяемся к нему, иначе открываем новое.
+    """
+    now = timezone.now()
+    window_end = TelegramOutbox.objects.filter(
+        status="pending", digest_group=digest_group, chat_id=chat_id, attempts=0, next_attempt_at__gt=now
+    ).aggregate(window_end=Min("next_attempt_at"))["window_end"]
+    return window_end or now + timedelta(seconds=settings.TELEGRAM_DIGEST_WINDOW_SECONDS)
+
+
+def enqueue_telegram_message(
+    message: str, chat_id: str = "", parse_mode: str = "Markdown", digest_group: str = ""
+) -> TelegramOutbox:
+    """Ставит сообщение в очередь на отправку. Вызывать внутри транзакции бизнес-операции."""
+    chat_id = chat_id or ""
+    next_attempt_at = get_digest_send_time(digest_group, chat_id) if digest_group else timezone.now()
+    return TelegramOutbox.objects.create(
+        chat_id=chat_id,
+        message=message,
+        parse_mode=parse_mode,
+        digest_group=digest_group,
+        next_attempt_at=next_attempt_at,
+    )
+
+
+def get_backoff_delay(attempts: int) -> timedelta:
+    """
+    Экспоненциальная задержка перед следующей попыткой: base * 2^(attempts - 1),
+    но не больше максимума. Небольшой случайный разброс (jitter) не дает
+    всем упавшим сообщениям повторяться в одну и ту же секунду.
+    """
+    base = settings.TELEGRAM_OUTBOX_BACKOFF_SECONDS
+    maximum = settings.TELEGRAM_OUTBOX_BACKOFF_MAX_SECONDS
+    delay = min(base * 2 ** max(attempts - 1, 0), maximum)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def get_batch_limit(batch_size: int) -> int:
+    """
+    Размер пачки, которую воркер успевает отправить за время аренды.
+    Если все записи пачки идут в одну группу, Telegram пропускает их со скоростью
+    TELEGRAM_GROUP_RATE (20 в минуту): 50 записей - это 150 секунд, дольше аренды,
+    и другой воркер забрал бы те же записи повторно. Берется половина аренды -
+    запас на ожидание по ответам 429 (RetryAfter).
+    """
+    slowest_rate = min(settings.TELEGRAM_CHAT_RATE, settings.TELEGRAM_GROUP_RATE)
+    return max(1, min(batch_size, int(settings.TELEGRAM_OUTBOX_LEASE_SECONDS * slowest_rate / 2)))
+
+
+def claim_batch(batch_size: int) -> list[TelegramOutbox]:
+    """
+    Забирает пачку готовых к отправке записей.
+    Записи "арендуются": получают статус processing, а next_attempt_at сдвигается
+    на время аренды. Если воркер упадет посреди отправки, сообщения снова
+    станут доступны после ее окончания.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=settings.TELEGRAM_OUTBOX_LEASE_SECONDS)
+
+    with transaction.atomic():
+        # skip_locked работает на PostgreSQL; на SQLite транзакции и так сериализуются
+        entries = list(
+            TelegramOutbox.objects.select_for_update(skip_locked=True)
+            .filter(Q(status="pending") | Q(status="processing"), next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if entries:
+            TelegramOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+                status="processing", next_attempt_at=lease_until
+            )
+    return entries
+
+
+def mark_sent(entry: TelegramOutbox) -> None:
+    """Отмечает запись как успешно отправленную."""
+    entry.status = "sent"
+    entry.attempts += 1
+    entry.sent_at = timezone.now()
+    entry.last_error = ""
+    entry.save(update_fields=["status", "attempts", "sent_at", "last_error", "delivered_chat_ids"])
+
+
+def mark_failed(entry: TelegramOutbox, error: Exception, max_attempts: int) -> None:
+    """
+    Фиксирует неудачную попытку. Пока попытки не исчерпаны, запись остается
+    в очереди и будет повторена после задержки, иначе получает статус failed.
+    """
+    entry.attempts += 1
+    entry.last_error = str(error)[:2000]
+    entry.status = "pending"
+    if entry.attempts >= max_attempts:
+        entry.status = "failed"
+        logger.error(f"Уведомление {entry.pk} не отправлено после {entry.attempts} попыток: {error}")
+    else:
+        entry.next_attempt_at = timezone.now() + get_backoff_delay(entry.attempts)
+        logger.warning(f"Уведомление {entry.pk}: попытка {entry.attempts} не удалась, повтор в {entry.next_attempt_at}")
+    entry.save(update_fields=["status", "attempts", "last_error", "next_attempt_at", "delivered_chat_ids"])
+
+
+def pack_digest(entries: list[TelegramOutbox], limit: int) -> list[tuple[str, list[TelegramOutbox]]]:
+    """
+    Склеивает сообщения группы в сводки не длиннее limit символов.
+    Возвращает список (текст сводки, вошедшие в нее записи).
+    """
+    digests = []
+    chunk, length = [], 0
+    for entry in entries:
+        if chunk and length + len(entry.message) > limit:
+            digests.append(chunk)
+            chunk, length = [], 0
+        chunk.append(entry)
+        length += len(entry.message)
+    if chunk:
+        digests.append(chunk)
+
+    result = []
+    for chunk in digests:
+        if len(chunk) == 1:
+            result.append((chunk[0].message, chunk))
+        else:
+            header = f"*Сводка: {len(chunk)} новых уведомлений*\n"
+            result.append((header + "\n".join(entry.message for entry in chunk), chunk))
+    return result
+
+
+def get_delivered_chat_ids(entry: TelegramOutbox) -> list[str]:
+    return [chat_id for chat_id in entry.delivered_chat_ids.split(",") if chat_id]
+
+
+def mark_delivered(entry: TelegramOutbox, chat_ids) -> None:
+    """Запоминает чаты, куда запись доставлена (сохраняется вместе с mark_sent/mark_failed)"""
+    delivered = get_delivered_chat_ids(entry)
+    delivered += [chat_id for chat_id in chat_ids if chat_id not in delivered]
+    entry.delivered_chat_ids = ",".join(delivered)
+
+
+def get_chat_ids(entry: TelegramOutbox) -> tuple[str, ...]:
+    """
+    Чаты, куда запись еще не доставлена: явно указанный или все чаты
+    по умолчанию (settings.TELEGRAM_CHAT_IDS)
+    """
+    chat_ids = (entry.chat_id,) if entry.chat_id else tuple(settings.TELEGRAM_CHAT_IDS)
+    delivered = get_delivered_chat_ids(entry)
+    return tuple(chat_id for chat_id in chat_ids if chat_id not in delivered)
+
+
+def build_deliveries(entries: list[TelegramOutbox]) -> list[tuple[tuple, str, str, list[TelegramOutbox]]]:
+    """
+    Превращает пачку записей в список отправок (chat_ids, текст, parse_mode, записи).
+    Обычные записи отправляются как есть, записи с digest_group - сводками.
+    Записи, уже доставленные во все чаты (воркер упал до mark_sent), сразу отмечаются отправленными.
+    """
+    deliveries = []
+    groups: dict[tuple, list[TelegramOutbox]] = {}
+    for entry in entries:
+        chat_ids = get_chat_ids(entry)
+        if not chat_ids and entry.delivered_chat_ids:
+            mark_sent(entry)
+        elif entry.digest_group:
+            groups.setdefault((entry.digest_group, chat_ids, entry.parse_mode), []).append(entry)
+        else:
+            deliveries.append((chat_ids, entry.message, entry.parse_mode, [entry]))
+
+    # Запас под заголовок сводки
+    limit = settings.TELEGRAM_MESSAGE_MAX_LENGTH - 100
+    for (_, chat_ids, parse_mode), group_entries in groups.items():
+        for text, chunk in pack_digest(group_entries, limit):
+            deliveries.append((chat_ids, text, parse_mode, chunk))
+    return deliveries
+
+
+def process_outbox_batch(send_batch, batch_size: int, max_attempts: int) -> tuple[int, int]:
+    """
+    Обрабатывает одну пачку очереди (не больше get_batch_limit записей).
+    send_batch - функция, которая получает список отправок [(chat_ids, текст, parse_mode), ...]
+    и возвращает для каждой список результатов по ее чатам: None (успех) или исключение.
+    Отправки выполняются параллельно (см. TelegramSender.deliver).
+    Возвращает кортеж (отправлено записей, ошибок).
+    """
+    entries = claim_batch(get_batch_limit(batch_size))
+    deliveries = build_deliveries(entries)
+    # Записи, которые build_deliveries отметил отправленными без повторной рассылки
+    sent = sum(entry.status == "sent" for entry in entries)
+    if not deliveries:
+        return sent, 0
+
+    results = send_batch([(chat_ids, text, parse_mode) for chat_ids, text, parse_mode, _ in deliveries])
+
+    failed = 0
+    for (chat_ids, _, _, delivery_entries), chat_results in zip(deliveries, results):
+        delivered = [chat_id for chat_id, error in zip(chat_ids, chat_results) if error is None]
+        errors = [error for error in chat_results if error is not None]
+        for entry in delivery_entries:
+            mark_delivered(entry, delivered)
+            if errors:
+                mark_failed(entry, errors[0], max_attempts)
+            else:
+                mark_sent(entry)
+        if errors:
+            failed += len(delivery_entries)
+        else:
+            sent += len(delivery_entries)
+    return sent, failed
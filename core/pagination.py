@@ -0,0 +1,167 @@
+"""
+Курсорная (keyset) пагинация.
+
+Стандартный Paginator на каждой странице делает COUNT(*) по всей выборке и
+OFFSET, который тем медленнее, чем дальше страница. Курсорная пагинация
+запоминает ключ последней строки страницы (date_created, id) и следующую страницу
+выбирает условием "строго меньше ключа" - это диапазон по индексу date_created,
+поэтому страница N стоит столько же, сколько первая.
+
+Курсор - непрозрачный токен (base64 от JSON), который передается в ?cursor=.
+Вместо точного количества можно показать оценку по диапазону первичных ключей.
+"""
+import base64
+import json
+
+from django.db.models import Max, Min, Q, QuerySet
+
+
+def encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    """Разбирает токен курсора. ValueError - если токен поврежден"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Неверный курсор") from e
+    if not isinstance(data, dict):
+        raise ValueError("Неверный курсор")
+    return data
+
+
+class KeysetPage:
+    """Страница курсорной пагинации (совместима с page_obj в шаблонах по has_* свойствам)"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, estimated_total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_total = estimated_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """
+    Пагинация по убыванию (field, pk) - так же, как Order.Meta.ordering (-date_created),
+    с pk для однозначного порядка строк с одинаковым временем.
+    """
+
+    def __init__(self, queryset: QuerySet, per_page: int, field: str = "date_created"):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.model_field = queryset.model._meta.get_field(field)
+
+    def _boundary(self, obj, direction: str) -> str:
+        value = self.model_field.value_to_string(obj)
+        return encode_cursor({"v": value, "pk": obj.pk, "dir": direction})
+
+    def page(self, cursor: str | None = None) -> KeysetPage:
+        data = decode_cursor(cursor) if cursor else {}
+        backwards = data.get("dir") == "prev"
+        queryset = self.queryset
+        field = self.field
+
+        if "v" in data:
+            try:
+                value = self.model_field.to_python(data["v"])
+                pk = int(data["pk"])
+            except Exception as e:
+                raise ValueError("Неверный курсор") from e
+            # Условие field >= / <= value позволяет SQLite взять диапазон по индексу,
+            # а OR уточняет порядок внутри строк с одинаковым значением
+            if backwards:
+                queryset = queryset.filter(**{f"{field}__gte": value}).filter(
+                    Q(**{f"{field}__gt": value}) | Q(pk__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(**{f"{field}__lte": value}).filter(
+                    Q(**{f"{field}__lt": value}) | Q(pk__lt=pk)
+                )
+
+        ordering = (field, "pk") if backwards else (f"-{field}", "-pk")
+        rows = list(queryset.order_by(*ordering)[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows)
+        # Уходя назад, мы точно знаем, что впереди есть строки, и наоборот
+        has_next = True if backwards else has_more
+        has_previous = has_more if backwards else "v" in data
+        return KeysetPage(
+            rows,
+            next_cursor=self._boundary(rows[-1], "next") if has_next else None,
+            previous_cursor=self._boundary(rows[0], "prev") if has_previous else None,
+        )
+
+
+class CappedOffsetPaginator:
+    """
+    Пагинация выборки с произвольной сортировкой (например, по релевантности поиска),
+    у которой нет ключа для курсора. Смещение хранится в том же непрозрачном курсоре
+    и ограничено max_rows, поэтому стоимость страницы ограничена сверху.
+    """
+
+    def __init__(self, queryset: QuerySet, per_page: int, max_rows: int):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.max_rows = max_rows
+
+    def page(self, cursor: str | None = None) -> KeysetPage:
+        data = decode_cursor(cursor) if cursor else {}
+        try:
+            offset = max(0, min(int(data.get("o", 0)), self.max_rows))
+        except (TypeError, ValueError) as e:
+            raise ValueError("Неверный курсор") from e
+
+        limit = min(self.per_page, self.max_rows - offset)
+        rows = list(self.queryset[offset: offset + limit + 1]) if limit > 0 else []
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor({"o": offset + limit}) if has_next else None,
+            previous_cursor=encode_cursor({"o": max(0, offset - self.per_page)}) if offset else None,
+        )
+
+
+def estimate_count(queryset: QuerySet) -> int | None:
+    """
+    Оценка количества строк без COUNT(*): MAX(pk) - MIN(pk) + 1. Оба значения берутся
+    с края индекса первичного ключа, поэтому цена не зависит от размера таблицы.
+    Любые удаленные строки внутри диапазона дают завышение - в том числе архивация
+    (core/archive.py): она переносит только закрытые заказы, а старые незакрытые
+    остаются, поэтому MIN(pk) не сдвигается, и в диапазоне остаются пропуски.
+    Оценка всегда не меньше точного количества. Для подписи "≈ N заказов" этого достаточно.
+    Для выборки с фильтром (поиск) дешевой оценки нет - возвращается None.
+    """
+    if queryset.query.where:
+        return None
+    bounds = queryset.model._default_manager.aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["high"] is None:
+        return 0
+    return bounds["high"] - bounds["low"] + 1
@@ -0,0 +1,94 @@
+"""
+Нормализация телефонов.
+
+Order.phone и Master.phone - свободный ввод: "+7 (701) 123-45-67", "8701 1234567" и т.д.
+Для поиска рядом хранится phone_digits - только цифры, с приведением российского/казахстанского
+формата 8XXXXXXXXXX к 7XXXXXXXXXX. По этой колонке (обычный B-tree индекс) работают точный
+поиск и поиск по префиксу через диапазон [prefix, prefix + 1) - без LIKE и полного прохода.
+"""
+import re
+
+from django.db.models import Q
+
+NON_DIGITS_RE = re.compile(r"\D")
+# Строка похожа на телефон: цифры, пробелы, скобки, плюс и дефисы
+PHONE_LIKE_RE = re.compile(r"^[\d\s()+\-]*\d[\d\s()+\-]*$")
+
+
+def normalize_phone(phone: str | None) -> str:
+    """
+    Оставляет только цифры; 11 цифр с ведущей 8 приводятся к ведущей 7.
+    Миграция 0008 хранит копию этого правила: если оно меняется, заполнить колонку
+    заново - manage.py normalize_phones.
+    """
+    digits = NON_DIGITS_RE.sub("", phone or "")
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    return digits
+
+
+def is_phone_like(value: str) -> bool:
+    return bool(PHONE_LIKE_RE.match(value.strip()))
+
+
+def _next_prefix(prefix: str) -> str:
+    """Наименьшая строка из цифр, которая больше всех строк с префиксом prefix"""
+    prefix = prefix.rstrip("9")
+    if not prefix:
+        return ""
+    return prefix[:-1] + str(int(prefix[-1]) + 1)
+
+
+def phone_prefix_q(value: str, field: str = "phone_digits") -> Q:
+    """
+    Условие "телефон начинается с value" в виде диапазона по нормализованной колонке.
+    Введенный префикс 8... трактуется как 7..., а номер без "+" и кода страны (701...)
+    ищется и с ведущей 7.
+    """
+    digits = NON_DIGITS_RE.sub("", value)
+    if not digits:
+        return Q(pk__in=[])
+
+    prefixes = {"7" + digits[1:] if digits.startswith("8") else digits}
+    # Без кода страны номер может начинаться и с 7 (казахстанские 70x), поэтому
+    # ведущая 7 без "+" не значит, что код страны введен
+    if not digits.startswith("8") and len(digits) < 11 and not value.strip().startswith("+"):
+        prefixes.add("7" + digits)
+
+    condition = Q()
+    for prefix in prefixes:
+        upper = _next_prefix(prefix)
+        prefix_q = Q(**{f"{field}__gte": prefix})
+        if upper:
+            prefix_q &= Q(**{f"{field}__lt": upper})
+        condition |= prefix_q
+    return condition
+
+
+def backfill_phone_digits(model, batch_size: int = 1000, only_missing: bool = False) -> int:
+    """
+    Заполняет phone_digits для уже существующих строк model пачками через bulk_update
+    (save() не вызывается). Принимает и историческую модель из миграции.
+    Пачки выбираются по pk > последний_pk, чтобы не читать таблицу, в которую пишем.
+    Возвращает количество обновленных строк.
+    """
+    queryset = model.objects.order_by("pk").only("pk", "phone", "phone_digits")
+    if only_missing:
+        queryset = queryset.filter(phone_digits="")
+
+    updated = 0
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not chunk:
+            return updated
+        last_pk = chunk[-1].pk
+        changed = []
+        for obj in chunk:
+            digits = normalize_phone(obj.phone)
+            if obj.phone_digits != digits:
+                obj.phone_digits = digits
+                changed.append(obj)
+        if changed:
+            model.objects.bulk_update(changed, ["phone_digits"])
+            updated += len(changed)
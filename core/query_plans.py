@@ -0,0 +1,384 @@
+"""
+Регрессионная проверка планов SQL-запросов (manage.py check_query_plans).
+
+Во временной тестовой БД создается большой набор данных, затем каждое
+представление core, blog и users и каждый список объектов в админке
+запрашивается тестовым клиентом. Все SQL-запросы перехватываются, для каждого
+выполняется EXPLAIN QUERY PLAN, и по планам собирается:
+
+- количество запросов и время ответа представления;
+- полные проходы по таблицам (SCAN <table> без индекса);
+- сортировки через временное B-дерево (USE TEMP B-TREE FOR ORDER BY);
+- какие индексы использовались хотя бы одним запросом.
+
+Результат сравнивается с базовым JSON (QUERY_PLANS_BASELINE): ответ 5xx, новый
+полный проход, выросшее число запросов или индекс, который раньше использовался,
+а теперь нет, - это регрессия. Время ответа только показывается - оно слишком зависит от машины.
+"""
+import json
+import random
+import re
+import statistics
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache_versions import bump_version, reset_local_versions
+from .models import Master, Order, Review, Service
+from .phones import normalize_phone
+from .service_index import get_service_index
+
+APPS = ("core", "blog", "users")
+
+# Таблица читается целиком: "SCAN core_order", но не "SCAN core_order USING INDEX ..."
+# и не обход виртуальной таблицы FTS ("SCAN core_order_fts VIRTUAL TABLE INDEX ...")
+FULL_SCAN_RE = re.compile(r"^SCAN (\S+)$")
+INDEX_RE = re.compile(r"USING (?:COVERING )?INDEX (\S+)")
+TEMP_SORT = "USE TEMP B-TREE FOR ORDER BY"
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")
+
+
+@dataclass
+class Scenario:
+    """Один запрос к представлению: имя, роль пользователя и функция, строящая URL по сиду"""
+    name: str
+    user: str  # "anon" | "staff"
+    url: callable
+    headers: dict = field(default_factory=dict)
+    urlconf: str | None = None  # другие корневые маршруты, например асинхронные (barbershop/urls_async.py)
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    status: int
+    queries: int
+    time_ms: float
+    full_scans: list[str]
+    temp_sorts: int
+    used_indexes: set[str]
+
+    def to_baseline(self) -> dict:
+        return {
+            "status": self.status,
+            "queries": self.queries,
+            "time_ms": round(self.time_ms, 2),
+            "full_scans": self.full_scans,
+            "temp_sorts": self.temp_sorts,
+        }
+
+
+AJAX = {"X-Requested-With": "XMLHttpRequest"}
+ASYNC_URLCONF = "barbershop.urls_async"
+
+VIEW_SCENARIOS = [
+    Scenario("landing", "anon", lambda s: reverse("landing")),
+    Scenario("master_detail", "anon", lambda s: reverse("master_detail", args=[s["master"].pk])),
+    Scenario("service_detail", "anon", lambda s: reverse("service_detail", args=[s["service"].pk])),
+    Scenario("thanks", "anon", lambda s: reverse("thanks")),
+    Scenario("order_create", "anon", lambda s: reverse("order_create")),
+    Scenario("create_review", "anon", lambda s: reverse("create_review") + f"?master_id={s['master'].pk}"),
+    Scenario("masters_services_ajax", "anon",
+             lambda s: reverse("masters_services_by_id_ajax") + f"?master_id={s['master'].pk}"),
+    Scenario("masters_availability_week", "anon", lambda s: reverse("masters_availability_ajax") + "?days=7"),
+    Scenario("master_info_ajax", "anon",
+             lambda s: reverse("get_master_info") + f"?master_id={s['master'].pk}", headers=AJAX),
+    Scenario("masters_info_batch_ajax", "anon",
+             lambda s: reverse("get_masters_info") + "?ids=" + ",".join(str(pk) for pk in range(1, 21)), headers=AJAX),
+    Scenario("about_us", "anon", lambda s: reverse("about_us")),
+    # Асинхронные версии (core/async_views.py) - запросы те же, что у синхронных
+    Scenario("landing_async", "anon", lambda s: reverse("landing"), urlconf=ASYNC_URLCONF),
+    Scenario("thanks_async", "anon", lambda s: reverse("thanks"), urlconf=ASYNC_URLCONF),
+    Scenario("masters_services_ajax_async", "anon",
+             lambda s: reverse("masters_services_by_id_ajax") + f"?master_id={s['master'].pk}", urlconf=ASYNC_URLCONF),
+    Scenario("master_info_ajax_async", "anon",
+             lambda s: reverse("get_master_info") + f"?master_id={s['master'].pk}", headers=AJAX,
+             urlconf=ASYNC_URLCONF),
+    Scenario("orders_list", "staff", lambda s: reverse("orders_list")),
+    Scenario("orders_list_search_phone", "staff",
+             lambda s: reverse("orders_list") + f"?search={s['order'].phone_digits[:7]}&search_in=phone"),
+    Scenario("orders_list_search_name", "staff",
+             lambda s: reverse("orders_list") + f"?search={s['order'].client_name}&search_in=name"),
+    Scenario("orders_list_search_relevance", "staff",
+             lambda s: reverse("orders_list") + "?search=стрижк&search_in=comment&sort=relevance"),
+    Scenario("orders_export_search_name", "staff",
+             lambda s: reverse("orders_export") + f"?search={s['order'].client_name}&search_in=name&format=csv"),
+    Scenario("archived_orders_list", "staff", lambda s: reverse("archived_orders_list")),
+    Scenario("archived_orders_search_phone", "staff",
+             lambda s: reverse("archived_orders_list") + f"?search={s['order'].phone_digits[:7]}&search_in=phone"),
+    Scenario("analytics_dashboard_year", "staff",
+             lambda s: reverse("analytics_dashboard") + f"?date_from={timezone.localdate() - timedelta(days=365)}"),
+    Scenario("order_detail", "staff", lambda s: reverse("order_detail", args=[s["order"].pk])),
+    Scenario("services_list", "staff", lambda s: reverse("services_list")),
+    Scenario("service_update", "staff", lambda s: reverse("service_update", args=[s["service"].pk])),
+    Scenario("blog_posts_list", "anon", lambda s: reverse("blog:posts_list")),
+    Scenario("users_login", "anon", lambda s: reverse("users:login")),
+    Scenario("users_register", "anon", lambda s: reverse("users:register")),
+    Scenario("users_profile_detail", "staff", lambda s: reverse("users:profile_detail", args=[s["staff"].pk])),
+    Scenario("users_profile_edit", "staff", lambda s: reverse("users:profile_edit")),
+    Scenario("sitemap", "anon", lambda s: reverse("django.contrib.sitemaps.views.sitemap")),
+]
+
+
+def admin_scenarios() -> list[Scenario]:
+    """Списки объектов в админке для всех зарегистрированных моделей core, blog и users"""
+    scenarios = []
+    for model in admin.site._registry:
+        opts = model._meta
+        if opts.app_label not in APPS:
+            continue
+        url_name = f"admin:{opts.app_label}_{opts.model_name}_changelist"
+        scenarios.append(Scenario(f"admin_{opts.app_label}_{opts.model_name}", "staff",
+                                  lambda s, url_name=url_name: reverse(url_name)))
+    # Поиск и фильтры, которые персонал использует чаще всего
+    scenarios += [
+        Scenario("admin_core_order_search_phone", "staff",
+                 lambda s: reverse("admin:core_order_changelist") + f"?q={s['order'].phone_digits[:7]}"),
+        Scenario("admin_core_order_status", "staff",
+                 lambda s: reverse("admin:core_order_changelist") + "?status__exact=approved"),
+        Scenario("admin_core_master_rating", "staff",
+                 lambda s: reverse("admin:core_master_changelist") + "?avg_rating=high"),
+    ]
+    return sorted(scenarios, key=lambda scenario: scenario.name)
+
+
+def seed(orders: int = 20000, masters: int = 20, services: int = 30, posts: int = 200, random_seed: int = 42) -> dict:
+    """
+    Заполняет пустую (тестовую) БД данными. Все через bulk_create, поэтому
+    сигналы не срабатывают - агрегаты рейтинга и phone_digits заполняются явно.
+    """
+    from blog.models import Category, Comment, Post, Tag
+
+    rng = random.Random(random_seed)
+    User = get_user_model()
+    staff = User.objects.create_superuser(username="plan_admin", email="plan@example.com", password="plan")
+    authors = User.objects.bulk_create(
+        [User(username=f"user{i}", email=f"user{i}@example.com") for i in range(50)]
+    )
+
+    service_objs = Service.objects.bulk_create([
+        Service(name=f"Услуга {i}", description="Описание", price=500 + i * 50, duration=20 + i % 4 * 10,
+                is_popular=i % 5 == 0)
+        for i in range(services)
+    ])
+    master_objs = Master.objects.bulk_create([
+        Master(first_name=f"Мастер{i}", last_name=f"Фамилия{i}", phone=f"+7 (701) 000-00-{i:02d}",
+               phone_digits=normalize_phone(f"+7 (701) 000-00-{i:02d}"), address="Адрес", experience=i % 15)
+        for i in range(masters)
+    ])
+    Master.services.through.objects.bulk_create([
+        Master.services.through(master_id=master.pk, service_id=service.pk)
+        for master in master_objs for service in rng.sample(service_objs, 5)
+    ])
+
+    now = timezone.now()
+    comments = ["", "", "хочу стрижку бороды", "позвоните заранее", "стрижка и укладка"]
+    statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+    order_objs = []
+    for i in range(orders):
+        phone = f"8 (7{rng.randint(0, 99):02d}) {rng.randint(0, 9999999):07d}"
+        order_objs.append(Order(
+            client_name=f"Клиент {i}", phone=phone, phone_digits=normalize_phone(phone),
+            comment=rng.choice(comments), status=rng.choice(statuses), master=rng.choice(master_objs),
+            appointment_date=now + timedelta(hours=rng.randint(-2000, 2000)),
+        ))
+    order_objs = Order.objects.bulk_create(order_objs, batch_size=2000)
+    # auto_now_add ставит всем одно время - разносим даты создания, как в реальной таблице
+    for order in order_objs:
+        order.date_created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+    Order.objects.bulk_update(order_objs, ["date_created"], batch_size=2000)
+    Order.services.through.objects.bulk_create([
+        Order.services.through(order_id=order.pk, service_id=rng.choice(service_objs).pk)
+        for order in order_objs
+    ], batch_size=5000)
+
+    reviews = Review.objects.bulk_create([
+        Review(client_name=f"Клиент {i}", text="Отличная стрижка", rating=rng.randint(1, 5),
+               master=rng.choice(master_objs), is_published=i % 4 != 0,
+               moderation_status="approved" if i % 4 else "rejected")
+        for i in range(orders // 10)
+    ], batch_size=2000)
+    from .ratings import recalculate_ratings
+    recalculate_ratings()
+    # Срезы аналитики заполняются сигналами, которых у bulk_create нет
+    from .analytics import rebuild_rollups
+    rebuild_rollups(timezone.localdate() - timedelta(days=366), timezone.localdate())
+    # Версии кеша тоже сдвигают сигналы - без них первый сценарий заплатил бы за их создание
+    from .ajax_cache import SERVICES_VERSION, master_version_name
+    from .service_index import SERVICE_INDEX_VERSION
+    bump_version("landing", SERVICES_VERSION, SERVICE_INDEX_VERSION,
+                 *(master_version_name(master.pk) for master in master_objs))
+
+    categories = Category.objects.bulk_create(
+        [Category(name=f"Категория {i}", description="", slug=f"category-{i}") for i in range(5)]
+    )
+    tags = Tag.objects.bulk_create([Tag(name=f"Тег {i}", slug=f"tag-{i}") for i in range(20)])
+    post_objs = Post.objects.bulk_create([
+        Post(title=f"Пост {i}", md_description="", slug=f"post-{i}", md_content="", category=rng.choice(categories),
+             author=rng.choice(authors), is_published=i % 3 != 0)
+        for i in range(posts)
+    ])
+    Post.tags.through.objects.bulk_create([
+        Post.tags.through(post_id=post.pk, tag_id=tag.pk) for post in post_objs for tag in rng.sample(tags, 3)
+    ])
+    Comment.objects.bulk_create([
+        Comment(post=rng.choice(post_objs), author=rng.choice(authors), text="Комментарий") for _ in range(posts * 5)
+    ])
+
+    return {
+        "staff": staff,
+        "master": master_objs[0],
+        "service": service_objs[0],
+        "order": order_objs[len(order_objs) // 2],
+        "reviews": len(reviews),
+    }
+
+
+def explain(sql: str) -> list[str]:
+    """Строки плана EXPLAIN QUERY PLAN (колонка detail)"""
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def analyze_queries(captured: list[dict]) -> tuple[list[str], int, set[str]]:
+    """Полные проходы (по таблицам), число временных сортировок и использованные индексы"""
+    full_scans, temp_sorts, used_indexes = set(), 0, set()
+    for query in captured:
+        sql = query["sql"]
+        if not sql.lstrip().upper().startswith(EXPLAINABLE):
+            continue
+        for detail in explain(sql):
+            match = FULL_SCAN_RE.match(detail)
+            # "SCAN subquery-1" и служебные sqlite_* - не таблицы приложения
+            if match and not match.group(1).startswith(("subquery", "sqlite_")):
+                full_scans.add(match.group(1))
+            used_indexes.update(INDEX_RE.findall(detail))
+            if detail.startswith(TEMP_SORT):
+                temp_sorts += 1
+    return sorted(full_scans), temp_sorts, used_indexes
+
+
+def _fetch(client, url, headers):
+    """GET с чтением потокового ответа целиком - запросы выгрузок выполняются только при чтении"""
+    response = client.get(url, headers=headers)
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response
+
+
+def _clear_cache():
+    """
+    Очистка кеша перед запросом. Версии кеша забываются - "холодный" запрос
+    читает их из БД. Индекс услуг (core/service_index.py) живет в памяти процесса
+    и перестраивается только после правок мастеров и услуг, поэтому строится
+    сразу, а не внутри измеряемого запроса.
+    """
+    cache.clear()
+    reset_local_versions()
+    get_service_index()
+
+
+def run_scenario(scenario: Scenario, clients: dict, seed_data: dict, repeat: int = 3) -> ScenarioResult:
+    """
+    Выполняет сценарий repeat раз. Планы и число запросов - по первому ("холодному")
+    запросу после очистки кеша, время - медиана всех запусков.
+    clients - фабрики клиентов по ролям: у каждого сценария свой клиент, чтобы cookie
+    сессии, оставленная предыдущим сценарием, не добавляла запрос к django_session.
+    """
+    url = scenario.url(seed_data)
+    client = clients[scenario.user]()
+    timings = []
+    # Сценарии асинхронных представлений запрашиваются со своими корневыми маршрутами
+    with override_settings(ROOT_URLCONF=scenario.urlconf) if scenario.urlconf else nullcontext():
+        _clear_cache()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = _fetch(client, url, scenario.headers)
+            timings.append((time.perf_counter() - started) * 1000)
+        # captured_queries читает лог соединения лениво, а следующий запрос клиента его очищает
+        queries = list(captured.captured_queries)
+        for _ in range(repeat - 1):
+            _clear_cache()
+            started = time.perf_counter()
+            _fetch(client, url, scenario.headers)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    full_scans, temp_sorts, used_indexes = analyze_queries(queries)
+    return ScenarioResult(
+        name=scenario.name,
+        status=response.status_code,
+        queries=len(queries),
+        time_ms=statistics.median(timings),
+        full_scans=full_scans,
+        temp_sorts=temp_sorts,
+        used_indexes=used_indexes,
+    )
+
+
+def get_app_indexes() -> set[str]:
+    """Явные индексы таблиц приложений core, blog и users (без автоиндексов SQLite)"""
+    prefixes = tuple(f"{app}_" for app in APPS)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")
+        return {name for name, table in cursor.fetchall() if table.startswith(prefixes)}
+
+
+def build_report(results: list[ScenarioResult]) -> dict:
+    used = set().union(*(result.used_indexes for result in results)) if results else set()
+    return {
+        "scenarios": {result.name: result.to_baseline() for result in results},
+        "used_indexes": sorted(used),
+        "unused_indexes": sorted(get_app_indexes() - used),
+    }
+
+
+def compare_with_baseline(report: dict, baseline: dict, check_indexes: bool = True) -> list[str]:
+    """
+    Список регрессий относительно базового отчета.
+    check_indexes=False - при запуске части сценариев "потерянные" индексы не проверяются.
+    """
+    problems = []
+    base_scenarios = baseline.get("scenarios", {})
+    for name, current in report["scenarios"].items():
+        # Ошибка сервера - всегда регрессия, даже если она уже записана в базовый отчет
+        if current["status"] >= 500:
+            problems.append(f"{name}: ответ {current['status']}")
+        base = base_scenarios.get(name)
+        if base is None:
+            continue
+        if current["queries"] > base["queries"]:
+            problems.append(f"{name}: запросов стало {current['queries']} (было {base['queries']})")
+        new_scans = set(current["full_scans"]) - set(base["full_scans"])
+        if new_scans:
+            problems.append(f"{name}: новые полные проходы по {', '.join(sorted(new_scans))}")
+        if current["temp_sorts"] > base["temp_sorts"]:
+            problems.append(f"{name}: сортировок без индекса {current['temp_sorts']} (было {base['temp_sorts']})")
+    lost = set(baseline.get("used_indexes", [])) - set(report["used_indexes"]) if check_indexes else set()
+    for index in sorted(lost):
+        problems.append(f"индекс {index} больше не используется ни одним представлением")
+    return problems
+
+
+def load_baseline(path) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, report: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,96 @@
+"""
+Инкрементальное обновление рейтинга мастера.
+
+Вместо подсчета средней оценки по всем отзывам при каждом чтении у Master хранятся
+published_review_count, rating_sum и avg_rating. При публикации, снятии с публикации,
+изменении или удалении отзыва агрегаты сдвигаются одним атомарным UPDATE
+с F-выражениями. Полный пересчет: manage.py recalculate_ratings.
+"""
+from collections import defaultdict
+
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast, Round
+
+from .models import Master, Review
+
+
+def apply_rating_delta(master_id: int, count_delta: int, sum_delta: int) -> None:
+    """
+    Сдвигает агрегаты мастера на count_delta отзывов и sum_delta баллов.
+    Все выражения в SET вычисляются по старым значениям строки,
+    поэтому средняя оценка считается в том же UPDATE.
+    """
+    if not master_id or (not count_delta and not sum_delta):
+        return
+
+    new_count = F("published_review_count") + count_delta
+    new_sum = F("rating_sum") + sum_delta
+    Master.objects.filter(pk=master_id).update(
+        published_review_count=new_count,
+        rating_sum=new_sum,
+        avg_rating=Case(
+            # new_count > 0  <=>  published_review_count > -count_delta
+            When(
+                published_review_count__gt=-count_delta,
+                then=Round(Cast(new_sum, FloatField()) / new_count, 1),
+            ),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+
+
+def get_rating_contribution(master_id, rating, is_published) -> tuple | None:
+    """Вклад отзыва в рейтинг: (мастер, оценка) или None, если отзыв не опубликован"""
+    if not is_published or not master_id:
+        return None
+    return master_id, rating
+
+
+def apply_contribution_change(before: tuple | None, after: tuple | None) -> None:
+    """Применяет изменение вклада отзыва: убирает старый и добавляет новый"""
+    if before == after:
+        return
+    if before and after and before[0] == after[0]:
+        # Тот же мастер - достаточно одного UPDATE (например, изменилась оценка)
+        apply_rating_delta(after[0], 0, after[1] - before[1])
+        return
+    if before:
+        apply_rating_delta(before[0], -1, -before[1])
+    if after:
+        apply_rating_delta(after[0], 1, after[1])
+
+
+def apply_published_reviews(reviews) -> None:
+    """
+    Учитывает в рейтинге пачку только что опубликованных отзывов
+    (для bulk_update, который не вызывает сигналы): один UPDATE на мастера.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for review in reviews:
+        totals[review.master_id][0] += 1
+        totals[review.master_id][1] += review.rating
+    for master_id, (count, rating_sum) in totals.items():
+        apply_rating_delta(master_id, count, rating_sum)
+
+
+def recalculate_ratings(batch_size: int = 500) -> int:
+    """Полный пересчет агрегатов всех мастеров. Возвращает количество мастеров"""
+    stats = {
+        row["master_id"]: (row["review_count"], row["total"])
+        for row in Review.objects.filter(is_published=True)
+        .values("master_id")
+        .annotate(review_count=Count("id"), total=Sum("rating"))
+    }
+
+    masters = list(Master.objects.only("id"))
+    for master in masters:
+        count, total = stats.get(master.id, (0, 0))
+        master.published_review_count = count
+        master.rating_sum = total
+        master.avg_rating = round(total / count, 1) if count else 0.0
+
+    Master.objects.bulk_update(
+        masters, ["published_review_count", "rating_sum", "avg_rating"], batch_size=batch_size
+    )
+    return len(masters)
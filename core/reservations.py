@@ -0,0 +1,76 @@
+"""
+Бронирование времени мастера без двойных записей.
+
+Проверка свободного времени в форме (core/availability.py) не спасает от гонки:
+два клиента, отправившие форму одновременно, оба видят время свободным. Поэтому
+заказ при создании занимает слоты сетки времени мастера в таблице SlotReservation
+с уникальным ограничением (master, slot_start) - в той же транзакции, что и сам заказ.
+Проигравший запрос получает IntegrityError на вставке брони, транзакция с его
+заказом откатывается целиком, и форма сразу показывает ошибку.
+
+На SQLite транзакции открываются как BEGIN IMMEDIATE, а БД работает в режиме WAL
+(см. DATABASES в settings): писатели выстраиваются в очередь за блокировкой, а не
+падают с "database is locked" посреди транзакции, читатели при этом не блокируются.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .availability import align_to_grid
+from .models import SlotReservation
+
+# Заказы в этих статусах время мастера не занимают (как и в core/availability.py)
+RELEASING_STATUSES = ("spam", "canceled")
+
+
+class SlotTakenError(Exception):
+    """Время мастера уже забронировано другим заказом"""
+
+
+def get_slot_starts(start: datetime, duration: timedelta) -> list[datetime]:
+    """
+    Слоты сетки, которые занимает запись [start, start + duration).
+    Запись вне сетки занимает все слоты, которых касается (см. align_to_grid в
+    core/availability.py - по той же сетке проверяется свободное время).
+    """
+    step = timedelta(minutes=settings.BOOKING_SLOT_STEP_MINUTES)
+    slot, end = align_to_grid(start, start + duration)
+    slots = []
+    while slot < end:
+        slots.append(slot)
+        slot += step
+    return slots
+
+
+def reserve_order_slots(order, duration: timedelta) -> None:
+    """
+    Бронирует время заказа. Вызывается внутри транзакции создания заказа.
+    SlotTakenError - если хотя бы один слот уже занят; вставка выполняется
+    в точке сохранения, поэтому внешнюю транзакцию можно продолжать или откатить.
+    """
+    if not order.master_id or not order.appointment_date:
+        return
+    reservations = [
+        SlotReservation(master_id=order.master_id, slot_start=slot, order=order)
+        for slot in get_slot_starts(order.appointment_date, duration)
+    ]
+    try:
+        with transaction.atomic():
+            SlotReservation.objects.bulk_create(reservations)
+    except IntegrityError as e:
+        raise SlotTakenError("Это время у мастера уже занято") from e
+
+
+def resync_order_slots(order, duration: timedelta) -> None:
+    """Пересоздает брони заказа после смены мастера или времени записи"""
+    with transaction.atomic():
+        release_order_slots([order.pk])
+        if order.status not in RELEASING_STATUSES:
+            reserve_order_slots(order, duration)
+
+
+def release_order_slots(order_ids) -> int:
+    """Освобождает время заказов (отмена, спам). Возвращает число удаленных броней"""
+    deleted, _ = SlotReservation.objects.filter(order_id__in=order_ids).delete()
+    return deleted
@@ -0,0 +1,119 @@
+"""
+Индекс услуг мастеров в памяти процесса.
+
+Master.services читается почти на каждой публичной странице: карточка мастера,
+AJAX-эндпоинты услуг и информации о мастере, проверка формы заказа, расчет
+длительности записи. Меняется он только когда администратор правит мастера или
+услугу. Поэтому все услуги и связи мастер -> услуги держатся в неизменяемом
+ServiceIndex, и повторные обращения не делают запросов к БД.
+
+Индекс перестраивается лениво (двумя запросами) при первом обращении после
+изменения версии "service_index" (core/cache_versions.py). Версию сдвигают сигналы
+m2m_changed Master.services, сохранение и удаление Service, создание и удаление
+Master - после коммита транзакции, чтобы другой процесс не успел перестроить
+индекс по незакоммиченным данным. Версия хранится в БД, поэтому изменения
+замечает каждый процесс gunicorn/uvicorn; читается она из памяти процесса
+(не чаще раза в CACHE_VERSIONS_LOCAL_TTL секунд обращается к БД).
+"""
+import threading
+from dataclasses import dataclass
+from decimal import Decimal
+from types import MappingProxyType
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from .cache_versions import aget_version, bump_version, get_version
+from .models import Master, Service
+
+SERVICE_INDEX_VERSION = "service_index"
+
+_lock = threading.Lock()
+_index = None
+
+
+@dataclass(frozen=True)
+class ServiceRow:
+    """Неизменяемая копия услуги - с теми же атрибутами, что читают шаблоны и JSON"""
+    id: int
+    name: str
+    description: str
+    price: Decimal
+    duration: int
+    is_popular: bool
+    image_url: str | None
+
+    @property
+    def pk(self) -> int:
+        return self.id
+
+
+@dataclass(frozen=True)
+class ServiceIndex:
+    version: int
+    services: MappingProxyType  # {service_id: ServiceRow}
+    master_services: MappingProxyType  # {master_id: (ServiceRow, ...)} - все мастера, в т.ч. без услуг
+
+    def has_master(self, master_id: int) -> bool:
+        return master_id in self.master_services
+
+    def get_services(self, master_id: int) -> tuple[ServiceRow, ...]:
+        """Услуги мастера по возрастанию id (пустой кортеж для неизвестного мастера)"""
+        return self.master_services.get(master_id, ())
+
+    def get_service_ids(self, master_id: int) -> frozenset[int]:
+        return frozenset(service.id for service in self.get_services(master_id))
+
+
+def get_service_index() -> ServiceIndex:
+    """Актуальный индекс: версия из памяти процесса, перестройка - только после изменений"""
+    version = get_version(SERVICE_INDEX_VERSION)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        # Пока ждали блокировку, индекс мог перестроить другой поток
+        if _index is not None and _index.version == version:
+            return _index
+        return _rebuild(version)
+
+
+async def aget_service_index() -> ServiceIndex:
+    """Асинхронная версия get_service_index (core/async_views.py)"""
+    version = await aget_version(SERVICE_INDEX_VERSION)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    return await sync_to_async(get_service_index)()
+
+
+def _rebuild(version: int) -> ServiceIndex:
+    global _index
+    # Версия прочитана до запросов: изменение во время перестройки сдвинет ее, и индекс перестроится снова
+    services = {
+        service.id: ServiceRow(
+            id=service.id, name=service.name, description=service.description, price=service.price,
+            duration=service.duration, is_popular=service.is_popular, image_url=service.image_url,
+        )
+        for service in Service.objects.all()
+    }
+    master_services = {}
+    # LEFT JOIN: мастер без услуг приходит одной строкой с service_id = None
+    for master_id, service_id in Master.objects.order_by().values_list("pk", "services"):
+        rows = master_services.setdefault(master_id, [])
+        # Услугу, созданную между запросами, подхватит следующая перестройка
+        if service_id in services:
+            rows.append(services[service_id])
+    _index = ServiceIndex(
+        version=version,
+        services=MappingProxyType(services),
+        master_services=MappingProxyType({
+            master_id: tuple(sorted(rows, key=lambda row: row.id)) for master_id, rows in master_services.items()
+        }),
+    )
+    return _index
+
+
+def invalidate_service_index() -> None:
+    """Сдвигает версию индекса после коммита текущей транзакции (вызывается из сигналов)"""
+    transaction.on_commit(lambda: bump_version(SERVICE_INDEX_VERSION))
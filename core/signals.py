@@ -1,91 +1,214 @@
-# Опишем сигнал, который будет слушать создание записи в модель Review и проверять есть ли в поле text слова "плохо" или "ужасно". - Если нет, то меняем is_published на True
+# Модерация отзывов больше не выполняется в сигнале post_save: новый отзыв сохраняется
+# со статусом "pending", а пачки отзывов проверяет воркер manage.py moderate_reviews
+# (см. core/moderation.py).
 
-from .models import Order, Review
-from django.db.models.signals import post_save, m2m_changed
+from decimal import Decimal
+
+from .models import Order, Review, Master, Service
+from django.db.models.signals import m2m_changed, pre_delete, pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .mistral import is_bad_review
-# Импорт всего что нужно для работы бота
-from .telegram_bot import send_telegram_message
-from asyncio import run
-# Из настроек импортируем токен и id чата
-from django.conf import settings
+from .ratings import apply_contribution_change, get_rating_contribution
+from .cache_versions import bump_version
+from .ajax_cache import SERVICES_VERSION, master_version_name
+from .service_index import invalidate_service_index
+from .analytics import (
+    RollupDelta, apply_price_change, get_order_day, get_order_key, get_order_prices, rollups_suppressed,
+)
+# Уведомления не отправляются прямо из сигнала - в той же транзакции они ставятся в очередь (outbox),
+# которую разбирает воркер manage.py telegram_worker
+from .notifications import schedule_order_notification
 
-TELEGRAM_BOT_API_KEY = settings.TELEGRAM_BOT_API_KEY
-TELEGRAM_USER_ID = settings.TELEGRAM_USER_ID
 
-@receiver(post_save, sender=Review)
-def check_review_text(sender, instance, created, **kwargs):
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, raw, **kwargs):
     """
-    Проверяет текст отзыва на наличие слов "плохо" или "ужасно".
-    Если таких слов нет, то устанавливает is_published в True.
+    Запоминает, как отзыв учитывался в рейтинге мастера до сохранения,
+    чтобы в post_save сдвинуть агрегаты Master на разницу.
     """
-    if created:
-        if not is_bad_review(instance.text):
-            instance.is_published = True
-            instance.save()
-            # Тестовый timesleep
-            from time import sleep
-            sleep(10)
-            # Отправка в телеграм
-            message = f"""
-*Новый отзыв от клиента*
-*Имя:* {instance.client_name}
-*Текст:* {instance.text}
-*Оценка:* {instance.rating}
-*Ссылка на отзыв:* http://127.0.0.1:8000/admin/core/review/{instance.id}/change/
-
-#отзыв
-"""
-            run(send_telegram_message(TELEGRAM_BOT_API_KEY, TELEGRAM_USER_ID, message))
-        
-        
-        else:
-            instance.is_published = False
-            instance.save()
-            # Вывод в терминал 
-            print(f"Отзыв '{instance.client_name}' не опубликован из-за негативных слов.")
-
-
-# А теперь так же но с ожиданем m2m_changed
+    if raw or not instance.pk:
+        instance._rating_before = None
+        return
+    old = Review.objects.filter(pk=instance.pk).values("master_id", "rating", "is_published").first()
+    instance._rating_before = get_rating_contribution(**old) if old else None
+
+
+@receiver(post_save, sender=Review)
+def update_master_rating(sender, instance, raw, **kwargs):
+    """Обновляет агрегаты рейтинга мастера после создания/изменения отзыва"""
+    if raw:
+        return
+    after = get_rating_contribution(instance.master_id, instance.rating, instance.is_published)
+    apply_contribution_change(getattr(instance, "_rating_before", None), after)
+    instance._rating_before = after
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_rating(sender, instance, **kwargs):
+    """Убирает удаленный опубликованный отзыв из рейтинга мастера"""
+    before = get_rating_contribution(instance.master_id, instance.rating, instance.is_published)
+    apply_contribution_change(before, None)
+
+
+# Уведомление о новой записи ожидает событие m2m_changed
 # Order.services.through - это промежуточная таблица между Order и Service (Многие ко многим)
 # Мы ожидаем событие m2m_changed, когда туда запишутся новые связи
 @receiver(m2m_changed, sender=Order.services.through)
-def send_telegram_notification(sender, instance, action, **kwargs):
+def send_telegram_notification(sender, instance, action, reverse, pk_set, **kwargs):
     """
     Обработчик сигнала m2m_changed для модели Order.
-    Он обрабатывает добавление КАЖДОЙ услуги в запись на консультацию.
-    
+    Он обрабатывает добавление услуг в запись на консультацию и ставит в очередь
+    ОДНО уведомление на заказ в той же транзакции (см. core/notifications.py).
     """
-    # action == 'post_add' - это значит что в промежуточную таблицу добавили новую связь. НО нам надо убедится что это именно добавление новой связи, а не удаление или изменение
-    # pk_set - это список id услуг которые были добавлены в запись (формируется только при создании Order или удалении)
-    # Комбинация позволяет ТОЧНО понять что это именно создание НОВОЙ услуги и что все M2M связи уже созданы
-    if action == 'post_add' and kwargs.get('pk_set'):
-        # Получаем список услуг
-        services = [service.name for service in instance.services.all()]
-
-        # Форматирование даты и времени для желаемой даты записи, и даты создания услуги
-        if instance.appointment_date:
-            appointment_date = instance.appointment_date.strftime("%d.%m.%Y %H:%M")
-        else:
-            appointment_date = 'не указана'
-
-        # Форматируем дату создания
-        date_created = instance.date_created.strftime("%d.%m.%Y %H:%M")
-
-        # Формируем сообщение
-        message = f"""
-*Новая запись на консультацию* 
-
-*Имя:* {instance.client_name} 
-*Телефон:* {instance.phone or 'не указан'} 
-*Комментарий:* {instance.comment or 'не указан'}
-*Услуги:* {', '.join(services) or 'не указаны'}
-*Дата создания:* {date_created}
-*Мастер:* {instance.master.first_name} {instance.master.last_name}
-*Желаемая дата записи:* {appointment_date}
-*Ссылка на админ-панель:* http://127.0.0.1:8000/admin/core/order/{instance.id}/change/
-
-#запись #{instance.master.last_name.lower()}
--------------------------------------------------------------
-"""
-        run(send_telegram_message(TELEGRAM_BOT_API_KEY, TELEGRAM_USER_ID, message))
+    # action == 'post_add' - это значит что в промежуточную таблицу добавили новую связь.
+    # pk_set - это список id услуг которые были добавлены в запись
+    # reverse - связь добавлена со стороны услуги (service.orders.add(...)), тогда instance - услуга
+    if action == 'post_add' and pk_set and not reverse:
+        schedule_order_notification(instance, pk_set)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_rollup(sender, instance, raw, **kwargs):
+    """Строка среза аналитики, в которую заказ входил до сохранения (core/analytics.py)"""
+    if raw or instance._state.adding or rollups_suppressed():
+        return
+    if not hasattr(instance, "_loaded_rollup"):
+        instance._loaded_rollup = (
+            Order.objects.filter(pk=instance.pk).values_list("date_created", "status", "master_id").first()
+        )
+
+
+@receiver(post_save, sender=Order)
+def update_order_rollups(sender, instance, created, raw, **kwargs):
+    """Новый заказ входит в срез, смена дня, статуса или мастера переносит его в другую строку"""
+    if raw or rollups_suppressed():
+        return
+    after = get_order_key(instance)
+    loaded = getattr(instance, "_loaded_rollup", None)
+    before = (get_order_day(loaded[0]), *loaded[1:]) if loaded else None
+    instance._loaded_rollup = (instance.date_created, instance.status, instance.master_id)
+    delta = RollupDelta()
+    if created or before is None:
+        # Услуг у нового заказа еще нет - они придут через m2m_changed
+        delta.add_order(after, {})
+    elif before != after:
+        prices = get_order_prices([instance.pk])[instance.pk]
+        delta.add_order(before, prices, sign=-1)
+        delta.add_order(after, prices)
+    delta.apply()
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    """Удаленный заказ выходит из среза (связи с услугами еще на месте)"""
+    if rollups_suppressed():
+        return
+    delta = RollupDelta()
+    delta.add_order(get_order_key(instance), get_order_prices([instance.pk])[instance.pk], sign=-1)
+    delta.apply()
+
+
+@receiver(m2m_changed, sender=Order.services.through)
+def update_order_rollups_on_services(sender, instance, action, reverse, pk_set, **kwargs):
+    """Состав услуг заказа влияет на выручку и срез по услугам"""
+    if rollups_suppressed():
+        return
+    # reverse - service.orders.add(...): instance это услуга, а pk_set - id заказов
+    own_field, other_field = ("service_id", "order_id") if reverse else ("order_id", "service_id")
+    links = sender.objects.filter(**{own_field: instance.pk})
+    if action == "pre_remove":
+        # remove() передает все указанные id - запоминаем только реально связанные
+        instance._removed_links = set(links.filter(**{f"{other_field}__in": pk_set}).values_list(other_field, flat=True))
+        return
+    if action == "post_remove":
+        pk_set = instance._removed_links
+    elif action == "pre_clear":
+        # После очистки связей уже не найти - вычитаем их заранее
+        pk_set = set(links.values_list(other_field, flat=True))
+    elif action != "post_add":
+        return
+    if not pk_set:
+        return
+
+    sign = 1 if action == "post_add" else -1
+    delta = RollupDelta()
+    if not reverse:
+        prices = dict(Service.objects.filter(pk__in=pk_set).values_list("pk", "price"))
+        delta.add_services(get_order_key(instance), prices, sign)
+    else:
+        for order in Order.objects.filter(pk__in=pk_set).only("date_created", "status", "master_id"):
+            delta.add_services(get_order_key(order), {instance.pk: instance.price}, sign)
+    delta.apply()
+
+
+@receiver(pre_save, sender=Service)
+def remember_service_price(sender, instance, raw, **kwargs):
+    """Цена до сохранения - выручка в срезах считается по текущей цене"""
+    instance._price_before = None
+    if not raw and not instance._state.adding:
+        instance._price_before = Service.objects.filter(pk=instance.pk).values_list("price", flat=True).first()
+
+
+@receiver(post_save, sender=Service)
+def update_rollups_on_price(sender, instance, created, raw, **kwargs):
+    """Новая цена услуги сдвигает выручку всех дней с ее заказами"""
+    before = getattr(instance, "_price_before", None)
+    if raw or created or before is None:
+        return
+    apply_price_change(instance.pk, Decimal(instance.price) - before)
+
+
+@receiver(post_save, sender=Master)
+@receiver(post_delete, sender=Master)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_landing_cache(sender, **kwargs):
+    """Мастера и услуги изменились - блоки главной страницы нужно перерисовать"""
+    bump_version("landing")
+
+
+@receiver(post_save, sender=Master)
+@receiver(post_delete, sender=Master)
+def invalidate_master_ajax_cache(sender, instance, **kwargs):
+    """Данные мастера изменились - кешированные AJAX-ответы по нему неактуальны (core/ajax_cache.py)"""
+    bump_version(master_version_name(instance.pk))
+
+
+@receiver(m2m_changed, sender=Master.services.through)
+def invalidate_master_services_ajax_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """Изменился набор услуг мастера"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        bump_version(master_version_name(instance.pk))
+    else:
+        # service.masters.add(...) - затронуты несколько мастеров, проще сдвинуть общую версию услуг
+        bump_version(SERVICES_VERSION)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_services_ajax_cache(sender, **kwargs):
+    """Название или цена услуги входят в ответы всех мастеров"""
+    bump_version(SERVICES_VERSION)
+
+
+@receiver(m2m_changed, sender=Master.services.through)
+def refresh_service_index_on_links(sender, action, **kwargs):
+    """Изменились связи мастер -> услуги (с любой стороны) - индекс core/service_index.py устарел"""
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_service_index()
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Master)
+def refresh_service_index(sender, **kwargs):
+    """Изменилась услуга или удален мастер (вместе с его связями)"""
+    invalidate_service_index()
+
+
+@receiver(post_save, sender=Master)
+def refresh_service_index_on_new_master(sender, instance, created, **kwargs):
+    """Новый мастер должен появиться в индексе, правка остальных полей мастера индекс не меняет"""
+    if created:
+        invalidate_service_index()
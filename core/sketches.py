@@ -0,0 +1,91 @@
+"""
+Компактные вероятностные структуры данных.
+
+HyperLogLog - приблизительный подсчет количества уникальных элементов
+в фиксированном объеме памяти (2^precision байт, погрешность ~1.04/sqrt(2^precision)).
+BloomFilter - проверка "видели ли мы элемент" без хранения самих элементов:
+ложных "нет" не бывает, ложные "да" - с заданной вероятностью.
+
+Обе структуры сериализуются в bytes, чтобы хранить их в БД, и объединяются (merge)
+без потерь - так сливаются копии, накопленные разными процессами.
+"""
+import hashlib
+import math
+
+
+def hash64(value: str, salt: bytes = b"") -> int:
+    """Стабильный 64-битный хеш строки (одинаковый во всех процессах, в отличие от hash())"""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8, salt=salt).digest(), "big")
+
+
+class HyperLogLog:
+    """Приблизительный счетчик уникальных элементов"""
+
+    def __init__(self, precision: int = 11, registers: bytes | None = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.size)
+
+    def add(self, value: str) -> None:
+        x = hash64(value)
+        # Первые precision бит - номер регистра, в остальных ищем позицию первой единицы
+        index = x >> (64 - self.precision)
+        rest = (x << self.precision) & ((1 << 64) - 1)
+        rank = min(64 - self.precision, 64 - rest.bit_length()) + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        # Поправка для малых значений (linear counting)
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(precision=data[0], registers=data[1:])
+
+
+class BloomFilter:
+    """Фильтр Блума, рассчитанный на capacity элементов с вероятностью ложного срабатывания error_rate"""
+
+    def __init__(self, capacity: int = 10000, error_rate: float = 0.01, bits: bytes | None = None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits else bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        # Двойное хеширование: h1 + i * h2 дает hash_count независимых позиций
+        h1 = hash64(value, b"bloom-1")
+        h2 = hash64(value, b"bloom-2") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def merge(self, other: "BloomFilter") -> None:
+        """Объединение фильтров одного размера: элемент есть в результате, если он есть в любом из них"""
+        self.bits = bytearray(a | b for a, b in zip(self.bits, other.bits))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, capacity: int = 10000, error_rate: float = 0.01) -> "BloomFilter":
+        return cls(capacity=capacity, error_rate=error_rate, bits=data)
@@ -1,8 +1,12 @@
 import os
+import time
 import logging
 import telegram # pip install python-telegram-bot
 import asyncio
+from datetime import timedelta
 from dotenv import load_dotenv
+from telegram.error import RetryAfter
+from telegram.request import HTTPXRequest
 # Загрузка переменных окружения из .env файла
 load_dotenv()
 
@@ -19,10 +23,155 @@ async def send_telegram_message(token, chat_id, message, parse_mode="Markdown"):
         logging.error(f"Ошибка отправки сообщения в чат {chat_id}: {e}")
         raise
 
+
+class TokenBucket:
+    """
+    Ограничитель частоты "ведро с токенами": rate токенов в секунду, не больше capacity подряд.
+    acquire() ждет, пока в ведре не появится токен.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TelegramBotTransport:
+    """
+    Транспорт через python-telegram-bot с долгоживущим пулом HTTP-соединений:
+    один Bot и одни TLS-соединения на все время жизни воркера.
+    """
+
+    def __init__(self, token: str, pool_size: int = 16):
+        request = HTTPXRequest(connection_pool_size=pool_size)
+        self.bot = telegram.Bot(token=token, request=request)
+        self._initialized = False
+
+    async def send(self, chat_id, text, parse_mode):
+        if not self._initialized:
+            await self.bot.initialize()
+            self._initialized = True
+        await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+
+    async def close(self):
+        if self._initialized:
+            await self.bot.shutdown()
+            self._initialized = False
+
+
+class FakeTelegramTransport:
+    """
+    Локальный транспорт для тестов и разработки: ничего не отправляет в сеть,
+    а складывает сообщения в список sent. fail_chats - чаты, отправка в которые падает.
+    """
+
+    def __init__(self, fail_chats=()):
+        self.sent = []
+        self.fail_chats = {str(chat_id) for chat_id in fail_chats}
+
+    async def send(self, chat_id, text, parse_mode):
+        if str(chat_id) in self.fail_chats:
+            raise telegram.error.NetworkError(f"Чат {chat_id} недоступен (FakeTelegramTransport)")
+        self.sent.append((str(chat_id), text, parse_mode))
+
+    async def close(self):
+        pass
+
+
+class TelegramSender:
+    """
+    Долгоживущий отправитель сообщений в Telegram.
+    - соблюдает лимиты Telegram: общий (~30 сообщений/сек), на чат (~1/сек)
+      и на группу (~20/мин) - через TokenBucket;
+    - при ответе 429 (RetryAfter) ждет указанное время и повторяет отправку;
+    - рассылает одно сообщение в несколько чатов параллельно.
+    """
+
+    def __init__(self, transport, global_rate=30, chat_rate=1, group_rate=20 / 60, max_retries=2):
+        self.transport = transport
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.chat_buckets: dict[str, TokenBucket] = {}
+
+    def get_chat_bucket(self, chat_id) -> TokenBucket:
+        chat_id = str(chat_id)
+        if chat_id not in self.chat_buckets:
+            # Отрицательные id - группы и каналы, у них лимит строже
+            rate = self.group_rate if chat_id.startswith("-") else self.chat_rate
+            self.chat_buckets[chat_id] = TokenBucket(rate, 1)
+        return self.chat_buckets[chat_id]
+
+    async def send(self, chat_id, text, parse_mode="Markdown"):
+        for attempt in range(self.max_retries + 1):
+            await self.get_chat_bucket(chat_id).acquire()
+            await self.global_bucket.acquire()
+            try:
+                await self.transport.send(chat_id, text, parse_mode)
+                logging.info(f"Сообщение отправлено в чат {chat_id}")
+                return
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                logging.warning(f"Telegram просит подождать {delay} сек. (чат {chat_id})")
+                await asyncio.sleep(delay)
+
+    async def send_many(self, chat_ids, text, parse_mode="Markdown"):
+        """
+        Отправляет сообщение во все чаты параллельно.
+        Возвращает список по чатам: None (доставлено) или исключение - чтобы повторять
+        отправку только в те чаты, куда сообщение не дошло.
+        """
+        if not chat_ids:
+            raise ValueError("Не указан ни один чат (TELEGRAM_USER_ID)")
+        results = await asyncio.gather(
+            *(self.send(chat_id, text, parse_mode) for chat_id in chat_ids), return_exceptions=True
+        )
+        for chat_id, result in zip(chat_ids, results):
+            if isinstance(result, Exception):
+                logging.error(f"Ошибка отправки сообщения в чат {chat_id}: {result}")
+        return [result if isinstance(result, Exception) else None for result in results]
+
+    async def deliver(self, deliveries):
+        """
+        Параллельно выполняет пачку отправок [(chat_ids, text, parse_mode), ...].
+        Возвращает для каждой отправки список результатов по ее чатам (см. send_many);
+        ошибка всей отправки (например, пустой список чатов) - одно исключение в списке.
+        """
+        results = await asyncio.gather(
+            *(self.send_many(chat_ids, text, parse_mode) for chat_ids, text, parse_mode in deliveries),
+            return_exceptions=True,
+        )
+        return [
+            [result] * max(len(chat_ids), 1) if isinstance(result, Exception) else result
+            for (chat_ids, _, _), result in zip(deliveries, results)
+        ]
+
+    async def close(self):
+        await self.transport.close()
+
+
 # Тестируем отправку прямо тут
 if __name__ == "__main__":
     load_dotenv()
     TELEGRAM_BOT_API_KEY = os.getenv("TELEGRAM_BOT_API_KEY")
     TELEGRAM_USER_ID = os.getenv("TELEGRAM_USER_ID")
     message = "Тестовое сообщение"
-    asyncio.run(send_telegram_message(TELEGRAM_BOT_API_KEY, TELEGRAM_USER_ID, message))
\ No newline at end of file
+    asyncio.run(send_telegram_message(TELEGRAM_BOT_API_KEY, TELEGRAM_USER_ID, message))
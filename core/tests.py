@@ -1,3 +1,1256 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import unittest
+import zipfile
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import json_response
+from .analytics import get_dashboard_data, rebuild_rollups
+from .archive import archive_orders
+from .async_views import (
+    AsyncLandingPageView, AsyncMasterInfoAjaxView, AsyncMastersServicesAjaxView, AsyncThanksView,
+)
+from .availability import BusyIntervals, check_slot, get_availability
+from .cache_versions import get_versions, reset_local_versions
+from .forms import OrderForm, ReviewForm
+from .mistral import KeywordModerationClassifier
+from .moderation import claim_pending_reviews, moderate_pending_reviews
+from .moderation_cache import ModerationVerdictCache, make_verdict_key, verdict_cache
+from .models import (
+    ArchivedOrder, Master, MasterViewerSketch, ModerationVerdict, Order, OrderDailyRollup, OrderStatusLog, Review,
+    Service, ServiceDailyRollup, SlotReservation, TelegramOutbox,
+)
+from .order_export import export_rows, stream_csv, stream_xlsx
+from .order_search import is_search_index_available, search_orders
+from .order_status import transition_orders
+from .outbox import claim_batch, enqueue_telegram_message, get_batch_limit, process_outbox_batch
+from .pagination import estimate_count
+from .phones import normalize_phone, phone_prefix_q
+from .query_plans import compare_with_baseline
+from .ratings import recalculate_ratings
+from .reservations import SlotTakenError, release_order_slots, reserve_order_slots
+from .service_index import get_service_index
+from .telegram_bot import FakeTelegramTransport, TelegramSender
+from .sketches import HyperLogLog
+from .unique_viewers import ViewerSketchBuffer, get_unique_viewers, register_view, viewer_sketches
+from .view_counter import view_counter
+
+
+def clear_caches():
+    """Пустой кеш и версии, которые процесс запомнил в предыдущих тестах"""
+    cache.clear()
+    reset_local_versions()
+
+
+def create_master(**kwargs) -> Master:
+    """Мастер с заполненными обязательными полями"""
+    fields = {"first_name": "Иван", "last_name": "Петров", "phone": "+7 701 000 00 01",
+              "address": "Адрес", "experience": 5}
+    fields.update(kwargs)
+    return Master.objects.create(**fields)
+
+
+def create_service(**kwargs) -> Service:
+    fields = {"name": "Стрижка", "description": "Описание", "price": 1000, "duration": 60}
+    fields.update(kwargs)
+    return Service.objects.create(**fields)
+
+
+def tomorrow_at(hour: int) -> datetime:
+    """Завтра в hour:00 по TIME_ZONE - внутри рабочих часов записи"""
+    return timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), time(hour)))
+
+
+def create_order(**kwargs) -> Order:
+    fields = {"client_name": "Клиент", "phone": "+7 701 111 22 33"}
+    fields.update(kwargs)
+    return Order.objects.create(**fields)
+
+
+class ReviewFormTests(TestCase):
+    """Публичная форма отзыва"""
+
+    def setUp(self):
+        self.master = create_master()
+        self.data = {"client_name": "Анна", "text": "Отличная стрижка", "rating": 5, "master": self.master.pk}
+
+    def test_form_does_not_require_moderation_fields(self):
+        form = ReviewForm(data=self.data)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertNotIn("moderation_status", form.fields)
+        self.assertNotIn("is_published", form.fields)
+
+    def test_post_creates_pending_review(self):
+        response = self.client.post(reverse("create_review"), self.data)
+
+        self.assertRedirects(response, reverse("thanks_with_source", kwargs={"source": "review"}))
+        review = Review.objects.get()
+        self.assertEqual(review.master, self.master)
+        self.assertFalse(review.is_published)
+        self.assertEqual(review.moderation_status, "pending")
+
+
+class RatingAggregateTests(TestCase):
+    """Инкрементальные агрегаты рейтинга мастера (core/ratings.py)"""
+
+    def setUp(self):
+        self.master = create_master()
+
+    def create_review(self, rating, is_published=False, master=None) -> Review:
+        return Review.objects.create(client_name="Анна", text="Отзыв", rating=rating,
+                                     master=master or self.master, is_published=is_published)
+
+    def assertRating(self, count, total, avg, master=None):
+        master = master or self.master
+        master.refresh_from_db()
+        self.assertEqual((master.published_review_count, master.rating_sum, master.avg_rating), (count, total, avg))
+
+    def test_publish_and_unpublish(self):
+        review = self.create_review(5)
+        self.assertRating(0, 0, 0.0)
+
+        review.is_published = True
+        review.save()
+        self.create_review(4, is_published=True)
+        self.assertRating(2, 9, 4.5)
+
+        review.is_published = False
+        review.save()
+        self.assertRating(1, 4, 4.0)
+
+    def test_rating_edit_and_master_change(self):
+        review = self.create_review(5, is_published=True)
+        self.create_review(2, is_published=True)
+
+        review.rating = 3
+        review.save()
+        self.assertRating(2, 5, 2.5)
+
+        # Правка неопубликованного отзыва рейтинг не трогает
+        hidden = self.create_review(1)
+        hidden.rating = 5
+        hidden.save()
+        self.assertRating(2, 5, 2.5)
+
+        other = create_master(phone="+7 701 000 00 70")
+        review.master = other
+        review.save()
+        self.assertRating(1, 2, 2.0)
+        self.assertRating(1, 3, 3.0, master=other)
+
+    def test_delete(self):
+        review = self.create_review(5, is_published=True)
+        self.create_review(1)
+
+        Review.objects.get(pk=review.pk).delete()
+        self.assertRating(0, 0, 0.0)
+        Review.objects.all().delete()
+        self.assertRating(0, 0, 0.0)
+
+    def test_migration_backfill_matches_recalculation(self):
+        other = create_master(phone="+7 701 000 00 71")
+        for rating in (5, 4, 4):
+            self.create_review(rating, is_published=True)
+        self.create_review(1)
+        self.create_review(3, is_published=True, master=other)
+        # Состояние до миграции 0005: отзывы есть, агрегаты пустые
+        Master.objects.update(published_review_count=0, rating_sum=0, avg_rating=0.0)
+
+        migration = importlib.import_module("core.migrations.0005_master_rating_aggregates")
+        migration.fill_rating_aggregates(django_apps, None)
+
+        self.assertRating(3, 13, 4.3)
+        self.assertRating(1, 3, 3.0, master=other)
+        aggregates = Master.objects.order_by("pk").values_list("published_review_count", "rating_sum", "avg_rating")
+        backfilled = list(aggregates)
+        recalculate_ratings()
+        self.assertEqual(list(aggregates.all()), backfilled)
+
+
+class ModerationVerdictCacheTests(TestCase):
+    """Двухуровневый кеш вердиктов модерации с поддельным классификатором"""
+
+    grades = {"sexual": 0.1}
+
+    def setUp(self):
+        self.calls = []
+
+    def classify_batch(self, texts):
+        # Поддельный классификатор: плохой - текст со словом "спам"
+        self.calls.append(list(texts))
+        return ["спам" in text.lower() for text in texts]
+
+    def make_cache(self, maxsize=100, ttl=60):
+        return ModerationVerdictCache(maxsize=maxsize, ttl=ttl, db_ttl=3600)
+
+    def test_memory_tier_and_counters(self):
+        verdicts = self.make_cache()
+
+        # Одинаковые (с точностью до регистра и пробелов) тексты уходят в классификатор один раз
+        self.assertEqual(verdicts.classify(["Хорошо", " хорошо ", "Спам"], self.grades, self.classify_batch),
+                         [False, False, True])
+        self.assertEqual(self.calls, [["Хорошо", "Спам"]])
+        with self.assertNumQueries(0):
+            self.assertEqual(verdicts.classify(["ХОРОШО", "спам"], self.grades, self.classify_batch), [False, True])
+        self.assertEqual(len(self.calls), 1)
+
+        stats = verdicts.stats()
+        self.assertEqual((stats["memory_hits"], stats["db_hits"], stats["misses"]), (2, 0, 3))
+        self.assertEqual(stats["hit_rate"], 0.4)
+
+    def test_lru_eviction(self):
+        verdicts = self.make_cache(maxsize=2)
+        verdicts.classify(["один", "два"], self.grades, self.classify_batch)
+        verdicts.get_local(make_verdict_key("один", self.grades))  # "один" - недавно использован
+        verdicts.classify(["три"], self.grades, self.classify_batch)
+
+        self.assertIsNotNone(verdicts.get_local(make_verdict_key("один", self.grades)))
+        self.assertIsNone(verdicts.get_local(make_verdict_key("два", self.grades)))
+        self.assertEqual(verdicts.stats()["evictions"], 1)
+
+    def test_ttl_expiry_falls_back_to_database(self):
+        verdicts = self.make_cache(ttl=60)
+        with mock.patch("core.moderation_cache.time.monotonic", return_value=1000.0):
+            verdicts.classify(["отзыв"], self.grades, self.classify_batch)
+        with mock.patch("core.moderation_cache.time.monotonic", return_value=1061.0):
+            # В памяти просрочен - вердикт приходит из таблицы ModerationVerdict
+            self.assertEqual(verdicts.classify(["отзыв"], self.grades, self.classify_batch), [False])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(verdicts.stats()["db_hits"], 1)
+
+    def test_database_tier_is_shared_between_processes(self):
+        self.make_cache().classify(["спам спам"], self.grades, self.classify_batch)
+        other_process = self.make_cache()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(other_process.classify(["спам спам"], self.grades, self.classify_batch), [True])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(other_process.stats()["db_hits"], 1)
+
+        # Другие пороги или классификатор - другой ключ, вердикт запрашивается заново
+        other_process.classify(["спам спам"], {"sexual": 0.5}, self.classify_batch)
+        other_process.classify(["спам спам"], self.grades, self.classify_batch, classifier_name="Другой")
+        self.assertEqual(len(self.calls), 3)
+
+    def test_expired_database_verdict_is_refreshed(self):
+        self.make_cache().classify(["отзыв"], self.grades, self.classify_batch)
+        ModerationVerdict.objects.update(created_at=timezone.now() - timedelta(hours=2))
+
+        verdicts = self.make_cache()
+        verdicts.classify(["отзыв"], self.grades, self.classify_batch)
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(verdicts.stats()["misses"], 1)
+        self.assertEqual(ModerationVerdict.objects.count(), 1)
+        self.assertEqual(verdicts.purge_expired(), 0)
+
+
+class ReviewModerationTests(TestCase):
+    """Воркер пакетной модерации с офлайн-классификатором"""
+
+    def setUp(self):
+        verdict_cache.clear_local()
+        self.master = create_master()
+
+    def create_review(self, text: str, rating: int = 5) -> Review:
+        return Review.objects.create(client_name="Анна", text=text, rating=rating, master=self.master)
+
+    def test_worker_publishes_good_and_rejects_bad_reviews(self):
+        good = self.create_review("Отличная стрижка", rating=5)
+        bad = self.create_review("Очень плохо подстригли", rating=1)
+
+        call_command("moderate_reviews", "--once", classifier="core.mistral.KeywordModerationClassifier",
+                     stdout=io.StringIO())
+
+        good.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual((good.moderation_status, good.is_published), ("approved", True))
+        self.assertEqual((bad.moderation_status, bad.is_published), ("rejected", False))
+        self.assertIsNone(good.moderation_lease_until)
+        self.master.refresh_from_db()
+        self.assertEqual((self.master.published_review_count, self.master.rating_sum), (1, 5))
+        self.assertEqual(TelegramOutbox.objects.count(), 1)
+
+    def test_claimed_reviews_are_not_claimed_again(self):
+        self.create_review("Отличная стрижка")
+
+        reviews, _ = claim_pending_reviews(10)
+        self.assertEqual(len(reviews), 1)
+        self.assertEqual(claim_pending_reviews(10)[0], [])
+        # Аренда упавшего воркера истекла - отзыв снова доступен
+        Review.objects.update(moderation_lease_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(claim_pending_reviews(10)[0]), 1)
+
+    def test_review_published_during_classification_is_counted_once(self):
+        review = self.create_review("Отличная стрижка", rating=4)
+
+        class PublishingClassifier(KeywordModerationClassifier):
+            def classify(self, texts):
+                # Пока идет проверка, администратор публикует отзыв вручную
+                current = Review.objects.get(pk=review.pk)
+                current.is_published = True
+                current.save()
+                return super().classify(texts)
+
+        self.assertEqual(moderate_pending_reviews(10, classifier=PublishingClassifier()), (1, 0))
+        self.master.refresh_from_db()
+        self.assertEqual((self.master.published_review_count, self.master.rating_sum), (1, 4))
+
+    def test_classifier_error_returns_reviews_to_queue(self):
+        review = self.create_review("Отличная стрижка")
+
+        class BrokenClassifier:
+            def classify(self, texts):
+                raise ConnectionError("API недоступен")
+
+        with self.assertRaises(ConnectionError):
+            moderate_pending_reviews(10, classifier=BrokenClassifier())
+        review.refresh_from_db()
+        self.assertEqual((review.moderation_status, review.moderation_lease_until), ("pending", None))
+
+
+@override_settings(TELEGRAM_CHAT_IDS=["100", "200"])
+class OutboxDeliveryTests(TestCase):
+    """Отправка очереди уведомлений в несколько чатов"""
+
+    def process(self, transport):
+        sender = TelegramSender(transport, global_rate=1000, chat_rate=1000)
+
+        def send_batch(deliveries):
+            return asyncio.run(sender.deliver(deliveries))
+
+        return process_outbox_batch(send_batch, batch_size=10, max_attempts=3)
+
+    def test_retry_skips_chats_that_already_received_message(self):
+        entry = enqueue_telegram_message("Новый заказ")
+
+        self.assertEqual(self.process(FakeTelegramTransport(fail_chats=["200"])), (0, 1))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "pending")
+        self.assertEqual(entry.delivered_chat_ids, "100")
+
+        TelegramOutbox.objects.update(next_attempt_at=entry.created_at)
+        transport = FakeTelegramTransport()
+        self.assertEqual(self.process(transport), (1, 0))
+        self.assertEqual(transport.sent, [("200", "Новый заказ", "Markdown")])
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "sent")
+
+    @override_settings(TELEGRAM_OUTBOX_LEASE_SECONDS=120, TELEGRAM_GROUP_RATE=20 / 60)
+    def test_batch_fits_into_lease(self):
+        # 20 сообщений в минуту в группу: за половину аренды успевает уйти 20
+        self.assertEqual(get_batch_limit(50), 20)
+        self.assertEqual(get_batch_limit(5), 5)
+
+
+class CacheVersionTests(TestCase):
+    """Версии закешированных данных (core/cache_versions.py)"""
+
+    def setUp(self):
+        clear_caches()
+
+    def test_versions_keep_requested_order(self):
+        # Из словаря версий строятся ключ кеша и ETag - порядок не должен зависеть от того,
+        # какие версии процесс уже помнил, а какие прочитал из БД
+        get_versions("b")
+        names = ("c", "b", "a")
+        cold = get_versions(*names)
+        self.assertEqual(list(cold), list(names))
+        self.assertEqual(list(get_versions(*names)), list(names))
+
+        reset_local_versions()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_versions(*names), cold)
+
+
+class LandingPageTests(TestCase):
+    """Кеш блоков главной страницы"""
+
+    def setUp(self):
+        clear_caches()
+        create_master(first_name="Степан").services.add(create_service(name="Бритье"))
+
+    def test_warm_page_does_not_query_database(self):
+        self.client.get(reverse("landing"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("landing"))
+        self.assertContains(response, "Степан")
+        self.assertContains(response, "Бритье")
+
+    def test_change_invalidates_cached_blocks(self):
+        self.client.get(reverse("landing"))
+        create_service(name="Камуфляж седины")
+        self.assertContains(self.client.get(reverse("landing")), "Камуфляж седины")
+
+
+class ViewCounterTests(TestCase):
+    """Буфер просмотров мастеров в памяти процесса"""
+
+    def setUp(self):
+        # Буфер общий для процесса - сбрасываем то, что накопили другие тесты
+        view_counter.flush()
+        self.master = create_master()
+
+    def test_increment_does_not_touch_database(self):
+        with self.assertNumQueries(0):
+            view_counter.increment(self.master.pk)
+            view_counter.increment(self.master.pk)
+        self.assertEqual(view_counter.pending(self.master.pk), 2)
+
+    def test_flush_writes_views_of_master_without_services(self):
+        view_counter.increment(self.master.pk)
+        view_counter.increment(self.master.pk)
+
+        with self.assertNumQueries(3):  # SAVEPOINT, UPDATE, RELEASE
+            self.assertEqual(view_counter.flush(), 2)
+        self.master.refresh_from_db()
+        self.assertEqual(self.master.view_count, 2)
+        self.assertEqual(view_counter.pending(self.master.pk), 0)
+        self.assertEqual(view_counter.flush(), 0)
+
+    def test_failed_flush_keeps_views(self):
+        view_counter.increment(self.master.pk)
+        with mock.patch("core.view_counter.transaction.atomic", side_effect=OperationalError("database is locked")):
+            self.assertEqual(view_counter.flush(), 0)
+        self.assertEqual(view_counter.pending(self.master.pk), 1)
+
+        self.assertEqual(view_counter.flush(), 1)
+        self.master.refresh_from_db()
+        self.assertEqual(self.master.view_count, 1)
+
+
+class UniqueViewersTests(TestCase):
+    """Учет уникальных посетителей страницы мастера"""
+
+    def setUp(self):
+        viewer_sketches.clear()
+        self.master = create_master()
+
+    def test_repeat_view_is_not_counted(self):
+        self.assertTrue(register_view(self.master.pk, "visitor-1"))
+        with self.assertNumQueries(0):
+            self.assertFalse(register_view(self.master.pk, "visitor-1"))
+            self.assertTrue(register_view(self.master.pk, "visitor-2"))
+        self.assertEqual(get_unique_viewers(self.master.pk), 2)
+
+    def test_sketches_survive_process_restart(self):
+        register_view(self.master.pk, "visitor-1")
+        self.assertEqual(viewer_sketches.flush(), 1)
+        viewer_sketches.clear()
+
+        self.assertFalse(register_view(self.master.pk, "visitor-1"))
+        self.assertEqual(get_unique_viewers(self.master.pk), 1)
+
+    def test_flush_merges_sketches_of_other_processes(self):
+        other_process = ViewerSketchBuffer(flush_interval=60)
+        self.assertTrue(other_process.register(self.master.pk, "visitor-1"))
+        self.assertTrue(register_view(self.master.pk, "visitor-2"))
+        other_process.flush()
+        viewer_sketches.flush()
+
+        # После обмена через БД процесс знает посетителя другого процесса
+        self.assertFalse(register_view(self.master.pk, "visitor-1"))
+        self.assertEqual(get_unique_viewers(self.master.pk), 2)
+        sketch = MasterViewerSketch.objects.get(master=self.master)
+        self.assertEqual(HyperLogLog.from_bytes(bytes(sketch.hll)).count(), 2)
+
+    def test_master_page_view_writes_nothing(self):
+        url = reverse("master_detail", kwargs={"pk": self.master.pk})
+        self.client.get(url)
+        with self.assertNumQueries(3):  # мастер, его отзывы и сессия - без записей
+            self.client.get(url)
+        self.assertFalse(MasterViewerSketch.objects.exists())
+
+
+class EstimateCountTests(TestCase):
+    """Оценка количества заказов для списка"""
+
+    def test_unfiltered_list_is_estimated_by_pk_range(self):
+        orders = [create_order() for _ in range(5)]
+        orders[2].delete()
+
+        with self.assertNumQueries(1):
+            # Удаленный заказ в середине диапазона не уменьшает оценку
+            self.assertEqual(estimate_count(Order.objects.all()), 5)
+
+    def test_archival_gaps_overcount(self):
+        orders = [create_order(status="completed" if i else "approved") for i in range(4)]
+        Order.objects.update(date_updated=timezone.now() - timedelta(days=365))
+        archive_orders(pause=0)
+
+        # Незакрытый заказ держит MIN(pk) на месте - архивированные остаются в оценке
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(estimate_count(Order.objects.all()), 1)
+        create_order()
+        # На самом деле заказов 2, а оценка - весь диапазон pk вместе с тремя архивированными
+        self.assertEqual(estimate_count(Order.objects.all()), orders[-1].pk - orders[0].pk + 2)
+
+    def test_filtered_list_has_no_estimate(self):
+        create_order()
+        self.assertIsNone(estimate_count(Order.objects.filter(client_name="Клиент")))
+
+    def test_empty_table(self):
+        self.assertEqual(estimate_count(Order.objects.all()), 0)
+
+
+class OrderAdminChangelistTests(TestCase):
+    """Список заказов в админке с редактируемыми статусом и мастером"""
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "admin"))
+        self.masters = [create_master(phone=f"+7 701 000 00 1{i}", last_name=f"Петров{i}") for i in range(3)]
+        self.orders = [create_order(master=self.masters[i % 3]) for i in range(6)]
+
+    def test_query_count_does_not_grow_with_rows(self):
+        url = reverse("admin:core_order_changelist")
+        with self.assertNumQueries(9):
+            self.client.get(url)
+        for _ in range(6):
+            create_order(master=self.masters[0])
+        with self.assertNumQueries(9):
+            response = self.client.get(url)
+        self.assertContains(response, "Иван Петров2")
+
+    def test_master_is_editable_from_changelist(self):
+        data = {"form-TOTAL_FORMS": "6", "form-INITIAL_FORMS": "6", "_save": "Сохранить"}
+        for i, order in enumerate(Order.objects.order_by("-date_created", "-pk")):
+            master = self.masters[2] if order == self.orders[0] else order.master
+            data.update({f"form-{i}-id": order.pk, f"form-{i}-status": order.status, f"form-{i}-master": master.pk})
+
+        response = self.client.post(reverse("admin:core_order_changelist"), data)
+
+        self.assertEqual(response.status_code, 302)
+        self.orders[0].refresh_from_db()
+        self.assertEqual(self.orders[0].master, self.masters[2])
+
+
+class OrderExportTests(TestCase):
+    """Выгрузка заказов в CSV и XLSX"""
+
+    def setUp(self):
+        self.order = create_order(client_name="=HYPERLINK(\"http://evil\")", comment="строка\x0bс\x01мусором")
+
+    def test_csv_escapes_formulas(self):
+        content = "".join(stream_csv(export_rows(Order.objects.all())))
+
+        self.assertIn("'=HYPERLINK", content)
+        self.assertIn(f"\r\n{self.order.pk},", content)
+
+    def test_csv_keeps_phone_as_is(self):
+        create_order(client_name="+7 (701) 123-45-67 =1+1", phone="+7 (701) 123-45-67")
+        content = "".join(stream_csv(export_rows(Order.objects.all())))
+
+        self.assertIn(",+7 701 111 22 33,", content)
+        self.assertIn(",+7 (701) 123-45-67,", content)
+        self.assertNotIn("'+7 701", content)
+        # Текст, который только начинается как телефон, по-прежнему экранируется
+        self.assertIn("'+7 (701) 123-45-67 =1+1", content)
+
+    def test_xlsx_is_valid_xml_without_control_characters(self):
+        data = b"".join(stream_xlsx(export_rows(Order.objects.all())))
+
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+        texts = [node.text for node in sheet.iter("{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t")]
+        self.assertIn("строкасмусором", texts)
+        self.assertIn("=HYPERLINK(\"http://evil\")", texts)
+
+
+class QueryPlanCheckTests(TestCase):
+    """Проверка планов запросов (manage.py check_query_plans)"""
+
+    def test_server_error_is_always_a_regression(self):
+        scenario = {"status": 500, "queries": 1, "full_scans": [], "temp_sorts": 0}
+        report = {"scenarios": {"about_us": scenario}, "used_indexes": []}
+        # Даже если ошибка уже попала в базовый отчет
+        baseline = {"scenarios": {"about_us": scenario}, "used_indexes": []}
+        self.assertEqual(compare_with_baseline(report, baseline), ["about_us: ответ 500"])
+
+    def test_pages_from_scenarios_render(self):
+        self.assertEqual(self.client.get(reverse("about_us")).status_code, 200)
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "admin"))
+        self.assertContains(self.client.get(reverse("services_list")), reverse("service_create", args=["normal"]))
+
+
+@unittest.skipIf(json_response.orjson is None, "orjson не установлен")
+class JsonDumpsTests(TestCase):
+    """orjson и стандартный json дают одинаковые ответы"""
+
+    def assertSameBody(self, data):
+        self.assertEqual(json_response.orjson_dumps(data), json_response.stdlib_dumps(data))
+
+    def test_decimal(self):
+        self.assertSameBody({"price": Decimal("1500.00"), "prices": [Decimal("0.1"), Decimal("-2")]})
+
+    def test_datetime(self):
+        moment = datetime(2026, 3, 8, 10, 15, 30, 123456, tzinfo=dt_timezone.utc)
+        self.assertSameBody({
+            "utc": moment,
+            "whole_seconds": moment.replace(microsecond=0),
+            "local": timezone.localtime(moment),
+            "naive": moment.replace(tzinfo=None),
+            "date": moment.date(),
+            "time": time(10, 15),
+            "duration": timedelta(minutes=20),
+        })
+
+    def test_nested(self):
+        self.assertSameBody({
+            "masters": [{"id": 1, "name": "Степан \"Бритва\"", "rating": 4.5, "services": None}],
+            "slots": {"2026-03-08": ["10:00", "10:15"], 7: []},
+            "flags": [True, False],
+        })
+        self.assertEqual(json_response.orjson_dumps({"name": "Степан"}), '{"name":"Степан"}'.encode())
+
+
+class ServiceIndexTests(TestCase):
+    """Индекс услуг мастеров в памяти процесса и условные AJAX-ответы"""
+
+    def setUp(self):
+        clear_caches()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.master = create_master()
+            self.service = create_service(name="Стрижка")
+            self.master.services.add(self.service)
+
+    def service_names(self, master_id):
+        return [service.name for service in get_service_index().get_services(master_id)]
+
+    def test_index_is_rebuilt_after_changes(self):
+        self.assertEqual(self.service_names(self.master.pk), ["Стрижка"])
+        with self.assertNumQueries(0):
+            get_service_index()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.name = "Мужская стрижка"
+            self.service.save()
+        self.assertEqual(self.service_names(self.master.pk), ["Мужская стрижка"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            beard = create_service(name="Борода")
+            self.master.services.add(beard)
+        self.assertEqual(self.service_names(self.master.pk), ["Мужская стрижка", "Борода"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other = create_master(phone="+7 701 000 00 40")
+        self.assertTrue(get_service_index().has_master(other.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.delete()
+            other.delete()
+        self.assertEqual(self.service_names(self.master.pk), ["Борода"])
+        self.assertFalse(get_service_index().has_master(other.pk))
+
+    def test_conditional_request_gets_304_without_body(self):
+        url = reverse("masters_services_by_id_ajax")
+        response = self.client.get(url, {"master_id": self.master.pk})
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        response = self.client.get(url, {"master_id": self.master.pk}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        response = self.client.get(url, {"master_id": self.master.pk}, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # Услуги мастера изменились - прежний ETag больше не подходит
+        with self.captureOnCommitCallbacks(execute=True):
+            self.master.services.add(create_service(name="Борода"))
+        response = self.client.get(url, {"master_id": self.master.pk}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([service["name"] for service in response.json()], ["Стрижка", "Борода"])
+
+
+@override_settings(MASTER_INFO_BATCH_MAX=5)
+class MastersInfoBatchTests(TestCase):
+    """Пакетный AJAX-эндпоинт данных мастеров"""
+
+    def setUp(self):
+        clear_caches()
+        service = create_service(name="Стрижка")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.masters = [create_master(phone=f"+7 701 000 00 5{i}", last_name=f"Петров{i}") for i in range(5)]
+            for master in self.masters:
+                master.services.add(service)
+
+    def get(self, ids, **extra):
+        return self.client.get(reverse("get_masters_info"), {"ids": ",".join(map(str, ids))},
+                               HTTP_X_REQUESTED_WITH="XMLHttpRequest", **extra)
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        counts = []
+        for size in (1, 5):
+            clear_caches()
+            get_service_index()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.get([master.pk for master in self.masters[:size]])
+            self.assertEqual(len(response.json()["masters"]), size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+        # Повторный запрос - из кеша, без обращения к БД
+        with self.assertNumQueries(0):
+            self.get([master.pk for master in self.masters])
+
+    def test_unknown_ids_are_reported(self):
+        known = self.masters[0]
+        data = self.get([known.pk, 999998, 999999, known.pk]).json()
+
+        self.assertTrue(data["success"])
+        self.assertEqual(list(data["masters"]), [str(known.pk)])
+        self.assertEqual(data["masters"][str(known.pk)]["services"][0]["name"], "Стрижка")
+        self.assertEqual(data["not_found"], [999998, 999999])
+
+    def test_id_limit(self):
+        ids = [master.pk for master in self.masters]
+        self.assertEqual(self.get(ids).status_code, 200)
+        response = self.get(ids + [999999])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Не больше 5 мастеров за запрос")
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get(["abc"]).status_code, 400)
+        self.assertEqual(self.get([]).status_code, 400)
+        response = self.client.get(reverse("get_masters_info"), {"ids": self.masters[0].pk})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF="barbershop.urls_async")
+class AsyncViewsTests(TestCase):
+    """Асинхронные представления (core/async_views.py) через маршруты barbershop/urls_async.py"""
+
+    def setUp(self):
+        clear_caches()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.master = create_master(first_name="Степан")
+            create_master(first_name="Отпуск", phone="+7 701 000 00 60", is_active=False)
+            self.service = create_service(name="Бритье")
+            self.master.services.add(self.service)
+
+    def test_routes_use_async_views(self):
+        for name, kwargs, view in (
+            ("landing", {}, AsyncLandingPageView),
+            ("thanks_with_source", {"source": "order"}, AsyncThanksView),
+            ("masters_services_by_id_ajax", {}, AsyncMastersServicesAjaxView),
+            ("get_master_info", {}, AsyncMasterInfoAjaxView),
+        ):
+            self.assertIs(resolve(reverse(name, kwargs=kwargs)).func.view_class, view)
+
+    async def test_landing(self):
+        response = await self.async_client.get(reverse("landing"))
+        self.assertContains(response, "Степан")
+        self.assertContains(response, "Бритье")
+        # Блоки из кеша - та же страница
+        cached = await self.async_client.get(reverse("landing"))
+        self.assertEqual(cached.content, response.content)
+
+    async def test_thanks_counts_active_masters(self):
+        response = await self.async_client.get(reverse("thanks_with_source", kwargs={"source": "order"}))
+        self.assertEqual(response.context["masters_count"], 1)
+        self.assertContains(response, "Ваш заказ успешно создан")
+
+    async def test_masters_services(self):
+        url = reverse("masters_services_by_id_ajax")
+        response = await self.async_client.get(url, {"master_id": self.master.pk})
+        self.assertEqual(response.json(), [{"id": self.service.pk, "name": "Бритье"}])
+
+        response = await self.async_client.post(url, {"master_id": self.master.pk}, content_type="application/json")
+        self.assertEqual(response.json(), [{"id": self.service.pk, "name": "Бритье"}])
+        not_modified = await self.async_client.get(url, {"master_id": self.master.pk},
+                                                   headers={"If-None-Match": response["ETag"]})
+        self.assertEqual((not_modified.status_code, not_modified.content), (304, b""))
+
+        self.assertEqual((await self.async_client.get(url)).status_code, 400)
+        self.assertEqual((await self.async_client.get(url, {"master_id": "abc"})).status_code, 400)
+        self.assertEqual((await self.async_client.get(url, {"master_id": 999999})).status_code, 404)
+
+    async def test_master_info(self):
+        url = reverse("get_master_info")
+        xhr = {"X-Requested-With": "XMLHttpRequest"}
+        response = await self.async_client.get(url, {"master_id": self.master.pk}, headers=xhr)
+        data = response.json()
+        self.assertTrue(data["success"])
+        self.assertEqual(data["master"]["name"], "Степан Петров")
+        self.assertEqual(data["master"]["services"][0]["price"], "1000.00")
+
+        self.assertEqual((await self.async_client.get(url, {"master_id": self.master.pk})).status_code, 400)
+        self.assertEqual((await self.async_client.get(url, headers=xhr)).status_code, 400)
+        self.assertEqual((await self.async_client.get(url, {"master_id": 999999}, headers=xhr)).status_code, 404)
+
+    async def test_same_response_as_sync_view(self):
+        url = reverse("get_master_info")
+        xhr = {"X-Requested-With": "XMLHttpRequest"}
+        async_response = await self.async_client.get(url, {"master_id": self.master.pk}, headers=xhr)
+        await cache.aclear()
+        with override_settings(ROOT_URLCONF="barbershop.urls"):
+            sync_response = await sync_to_async(self.client.get)(url, {"master_id": self.master.pk}, headers=xhr)
+        self.assertEqual(async_response.content, sync_response.content)
+        self.assertEqual(async_response["ETag"], sync_response["ETag"])
+
+
+class OrderFormTests(TestCase):
+    """Проверки формы записи по нескольким полям"""
+
+    def setUp(self):
+        clear_caches()
+        self.master = create_master()
+        self.service = create_service()
+        self.master.services.add(self.service)
+
+    def make_form(self, **overrides):
+        data = {"client_name": "Анна", "phone": "+7 701 222 33 44", "master": self.master.pk,
+                "services": [self.service.pk], "appointment_date": tomorrow_at(12).strftime("%Y-%m-%d %H:%M")}
+        data.update(overrides)
+        return OrderForm(data=data)
+
+    def test_valid_order(self):
+        form = self.make_form()
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_rejects_service_master_does_not_offer(self):
+        other = create_service(name="Окрашивание")
+        form = self.make_form(services=[self.service.pk, other.pk])
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["services"], ["Мастер не оказывает услуги: Окрашивание"])
+
+    def test_rejects_past_time(self):
+        past = timezone.localtime() - timedelta(days=1)
+        form = self.make_form(appointment_date=past.strftime("%Y-%m-%d %H:%M"))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["appointment_date"], ["Нельзя записаться на прошедшее время"])
+
+    def test_rejects_busy_time(self):
+        create_order(master=self.master, appointment_date=tomorrow_at(12), status="approved")
+        form = self.make_form(appointment_date=tomorrow_at(12).strftime("%Y-%m-%d %H:%M"))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["appointment_date"], ["Это время у мастера уже занято"])
+
+    def test_rejects_new_booking_outside_working_hours(self):
+        form = self.make_form(appointment_date=tomorrow_at(8).strftime("%Y-%m-%d %H:%M"))
+        self.assertFalse(form.is_valid())
+        self.assertIn("Запись возможна с", form.errors["appointment_date"][0])
+
+    def test_existing_order_is_editable_outside_working_hours_and_in_past(self):
+        for appointment_date in (tomorrow_at(8), tomorrow_at(12) - timedelta(days=3)):
+            order = create_order(master=self.master, appointment_date=appointment_date)
+            data = {"client_name": "Анна", "phone": "+7 701 222 33 44", "master": self.master.pk,
+                    "services": [self.service.pk], "appointment_date": appointment_date.strftime("%Y-%m-%d %H:%M"),
+                    "comment": "Перезвонить"}
+            form = OrderForm(data=data, instance=order)
+            self.assertTrue(form.is_valid(), form.errors)
+
+    def test_existing_order_still_cannot_overlap(self):
+        create_order(master=self.master, appointment_date=tomorrow_at(8), status="approved")
+        order = create_order(master=self.master, appointment_date=tomorrow_at(12))
+        data = {"client_name": "Анна", "phone": "+7 701 222 33 44", "master": self.master.pk,
+                "services": [self.service.pk], "appointment_date": tomorrow_at(8).strftime("%Y-%m-%d %H:%M")}
+        form = OrderForm(data=data, instance=order)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["appointment_date"], ["Это время у мастера уже занято"])
+
+
+class AvailabilityTests(TestCase):
+    """Свободное время мастеров (core/availability.py)"""
+
+    def setUp(self):
+        clear_caches()
+        self.master = create_master()
+        self.day = tomorrow_at(10).date()
+
+    def test_busy_intervals_merge_and_lookup(self):
+        busy = BusyIntervals([
+            (tomorrow_at(12), tomorrow_at(13)),
+            (tomorrow_at(10), tomorrow_at(11)),
+            (tomorrow_at(11), tomorrow_at(11) + timedelta(minutes=30)),  # Смежный - сливается
+        ])
+        self.assertEqual(len(busy), 2)
+        self.assertFalse(busy.is_free(tomorrow_at(11), tomorrow_at(12)))
+        self.assertTrue(busy.is_free(tomorrow_at(11) + timedelta(minutes=30), tomorrow_at(12)))
+        self.assertFalse(busy.is_free(tomorrow_at(9), tomorrow_at(10) + timedelta(minutes=1)))
+        self.assertTrue(busy.is_free(tomorrow_at(13), tomorrow_at(14)))
+
+    def slots(self, duration=timedelta(minutes=60), master_ids=None):
+        master_ids = master_ids or [self.master.pk]
+        return get_availability(master_ids, self.day, 1, duration)
+
+    def test_free_slots_skip_orders(self):
+        service = create_service(duration=90)
+        create_order(master=self.master, appointment_date=tomorrow_at(12), status="approved").services.add(service)
+        create_order(master=self.master, appointment_date=tomorrow_at(15), status="canceled")
+
+        slots = self.slots()[self.master.pk][self.day.isoformat()]
+
+        self.assertIn("11:00", slots)
+        self.assertNotIn("11:15", slots)  # Час с 11:15 заходит на заказ в 12:00
+        self.assertNotIn("13:15", slots)
+        self.assertIn("13:30", slots)
+        self.assertIn("15:00", slots)  # Отмененный заказ время не занимает
+        self.assertEqual(slots[-1], "20:00")
+
+    def test_day_off_has_no_slots(self):
+        with override_settings(BOOKING_WORKDAYS=()):
+            self.assertEqual(self.slots(), {self.master.pk: {self.day.isoformat(): []}})
+            self.assertEqual(check_slot(self.master.pk, tomorrow_at(12), timedelta(minutes=20)),
+                             "В этот день мастер не работает")
+
+    def test_one_query_for_all_masters(self):
+        masters = [self.master] + [create_master(phone=f"+7 701 000 00 2{i}") for i in range(4)]
+        for i, master in enumerate(masters):
+            create_order(master=master, appointment_date=tomorrow_at(10 + i), status="approved")
+
+        with self.assertNumQueries(1):
+            result = get_availability([master.pk for master in masters], self.day, 7, timedelta(minutes=30))
+
+        self.assertEqual(len(result), 5)
+        self.assertNotIn("12:00", result[masters[2].pk][self.day.isoformat()])
+        self.assertIn("12:00", result[masters[1].pk][self.day.isoformat()])
+
+    def test_batch_endpoint(self):
+        other = create_master(phone="+7 701 000 00 30")
+        create_order(master=other, appointment_date=tomorrow_at(12), status="approved")
+        service = create_service(duration=45)
+        url = reverse("masters_availability_ajax")
+
+        response = self.client.get(url, {"master_id": [self.master.pk, other.pk], "date": self.day.isoformat(),
+                                         "days": 2, "service_id": service.pk})
+
+        data = response.json()
+        self.assertEqual((data["duration"], data["days"], data["step"]), (45, 2, 15))
+        self.assertEqual(set(data["masters"]), {str(self.master.pk), str(other.pk)})
+        self.assertIn("12:00", data["masters"][str(self.master.pk)][self.day.isoformat()])
+        self.assertNotIn("12:00", data["masters"][str(other.pk)][self.day.isoformat()])
+        self.assertEqual(len(data["masters"][str(other.pk)]), 2)
+
+    def test_batch_endpoint_errors(self):
+        url = reverse("masters_availability_ajax")
+        self.assertEqual(self.client.get(url, {"days": 0}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"date": "завтра"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"master_id": 999999}).status_code, 404)
+
+
+@override_settings(TELEGRAM_CHAT_IDS=["100"], TELEGRAM_OUTBOX_BACKOFF_SECONDS=10)
+class OutboxQueueTests(TestCase):
+    """Аренда записей очереди и повторы с задержкой"""
+
+    def test_claimed_entries_are_leased(self):
+        entry = enqueue_telegram_message("Сообщение")
+
+        self.assertEqual([claimed.pk for claimed in claim_batch(10)], [entry.pk])
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "processing")
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+        # Пока аренда не истекла, запись не достанется другому воркеру
+        self.assertEqual(claim_batch(10), [])
+
+        # Воркер упал - после окончания аренды запись снова доступна
+        TelegramOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([claimed.pk for claimed in claim_batch(10)], [entry.pk])
+
+    def test_failed_delivery_is_retried_with_backoff_then_marked_failed(self):
+        entry = enqueue_telegram_message("Сообщение")
+
+        def fail(deliveries):
+            return [[ConnectionError("нет сети")] * len(chat_ids) for chat_ids, _, _ in deliveries]
+
+        self.assertEqual(process_outbox_batch(fail, batch_size=10, max_attempts=2), (0, 1))
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts, entry.last_error), ("pending", 1, "нет сети"))
+        # Задержка 10 сек. с разбросом +-20%
+        self.assertGreater(entry.next_attempt_at, timezone.now() + timedelta(seconds=7))
+        self.assertEqual(process_outbox_batch(fail, batch_size=10, max_attempts=2), (0, 0))
+
+        TelegramOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_outbox_batch(fail, batch_size=10, max_attempts=2), (0, 1))
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ("failed", 2))
+
+    def test_digest_group_is_sent_as_one_message(self):
+        enqueue_telegram_message("Заказ 1", digest_group="order")
+        enqueue_telegram_message("Заказ 2", digest_group="order")
+        TelegramOutbox.objects.update(next_attempt_at=timezone.now())
+        sent = []
+
+        def send(deliveries):
+            sent.extend(text for _, text, _ in deliveries)
+            return [[None] * len(chat_ids) for chat_ids, _, _ in deliveries]
+
+        self.assertEqual(process_outbox_batch(send, batch_size=10, max_attempts=3), (2, 0))
+        self.assertEqual(len(sent), 1)
+        self.assertIn("Заказ 1", sent[0])
+        self.assertIn("Заказ 2", sent[0])
+
+    def test_admin_retry_skips_sent_and_leased_entries(self):
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "admin"))
+        now = timezone.now()
+        failed = TelegramOutbox.objects.create(message="Ошибка", status="failed", attempts=5, next_attempt_at=now)
+        sent = TelegramOutbox.objects.create(message="Отправлено", status="sent", attempts=1, next_attempt_at=now)
+        leased = TelegramOutbox.objects.create(message="Отправляется", status="processing",
+                                               next_attempt_at=now + timedelta(minutes=2))
+
+        self.client.post(reverse("admin:core_telegramoutbox_changelist"), {
+            "action": "retry_now", "_selected_action": [failed.pk, sent.pk, leased.pk],
+        })
+
+        statuses = dict(TelegramOutbox.objects.values_list("pk", "status"))
+        self.assertEqual(statuses, {failed.pk: "pending", sent.pk: "sent", leased.pk: "processing"})
+
+
+class OrderStatusTests(TestCase):
+    """Допустимые переходы статусов заказа"""
+
+    def test_clean_rejects_forbidden_transition(self):
+        order = create_order(status="completed")
+        order = Order.objects.get(pk=order.pk)
+        order.status = "approved"
+        with self.assertRaises(ValidationError) as error:
+            order.clean()
+        self.assertIn("status", error.exception.message_dict)
+
+    def test_clean_allows_permitted_transition(self):
+        order = Order.objects.get(pk=create_order(status="not_approved").pk)
+        order.status = "approved"
+        order.clean()
+
+    def test_transition_orders_counts_and_logs(self):
+        user = get_user_model().objects.create_user("manager")
+        movable = [create_order(status="not_approved"), create_order(status="in_awaiting")]
+        create_order(status="canceled")
+        create_order(status="completed")
+
+        result = transition_orders(Order.objects.all(), "canceled", user=user, chunk_size=1)
+
+        self.assertEqual((result.changed, result.unchanged, result.rejected), (2, 1, 1))
+        self.assertEqual(Order.objects.filter(status="canceled").count(), 3)
+        logs = OrderStatusLog.objects.order_by("order_id")
+        self.assertEqual([log.order_id for log in logs], [order.pk for order in movable])
+        self.assertEqual([log.old_status for log in logs], ["not_approved", "in_awaiting"])
+        self.assertTrue(all(log.changed_by == user for log in logs))
+
+
+class SlotReservationTests(TestCase):
+    """Бронь времени мастера"""
+
+    def setUp(self):
+        self.master = create_master()
+        self.first = create_order(master=self.master, appointment_date=tomorrow_at(12))
+        reserve_order_slots(self.first, timedelta(minutes=60))
+
+    def test_overlapping_order_is_rejected(self):
+        second = create_order(master=self.master, appointment_date=tomorrow_at(12) + timedelta(minutes=45))
+        with self.assertRaises(SlotTakenError):
+            reserve_order_slots(second, timedelta(minutes=30))
+        # Неудачная вставка откатывается целиком - у второго заказа нет ни одного слота
+        self.assertFalse(SlotReservation.objects.filter(order=second).exists())
+
+    def test_adjacent_order_and_other_master_are_allowed(self):
+        reserve_order_slots(create_order(master=self.master, appointment_date=tomorrow_at(13)), timedelta(minutes=30))
+        reserve_order_slots(
+            create_order(master=create_master(phone="+7 701 000 00 02"), appointment_date=tomorrow_at(12)),
+            timedelta(minutes=60),
+        )
+        self.assertEqual(SlotReservation.objects.count(), 4 + 2 + 4)
+
+    def test_released_time_can_be_booked_again(self):
+        release_order_slots([self.first.pk])
+        reserve_order_slots(create_order(master=self.master, appointment_date=tomorrow_at(12)), timedelta(minutes=60))
+
+    def test_cancel_releases_reserved_time(self):
+        transition_orders(Order.objects.filter(pk=self.first.pk), "canceled")
+
+        self.assertFalse(SlotReservation.objects.filter(order=self.first).exists())
+
+    def test_availability_uses_reservation_grid(self):
+        # Заказ 10:00-10:20 занимает слоты 10:00 и 10:15 - запись на 10:20 должна отклоняться
+        # и проверкой свободного времени, и бронью, а не падать на вставке брони
+        master = create_master(phone="+7 701 000 00 03")
+        order = create_order(master=master, appointment_date=tomorrow_at(10), status="approved")
+        reserve_order_slots(order, timedelta(minutes=20))
+        start = tomorrow_at(10) + timedelta(minutes=20)
+
+        self.assertEqual(check_slot(master.pk, start, timedelta(minutes=20)), "Это время у мастера уже занято")
+        self.assertIsNone(check_slot(master.pk, tomorrow_at(10) + timedelta(minutes=30), timedelta(minutes=20)))
+        day = tomorrow_at(10).date()
+        slots = get_availability([master.pk], day, 1, timedelta(minutes=20))[master.pk][day.isoformat()]
+        self.assertEqual(slots[0], "10:30")
+
+        with self.assertRaises(SlotTakenError):
+            reserve_order_slots(create_order(master=master, appointment_date=start), timedelta(minutes=20))
+
+
+class OrderSearchTests(TestCase):
+    """Полнотекстовый индекс заказов"""
+
+    def search(self, text):
+        return set(search_orders(Order.objects.all(), text, ["name", "comment"]).values_list("pk", flat=True))
+
+    def test_index_follows_queryset_update(self):
+        self.assertTrue(is_search_index_available())
+        order = create_order(client_name="Зинаида", comment="утренняя запись")
+
+        Order.objects.filter(pk=order.pk).update(client_name="Евлампия")
+
+        self.assertEqual(self.search("Евлампия"), {order.pk})
+        self.assertEqual(self.search("Зинаида"), set())
+        self.assertEqual(self.search("утренняя"), {order.pk})
+
+    def test_deleted_order_leaves_index(self):
+        order = create_order(client_name="Зинаида")
+        Order.objects.filter(pk=order.pk).delete()
+        self.assertEqual(self.search("Зинаида"), set())
+
+    def test_triggers_survive_migrations(self):
+        # Миграции, пересоздающие core_order (например, 0008), не должны терять триггеры индекса
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'core_order'")
+            triggers = {row[0] for row in cursor.fetchall()}
+        self.assertTrue({"core_order_fts_ai", "core_order_fts_ad", "core_order_fts_au"} <= triggers)
+
+
+class PhoneNormalizationTests(TestCase):
+    """Нормализованный телефон и поиск по его префиксу"""
+
+    def test_normalize_phone(self):
+        self.assertEqual(normalize_phone("+7 (701) 123-45-67"), "77011234567")
+        self.assertEqual(normalize_phone("8 701 123 45 67"), "77011234567")
+        self.assertEqual(normalize_phone("8-701-123-45-67"), "77011234567")
+        # Ведущая 8 заменяется только у полного номера из 11 цифр
+        self.assertEqual(normalize_phone("8701"), "8701")
+        self.assertEqual(normalize_phone("123-45-67"), "1234567")
+        self.assertEqual(normalize_phone(None), "")
+
+    def find(self, value):
+        return set(Order.objects.filter(phone_prefix_q(value)).values_list("phone", flat=True))
+
+    def test_prefix_matches_any_input_format(self):
+        create_order(phone="+7 (701) 123-45-67")
+        create_order(phone="8 702 000 00 00")
+        for value in ("+7 701", "8701", "7 (701) 12", "701-123"):
+            self.assertEqual(self.find(value), {"+7 (701) 123-45-67"}, value)
+        self.assertEqual(self.find("+7 70"), {"+7 (701) 123-45-67", "8 702 000 00 00"})
+        self.assertEqual(self.find("---"), set())
+
+    def test_prefix_range_edges(self):
+        create_order(phone="+7 799 999 99 99")
+        create_order(phone="+7 800 000 00 00")
+        create_order(phone="+7 999 000 00 00")
+        create_order(phone="9999")
+        # Верхняя граница для 7799 - 7800 (перенос разряда): соседний номер не попадает
+        self.assertEqual(self.find("+7 799"), {"+7 799 999 99 99"})
+        self.assertEqual(self.find("+7 800"), {"+7 800 000 00 00"})
+        self.assertEqual(self.find("+7 7999999999"), {"+7 799 999 99 99"})
+        self.assertEqual(self.find("+7 999"), {"+7 999 000 00 00"})
+        # Префикс из одних девяток - диапазон без верхней границы; без кода страны ищется и 799...
+        self.assertEqual(self.find("99"), {"9999", "+7 999 000 00 00"})
+
+
+class OrderRollupTests(TestCase):
+    """Инкрементальные срезы аналитики совпадают с полным пересчетом"""
+
+    def setUp(self):
+        self.master = create_master()
+        self.other_master = create_master(phone="+7 701 000 00 02")
+        self.haircut = create_service(price=1000)
+        self.shave = create_service(name="Бритье", price=500)
+        self.order = create_order(master=self.master)
+        self.order.services.add(self.haircut, self.shave)
+        self.today = timezone.localdate()
+
+    def rollups(self):
+        return (
+            sorted(OrderDailyRollup.objects.values_list("day", "status", "master_id", "orders", "revenue")),
+            sorted(ServiceDailyRollup.objects.values_list("day", "status", "service_id", "orders", "revenue")),
+        )
+
+    def assertMatchesRebuild(self, date_from=None):
+        incremental = self.rollups()
+        rebuild_rollups(date_from or self.today, self.today)
+        self.assertEqual(incremental, self.rollups())
+
+    def test_new_order_with_services(self):
+        self.assertEqual(get_dashboard_data(self.today, self.today)["summary"], {"orders": 1, "revenue": 1500})
+        self.assertMatchesRebuild()
+
+    def test_status_and_master_change(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = "approved"
+        order.master = self.other_master
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        # Сдвигаются только строки срезов этого заказа - без агрегатов по заказам дня
+        self.assertFalse([query["sql"] for query in queries if "GROUP BY" in query["sql"]])
+        self.assertMatchesRebuild()
+
+    def test_bulk_transition(self):
+        create_order(master=self.master).services.add(self.shave)
+        transition_orders(Order.objects.all(), "canceled")
+        self.assertEqual(
+            get_dashboard_data(self.today, self.today)["by_status"][0],
+            {"status": "canceled", "name": "Отменен", "orders": 2, "revenue": 2000},
+        )
+        self.assertMatchesRebuild()
+
+    def test_price_change(self):
+        self.shave.price = 700
+        self.shave.save()
+        self.assertEqual(get_dashboard_data(self.today, self.today)["summary"]["revenue"], 1700)
+        self.assertMatchesRebuild()
+
+    def test_date_change(self):
+        self.order.date_created -= timedelta(days=3)
+        self.order.save()
+        self.assertEqual(get_dashboard_data(self.today, self.today)["summary"]["orders"], 0)
+        self.assertMatchesRebuild(self.today - timedelta(days=3))
+
+    def test_services_removed_and_cleared(self):
+        self.order.services.remove(self.shave, create_service(name="Не в заказе"))
+        self.assertEqual(get_dashboard_data(self.today, self.today)["summary"]["revenue"], 1000)
+        self.haircut.orders.clear()
+        self.assertEqual(get_dashboard_data(self.today, self.today)["summary"]["revenue"], 0)
+        self.assertMatchesRebuild()
+
+    def test_deleted_order(self):
+        self.order.delete()
+        self.assertEqual(self.rollups(), ([], []))
+
+
+class ArchiveTests(TestCase):
+    """Архивация закрытых заказов"""
+
+    def test_rollups_survive_archival(self):
+        master = create_master()
+        service = create_service(price=1500)
+        with self.captureOnCommitCallbacks(execute=True):
+            for status in ("completed", "canceled", "approved"):
+                create_order(master=master, status=status).services.add(service)
+        Order.objects.update(date_updated=timezone.now() - timedelta(days=365))
+        today = timezone.localdate()
+        before = get_dashboard_data(today, today)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            archived = archive_orders(pause=0)
+
+        self.assertEqual(archived, 2)
+        self.assertEqual(list(Order.objects.values_list("status", flat=True)), ["approved"])
+        self.assertEqual(ArchivedOrder.objects.get(status="completed").services.get(), service)
+        self.assertEqual(get_dashboard_data(today, today), before)
+        self.assertEqual(before["summary"], {"orders": 3, "revenue": 4500})
+
+        # Полный пересчет срезов учитывает архив - статистика та же
+        rebuild_rollups(today, today)
+        self.assertEqual(get_dashboard_data(today, today), before)
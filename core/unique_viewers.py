@@ -0,0 +1,200 @@
+"""
+Учет уникальных посетителей страниц мастеров.
+
+Раньше в сессии хранился список просмотренных мастеров: он рос без ограничений,
+проверка "уже смотрел?" шла перебором, а каждое изменение перезаписывало сессию.
+Теперь в сессии хранится только постоянный visitor_id, а на каждого мастера
+хранятся две компактные структуры (MasterViewerSketch):
+
+- BloomFilter - отвечает "этот посетитель уже смотрел мастера?" (для счетчика просмотров);
+- HyperLogLog - приблизительное количество уникальных посетителей (для персонала).
+
+Фильтр Блума живет один период UNIQUE_VIEWERS_PERIOD - после этого посетитель
+снова учитывается в view_count, как раньше после истечения сессии.
+
+Структуры живут в памяти процесса (ViewerSketchBuffer): строка MasterViewerSketch
+читается один раз при первом просмотре мастера, дальше просмотр - это проверка и
+установка битов в памяти без обращения к БД. Фоновый поток раз в
+VIEW_COUNT_FLUSH_INTERVAL секунд сливает измененные фильтры со строками в БД
+(биты фильтра - OR, регистры HyperLogLog - максимум) одной транзакцией и забирает
+обратно то, что накопили другие процессы (core/background_flush.py).
+
+Слияние не теряет посетителей, но пока процессы не обменялись фильтрами, посетитель,
+попавший в разные процессы gunicorn/uvicorn, может быть учтен в view_count дважды.
+Количество уникальных посетителей от этого не растет: HyperLogLog не считает
+одного посетителя дважды.
+"""
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+
+from .background_flush import PeriodicFlushBuffer
+from .models import Master, MasterViewerSketch
+from .sketches import BloomFilter, HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+
+def get_visitor_id(request) -> str:
+    """Постоянный идентификатор посетителя, хранится в сессии (32 символа)"""
+    visitor_id = request.session.get("visitor_id")
+    if not visitor_id:
+        visitor_id = uuid.uuid4().hex
+        request.session["visitor_id"] = visitor_id
+    return visitor_id
+
+
+def _period() -> int:
+    return int(time.time() // settings.UNIQUE_VIEWERS_PERIOD)
+
+
+def _load_bloom(data: bytes | None) -> BloomFilter:
+    capacity = settings.UNIQUE_VIEWERS_BLOOM_CAPACITY
+    error_rate = settings.UNIQUE_VIEWERS_BLOOM_ERROR_RATE
+    if data:
+        return BloomFilter.from_bytes(bytes(data), capacity=capacity, error_rate=error_rate)
+    return BloomFilter(capacity=capacity, error_rate=error_rate)
+
+
+def _load_hll(data: bytes | None) -> HyperLogLog:
+    return HyperLogLog.from_bytes(bytes(data)) if data else HyperLogLog(settings.UNIQUE_VIEWERS_HLL_PRECISION)
+
+
+@dataclass
+class MasterSketch:
+    """Фильтр Блума текущего периода и HyperLogLog одного мастера"""
+    period: int
+    bloom: BloomFilter
+    hll: HyperLogLog
+    dirty: bool = False
+
+    @classmethod
+    def from_row(cls, row: MasterViewerSketch | None, period: int) -> "MasterSketch":
+        if row is None:
+            return cls(period, _load_bloom(None), _load_hll(None))
+        sketch = cls(row.bloom_period, _load_bloom(row.bloom), _load_hll(row.hll))
+        sketch.start_period(period)
+        return sketch
+
+    def start_period(self, period: int) -> None:
+        """Фильтр прошлого периода больше не нужен - посетители учитываются заново"""
+        if period > self.period:
+            self.period, self.bloom = period, _load_bloom(None)
+
+    def merge(self, other: "MasterSketch") -> None:
+        if other.period == self.period:
+            self.bloom.merge(other.bloom)
+        elif other.period > self.period:
+            self.period, self.bloom = other.period, _load_bloom(other.bloom.to_bytes())
+        self.hll.merge(other.hll)
+
+    def copy(self) -> "MasterSketch":
+        return MasterSketch(self.period, _load_bloom(self.bloom.to_bytes()), _load_hll(self.hll.to_bytes()))
+
+
+class ViewerSketchBuffer(PeriodicFlushBuffer):
+    """Фильтры посетителей мастеров в памяти процесса с периодическим слиянием с БД"""
+
+    thread_name = "viewer-sketch-flush"
+
+    def __init__(self, flush_interval: float):
+        super().__init__(flush_interval)
+        self._sketches: dict[int, MasterSketch] = {}
+
+    def register(self, master_id: int, visitor_id: str) -> bool:
+        """
+        Учитывает просмотр мастера посетителем.
+        Возвращает True, если посетитель (вероятно) раньше не смотрел этого мастера в текущем периоде.
+        """
+        period = _period()
+        if master_id not in self._sketches:
+            # Первый просмотр мастера в этом процессе - один SELECT, дальше только память
+            loaded = MasterSketch.from_row(MasterViewerSketch.objects.filter(master_id=master_id).first(), period)
+            with self._lock:
+                self._sketches.setdefault(master_id, loaded)
+        with self._lock:
+            sketch = self._sketches[master_id]
+            sketch.start_period(period)
+            if visitor_id in sketch.bloom:
+                return False
+            sketch.bloom.add(visitor_id)
+            sketch.hll.add(visitor_id)
+            sketch.dirty = True
+        self._ensure_started()
+        return True
+
+    def unique_viewers(self, master_id: int) -> int:
+        """Приблизительное количество уникальных посетителей: из памяти или из БД"""
+        with self._lock:
+            sketch = self._sketches.get(master_id)
+            if sketch is not None:
+                return sketch.hll.count()
+        data = MasterViewerSketch.objects.filter(master_id=master_id).values_list("hll", flat=True).first()
+        return _load_hll(data).count() if data else 0
+
+    def flush(self) -> int:
+        """
+        Сливает измененные с прошлого сброса фильтры со строками MasterViewerSketch
+        в одной транзакции и забирает в память результат слияния.
+        Возвращает количество записанных мастеров.
+        """
+        with self._lock:
+            changed = {master_id: sketch.copy() for master_id, sketch in self._sketches.items() if sketch.dirty}
+            for master_id in changed:
+                self._sketches[master_id].dirty = False
+        if not changed:
+            return 0
+        try:
+            with transaction.atomic():
+                # Удаленные мастера пропускаем - их строк уже нет
+                existing = set(Master.objects.filter(pk__in=changed).values_list("pk", flat=True))
+                rows = {row.master_id: row for row in
+                        MasterViewerSketch.objects.select_for_update().filter(master_id__in=existing)}
+                merged = {}
+                for master_id in existing:
+                    row = rows.get(master_id)
+                    sketch = MasterSketch.from_row(row, changed[master_id].period)
+                    sketch.merge(changed[master_id])
+                    MasterViewerSketch(
+                        master_id=master_id, bloom_period=sketch.period,
+                        bloom=sketch.bloom.to_bytes(), hll=sketch.hll.to_bytes(),
+                    ).save(force_insert=row is None)
+                    merged[master_id] = sketch
+        except Exception as e:
+            # Память не менялась - запишем при следующем сбросе
+            with self._lock:
+                for master_id in changed:
+                    if master_id in self._sketches:
+                        self._sketches[master_id].dirty = True
+            logger.error(f"Не удалось записать посетителей мастеров: {e}")
+            return 0
+        with self._lock:
+            for master_id in changed:
+                if master_id not in merged:
+                    self._sketches.pop(master_id, None)
+                elif master_id in self._sketches:
+                    # Посетители, пришедшие во время сброса, остаются: слияние ничего не удаляет
+                    self._sketches[master_id].merge(merged[master_id])
+        return len(merged)
+
+    def clear(self) -> None:
+        """Забывает фильтры в памяти (без записи) - следующий просмотр прочитает их из БД"""
+        with self._lock:
+            self._sketches.clear()
+
+
+viewer_sketches = ViewerSketchBuffer(flush_interval=settings.VIEW_COUNT_FLUSH_INTERVAL)
+
+
+def register_view(master_id: int, visitor_id: str) -> bool:
+    """Учитывает просмотр мастера посетителем (см. ViewerSketchBuffer.register)"""
+    return viewer_sketches.register(master_id, visitor_id)
+
+
+def get_unique_viewers(master_id: int) -> int:
+    """Приблизительное количество уникальных посетителей страницы мастера"""
+    return viewer_sketches.unique_viewers(master_id)
@@ -4,9 +4,14 @@ from django.urls import path
 from .views import (
     ThanksView,
     MastersServicesAjaxView,
+    MasterAvailabilityAjaxView,
     OrderCreateView,
+    OrdersExportView,
+    ArchivedOrdersListView,
+    AnalyticsDashboardView,
     ReviewCreateView,
     MasterInfoAjaxView,
+    MastersInfoBatchAjaxView,
     GreetingView,  # Добавили импорт GreetingView
     SimplePageView,  # Добавили импорт SimplePageView
     AboutUsView,  # Добавили импорт AboutUsView
@@ -26,6 +31,9 @@ urlpatterns = [
     path("thanks/", ThanksView.as_view(), name="thanks"),
     path("thanks/<str:source>/", ThanksView.as_view(), name="thanks_with_source"),
     path("orders/", OrdersListView.as_view(), name="orders_list"),
+    path("orders/export/", OrdersExportView.as_view(), name="orders_export"),
+    path("orders/archive/", ArchivedOrdersListView.as_view(), name="archived_orders_list"),
+    path("analytics/", AnalyticsDashboardView.as_view(), name="analytics_dashboard"),
     path("orders/<int:order_id>/", OrderDetailView.as_view(), name="order_detail"),
     path(
         "services/", ServicesListView.as_view(), name="services_list"
@@ -37,9 +45,11 @@ urlpatterns = [
     path(
         "masters_services/", MastersServicesAjaxView.as_view(), name="masters_services_by_id_ajax"
     ),
+    path("masters_availability/", MasterAvailabilityAjaxView.as_view(), name="masters_availability_ajax"),
     path("order_create/", OrderCreateView.as_view(), name="order_create"),
     path("review/create/", ReviewCreateView.as_view(), name="create_review"),
     path("api/master-info/", MasterInfoAjaxView.as_view(), name="get_master_info"),
+    path("api/masters-info/", MastersInfoBatchAjaxView.as_view(), name="get_masters_info"),
     # --- Этап 1: Базовые CBV ---
     path("greeting/", GreetingView.as_view(), name="greeting"),
     path("simple-page/", SimplePageView.as_view(), name="simple_page"),
@@ -0,0 +1,16 @@
+# core/urls_async.py
+# Маршруты core для ASGI: асинхронные версии представлений (core/async_views.py)
+# перекрывают синхронные с теми же путями и именами, остальные маршруты - из core/urls.py
+from django.urls import path
+
+from .async_views import AsyncMasterInfoAjaxView, AsyncMastersServicesAjaxView, AsyncThanksView
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("thanks/", AsyncThanksView.as_view(), name="thanks"),
+    path("thanks/<str:source>/", AsyncThanksView.as_view(), name="thanks_with_source"),
+    path(
+        "masters_services/", AsyncMastersServicesAjaxView.as_view(), name="masters_services_by_id_ajax"
+    ),
+    path("api/master-info/", AsyncMasterInfoAjaxView.as_view(), name="get_master_info"),
+] + sync_urlpatterns
@@ -0,0 +1,74 @@
+"""
+Буферизованный счетчик просмотров мастеров.
+
+Раньше каждый первый просмотр страницы мастера выполнял
+UPDATE ... SET view_count = view_count + 1 прямо в запросе пользователя, и на SQLite
+такие записи выстраивались в очередь за блокировкой БД. Теперь просмотры
+складываются в потокобезопасный счетчик в памяти процесса, а фоновый поток раз
+в VIEW_COUNT_FLUSH_INTERVAL секунд записывает их одним UPDATE на мастера
+(core/background_flush.py). Запрос пользователя не обращается ни к БД, ни к кешу.
+
+Чего буфер не гарантирует:
+- у каждого процесса gunicorn/uvicorn свой буфер, поэтому на странице к Master.view_count
+  прибавляются только просмотры, еще не записанные этим процессом;
+- процесс, убитый SIGKILL или OOM, теряет просмотры за последний интервал сброса.
+При штатной остановке (atexit) буфер сбрасывается, а если запись в БД не удалась,
+просмотры возвращаются в буфер до следующего сброса.
+"""
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .background_flush import PeriodicFlushBuffer
+from .models import Master
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer(PeriodicFlushBuffer):
+    """Потокобезопасный буфер просмотров с периодическим сбросом в Master.view_count"""
+
+    thread_name = "view-count-flush"
+
+    def __init__(self, flush_interval: float):
+        super().__init__(flush_interval)
+        self._counts: Counter = Counter()
+
+    def increment(self, master_id: int, amount: int = 1) -> None:
+        """Учитывает просмотр. Сам запрос пользователя в БД не пишет"""
+        with self._lock:
+            self._counts[master_id] += amount
+        self._ensure_started()
+
+    def pending(self, master_id: int) -> int:
+        """Просмотры мастера, еще не записанные в БД этим процессом"""
+        with self._lock:
+            return self._counts.get(master_id, 0)
+
+    def flush(self) -> int:
+        """
+        Записывает накопленные просмотры в БД: один UPDATE на каждого мастера,
+        которого смотрели с прошлого сброса, в одной транзакции.
+        Возвращает количество записанных просмотров.
+        """
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return 0
+        try:
+            with transaction.atomic():
+                for master_id, amount in counts.items():
+                    Master.objects.filter(pk=master_id).update(view_count=F("view_count") + amount)
+        except Exception as e:
+            # Возвращаем просмотры в буфер - запишем при следующем сбросе
+            with self._lock:
+                self._counts.update(counts)
+            logger.error(f"Не удалось записать просмотры мастеров: {e}")
+            return 0
+        return sum(counts.values())
+
+
+view_counter = ViewCountBuffer(flush_interval=settings.VIEW_COUNT_FLUSH_INTERVAL)
@@ -3,35 +3,69 @@
 Содержит классы представлений (CBV) для обработки запросов барбершопа.
 """
 from django.shortcuts import redirect, render
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from .data import *
 from django.contrib.auth.decorators import login_required
-from .models import Order, Master, Service, Review
+from .models import Order, Master, Service, Review, ArchivedOrder
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, F, Prefetch
 from django.views import View
 from django.views.generic import TemplateView, ListView, DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
+from django.db import transaction
+from django.conf import settings
+from django.utils import timezone
 import datetime
 
 from django.contrib import messages
 from .forms import ServiceForm, OrderForm, ReviewForm, ServiceEasyForm
 import json
+from .cache_versions import get_version
+from .ajax_cache import cached_master_json, cached_masters_json
+from .json_response import FastJsonResponse
+from .master_info import get_masters_info
+from .view_counter import view_counter
+from .unique_viewers import get_unique_viewers, get_visitor_id, register_view
+from .order_search import search_orders
+from .order_export import CSV_CONTENT_TYPE, XLSX_CONTENT_TYPE, export_rows, stream_csv, stream_xlsx
+from .pagination import CappedOffsetPaginator, KeysetPaginator, estimate_count
+from .analytics import get_dashboard_data
+from .availability import get_availability, get_order_duration, get_services_duration
+from .reservations import SlotTakenError, reserve_order_slots
+from .service_index import get_service_index
 
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 
 
 class LandingPageView(TemplateView):
-    """Представление для главной (посадочной) страницы сайта."""
+    """
+    Представление для главной (посадочной) страницы сайта.
+    Блоки мастеров и услуг кешируются в шаблоне под ключом с версией "landing",
+    которую сдвигают сигналы Master/Service. Пока блок в кеше, ленивые QuerySet
+    не вычисляются и страница отдается без запросов к БД.
+    """
     template_name = "core/landing.html"
     extra_context = {
         "title": "Главная - Барбершоп Арбуз",
         "years_on_market": 50,
-        "masters": Master.objects.all(),
-        "services": Service.objects.all(),
     }
 
+    def get_landing_data(self) -> dict:
+        """Ленивые QuerySet мастеров и услуг и версия кеша блоков (см. AsyncLandingPageView)."""
+        return {
+            "masters": Master.objects.all(),
+            "services": Service.objects.all(),
+            "landing_version": get_version("landing"),
+        }
+
+    def get_context_data(self, **kwargs):
+        """Добавляет данные блоков мастеров и услуг и время жизни их кеша."""
+        context = super().get_context_data(**kwargs)
+        context.update(self.get_landing_data())
+        context["landing_cache_timeout"] = settings.LANDING_CACHE_TIMEOUT
+        return context
+
 
 
 class StaffRequiredMixin(UserPassesTestMixin):
@@ -64,9 +98,11 @@ class MasterDetailView(DetailView):
     """
     Представление для отображения детальной информации о мастере и его услугах.
     Реализует:
-    - Жадную загрузку связанных услуг и отфильтрованных отзывов для решения проблемы N+1
-    - Атомарное обновление счетчика просмотров с использованием F-выражений
-    - Кэширование просмотренных мастеров в сессии для избежания повторного счетчика
+    - Жадную загрузку отфильтрованных отзывов для решения проблемы N+1
+    - Услуги мастера из индекса в памяти (core/service_index.py) - без запроса к БД
+    - Буферизованный счетчик просмотров (core/view_counter.py) вместо UPDATE в каждом запросе
+    - Учет уникальных посетителей через фильтр Блума и HyperLogLog (core/unique_viewers.py)
+      вместо растущего списка просмотренных мастеров в сессии
     """
     model = Master
     template_name = "core/master_detail.html"
@@ -74,44 +110,46 @@ class MasterDetailView(DetailView):
 
     def get_queryset(self):
         """
-        Возвращает QuerySet с жадной загрузкой связанных услуг и опубликованных отзывов.
+        Возвращает QuerySet с жадной загрузкой опубликованных отзывов.
         Использует Prefetch для фильтрации отзывов по статусу публикации и сортировки.
         """
         return Master.objects.prefetch_related(
-            'services',
             Prefetch('reviews', queryset=Review.objects.filter(is_published=True).order_by("-created_at"))
         )
 
     def get_object(self, queryset=None):
         """
-        Получает объект мастера и атомарно увеличивает счетчик просмотров,
-        если мастер еще не был просмотрен в текущей сессии.
+        Получает объект мастера и учитывает просмотр в буфере счетчика,
+        если посетитель еще не смотрел этого мастера.
         """
         master = super().get_object(queryset)
         
         master_id = master.id
-        viewed_masters = self.request.session.get("viewed_masters", [])
+        # В сессии хранится только идентификатор посетителя - ее размер не растет
+        visitor_id = get_visitor_id(self.request)
+        # Старый формат: список просмотренных мастеров больше не нужен
+        self.request.session.pop("viewed_masters", None)
 
-        if master_id not in viewed_masters:
-            # Атомарное обновление счетчика просмотров в БД
-            Master.objects.filter(id=master_id).update(view_count=F("view_count") + 1)
-            
-            # Обновляем сессию и счетчик в объекте для немедленного отображения
-            viewed_masters.append(master_id)
-            self.request.session["viewed_masters"] = viewed_masters
-            master.view_count += 1
+        if register_view(master_id, visitor_id):
+            # Просмотр попадет в БД при ближайшем сбросе буфера
+            view_counter.increment(master_id)
+
+        # Показываем счетчик вместе с еще не записанными в БД просмотрами
+        master.view_count += view_counter.pending(master_id)
 
         return master
 
     def get_context_data(self, **kwargs):
         """
         Добавляет в контекст связанные отзывы, услуги и заголовок страницы.
-        Данные уже загружены благодаря `prefetch_related` в `get_queryset`.
+        Отзывы уже загружены благодаря `prefetch_related` в `get_queryset`, услуги берутся из индекса.
         """
         context = super().get_context_data(**kwargs)
         context['reviews'] = self.object.reviews.all()
-        context['services'] = self.object.services.all()
+        context['services'] = get_service_index().get_services(self.object.id)
         context['title'] = f"Мастер {self.object.first_name} {self.object.last_name}"
+        if self.request.user.is_staff:
+            context['unique_viewers'] = get_unique_viewers(self.object.id)
         return context
 
 
@@ -127,6 +165,10 @@ class ThanksView(TemplateView):
     """
     template_name = "core/thanks.html"
 
+    def get_masters_count(self) -> int:
+        """Количество активных мастеров (см. AsyncThanksView)"""
+        return Master.objects.filter(is_active=True).count()
+
     def get_context_data(self, **kwargs):
         """
         Формирует контекст для страницы благодарности:
@@ -136,8 +178,7 @@ class ThanksView(TemplateView):
         """
         context = super().get_context_data(**kwargs)
 
-        masters_count = Master.objects.filter(is_active=True).count()
-        context["masters_count"] = masters_count
+        context["masters_count"] = self.get_masters_count()
         context["additional_message"] = "Спасибо, что выбрали наш первоклассный сервис!"
 
         # Определяем сообщение в зависимости от источника
@@ -155,39 +196,153 @@ class ThanksView(TemplateView):
         return context
 
 
-class OrdersListView(StaffRequiredMixin, ListView):
+class OrderSearchMixin:
+    """Фильтрация заказов по параметрам поисковой формы (search, search_in) - общая для списка и выгрузки"""
+
+    def filter_orders(self, queryset, by_relevance=False):
+        search_query = self.request.GET.get("search", None)
+        if not search_query:
+            return queryset
+        return search_orders(
+            queryset,
+            search_query,
+            self.request.GET.getlist("search_in"),
+            by_relevance=by_relevance,
+        )
+
+
+class OrdersListView(StaffRequiredMixin, OrderSearchMixin, ListView):
     """
     Представление для отображения списка заказов с возможностью фильтрации.
     Доступно только для персонала. Реализует поиск по телефону, имени и комментарию.
+    Пагинация курсорная (core/pagination.py): без COUNT(*) и OFFSET на каждой странице.
     """
     model = Order
     template_name = "core/orders_list.html"
     context_object_name = "orders"
     paginate_by = 1
+    by_relevance = False
 
     def get_queryset(self):
         """
         Возвращает QuerySet заказов с жадной загрузкой связанных данных.
         Поддерживает фильтрацию по поисковому запросу и выбранным полям (телефон, имя, комментарий).
+        Поиск идет по полнотекстовому индексу (core/order_search.py), sort=relevance - по релевантности.
         """
         all_orders = Order.objects.select_related("master").prefetch_related("services").all()
-        search_query = self.request.GET.get("search", None)
+        if self.request.GET.get("search"):
+            self.by_relevance = self.request.GET.get("sort") == "relevance"
+        return self.filter_orders(all_orders, by_relevance=self.by_relevance)
 
-        if search_query:
-            check_boxes = self.request.GET.getlist("search_in")
-            filters = Q()
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Заменяет Paginator курсорной пагинацией по (date_created, id).
+        Результаты поиска по релевантности не имеют такого ключа - они листаются
+        смещением, ограниченным ORDER_SEARCH_MAX_RANKED.
+        """
+        if self.by_relevance:
+            paginator = CappedOffsetPaginator(queryset, page_size, settings.ORDER_SEARCH_MAX_RANKED)
+        else:
+            paginator = KeysetPaginator(queryset, page_size, field="date_created")
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except ValueError:
+            raise Http404("Неверный курсор страницы")
+
+        # Оценка - только для списка без поиска (см. estimate_count)
+        if settings.ORDERS_LIST_ESTIMATED_TOTAL:
+            page.estimated_total = estimate_count(queryset)
+        page.next_url = self._cursor_url(page.next_cursor)
+        page.previous_url = self._cursor_url(page.previous_cursor)
+        return paginator, page, page.object_list, page.has_other_pages
 
-            if "phone" in check_boxes:
-                filters |= Q(phone__icontains=search_query)
-            if "name" in check_boxes:
-                filters |= Q(client_name__icontains=search_query)
-            if "comment" in check_boxes:
-                filters |= Q(comment__icontains=search_query)
+    def get_context_data(self, **kwargs):
+        """Добавляет параметры поиска для ссылок выгрузки (без курсора и сортировки)"""
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.copy()
+        for key in ("cursor", "sort", "format"):
+            query.pop(key, None)
+        context["export_query"] = query.urlencode()
+        return context
 
-            if filters:
-                all_orders = all_orders.filter(filters)
+    def _cursor_url(self, cursor):
+        if cursor is None:
+            return None
+        query = self.request.GET.copy()
+        query["cursor"] = cursor
+        return "?" + query.urlencode()
 
-        return all_orders
+
+class ArchivedOrdersListView(OrdersListView):
+    """
+    Поиск по архиву закрытых заказов (core/archive.py) с теми же параметрами, что и
+    список заказов. Полнотекстового индекса у архива нет - текст ищется через LIKE,
+    телефон - по индексу phone_digits; сортировка по релевантности не поддерживается.
+    """
+    model = ArchivedOrder
+    template_name = "core/archived_orders_list.html"
+    paginate_by = 20
+    extra_context = {
+        "title": "Архив заказов",
+    }
+
+    def get_queryset(self):
+        """Архивные заказы с мастером и услугами, отфильтрованные поиском (без релевантности)"""
+        archived = ArchivedOrder.objects.select_related("master").prefetch_related("services")
+        return self.filter_orders(archived)
+
+
+class OrdersExportView(StaffRequiredMixin, OrderSearchMixin, View):
+    """
+    Потоковая выгрузка заказов в CSV или XLSX (?format=xlsx) с теми же фильтрами поиска,
+    что и список заказов. Строки читаются из БД пачками и сразу отдаются клиенту
+    (core/order_export.py), поэтому память не растет с размером выгрузки.
+    """
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get("format", "csv")
+        if export_format not in ("csv", "xlsx"):
+            return HttpResponse("Неизвестный формат выгрузки", status=400)
+
+        rows = export_rows(self.filter_orders(Order.objects.all()))
+        if export_format == "xlsx":
+            response = StreamingHttpResponse(stream_xlsx(rows), content_type=XLSX_CONTENT_TYPE)
+        else:
+            response = StreamingHttpResponse(stream_csv(rows), content_type=CSV_CONTENT_TYPE)
+        filename = f"orders_{timezone.localtime():%Y%m%d_%H%M}.{export_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class AnalyticsDashboardView(StaffRequiredMixin, TemplateView):
+    """
+    Дашборд аналитики заказов: заказы и выручка по статусам, мастерам, услугам и дням.
+    Читает только дневные срезы (core/analytics.py), таблицу заказов не сканирует.
+    Период - GET-параметры date_from и date_to (YYYY-MM-DD), по умолчанию последние 30 дней.
+    """
+    template_name = "core/analytics_dashboard.html"
+    default_days = 30
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        today = timezone.localdate()
+        try:
+            date_to = datetime.date.fromisoformat(self.request.GET.get("date_to") or today.isoformat())
+            date_from = datetime.date.fromisoformat(
+                self.request.GET.get("date_from")
+                or (date_to - datetime.timedelta(days=self.default_days - 1)).isoformat()
+            )
+        except ValueError:
+            raise Http404("Неверный формат даты")
+        statuses = [status for status in self.request.GET.getlist("status") if status in dict(Order.STATUS_CHOICES)]
+
+        context["title"] = "Аналитика заказов"
+        context["date_from"] = date_from
+        context["date_to"] = date_to
+        context["selected_statuses"] = statuses
+        context["status_choices"] = Order.STATUS_CHOICES
+        context.update(get_dashboard_data(date_from, date_to, statuses=statuses))
+        return context
 
 
 class OrderDetailView(LoginRequiredMixin, DetailView):
@@ -282,14 +437,64 @@ class MastersServicesAjaxView(View):
         return self.get_services_json_response(master_id)
 
     def get_services_json_response(self, master_id):
-        """Возвращает JSON-ответ со списком услуг мастера или ошибку."""
+        """
+        Возвращает JSON-ответ со списком услуг мастера или ошибку.
+        Ответ кешируется с ETag/Last-Modified (core/ajax_cache.py).
+        """
         if not master_id:
-            return JsonResponse({"error": "master_id is required"}, status=400)
+            return FastJsonResponse({"error": "master_id is required"}, status=400)
+        try:
+            master_id = int(master_id)
+        except (TypeError, ValueError):
+            return FastJsonResponse({"error": "master_id must be an integer"}, status=400)
+
+        def build():
+            # Услуги мастера - из индекса в памяти (core/service_index.py), без запросов к БД
+            index = get_service_index()
+            if not index.has_master(master_id):
+                return {"error": "Master not found"}, 404
+            return [{"id": service.id, "name": service.name} for service in index.get_services(master_id)], 200
+
+        return cached_master_json(self.request, "masters_services", master_id, build)
 
-        master = get_object_or_404(Master, id=master_id)
-        services = master.services.all()
-        response_data = [{"id": service.id, "name": service.name} for service in services]
-        return JsonResponse(response_data, safe=False)
+
+class MasterAvailabilityAjaxView(View):
+    """
+    AJAX-представление со свободным временем мастеров (core/availability.py).
+    GET-параметры:
+        master_id - один или несколько (master_id=1&master_id=2); без него - все активные мастера
+        date - первый день в формате YYYY-MM-DD (по умолчанию сегодня)
+        days - количество дней (по умолчанию 1, не больше BOOKING_MAX_DAYS)
+        service_id - выбранные услуги, по ним считается длительность записи
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            master_ids = [int(pk) for pk in request.GET.getlist("master_id")]
+            service_ids = [int(pk) for pk in request.GET.getlist("service_id")]
+            days = int(request.GET.get("days", 1))
+            date_param = request.GET.get("date")
+            date_from = datetime.date.fromisoformat(date_param) if date_param else timezone.localdate()
+        except ValueError:
+            return FastJsonResponse({"error": "Неверные параметры запроса"}, status=400)
+        if not 1 <= days <= settings.BOOKING_MAX_DAYS:
+            return FastJsonResponse({"error": f"days должен быть от 1 до {settings.BOOKING_MAX_DAYS}"}, status=400)
+
+        masters = Master.objects.filter(is_active=True)
+        if master_ids:
+            masters = masters.filter(pk__in=master_ids)
+        found_ids = list(masters.values_list("pk", flat=True))
+        if master_ids and not found_ids:
+            return FastJsonResponse({"error": "Мастер не найден"}, status=404)
+
+        duration = get_services_duration(service_ids)
+        availability = get_availability(found_ids, date_from, days, duration)
+        return FastJsonResponse({
+            "date": date_from.isoformat(),
+            "days": days,
+            "duration": int(duration.total_seconds() // 60),
+            "step": settings.BOOKING_SLOT_STEP_MINUTES,
+            "masters": {str(master_id): slots for master_id, slots in availability.items()},
+        })
 
 class OrderCreateView(CreateView):
     """Представление для создания нового заказа."""
@@ -311,8 +516,22 @@ class OrderCreateView(CreateView):
     def form_valid(self, form):
         """Обрабатывает успешное создание заказа, показывает сообщение."""
         client_name = form.cleaned_data.get("client_name")
+        # Услуги уже загружены формой - уведомление соберется без повторного запроса
+        services = list(form.cleaned_data.get("services", []))
+        form.instance._loaded_services = services
+        # Заказ, его услуги, бронь времени мастера и уведомление в очереди
+        # сохраняются одной транзакцией
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+                reserve_order_slots(self.object, get_order_duration(services))
+        except SlotTakenError as e:
+            # Время заняли параллельным запросом - заказ откатился вместе с транзакцией
+            form.instance.pk = None
+            form.add_error("appointment_date", str(e))
+            return self.form_invalid(form)
         messages.success(self.request, f"Заказ для {client_name} успешно создан!")
-        return super().form_valid(form)
+        return response
 
 
 class ReviewCreateView(CreateView):
@@ -349,6 +568,7 @@ class ReviewCreateView(CreateView):
         """
         review = form.save(commit=False)
         review.is_published = False
+        # Отзыв попадет в очередь модерации (moderation_status="pending")
         review.save()
         
         messages.success(
@@ -365,24 +585,62 @@ class MasterInfoAjaxView(View):
     def get(self, request, *args, **kwargs):
         """Обрабатывает GET-запрос, проверяет AJAX-запрос и параметр master_id."""
         if not request.headers.get("X-Requested-With") == "XMLHttpRequest":
-            return JsonResponse({"success": False, "error": "Недопустимый запрос"}, status=400)
+            return FastJsonResponse({"success": False, "error": "Недопустимый запрос"}, status=400)
 
         master_id = request.GET.get("master_id")
         if not master_id:
-            return JsonResponse({"success": False, "error": "Не указан ID мастера"}, status=400)
+            return FastJsonResponse({"success": False, "error": "Не указан ID мастера"}, status=400)
+        try:
+            master_id = int(master_id)
+        except ValueError:
+            return FastJsonResponse({"success": False, "error": "Неверный ID мастера"}, status=400)
+
+        def build():
+            master_data = get_masters_info([master_id]).get(master_id)
+            if master_data is None:
+                return {"success": False, "error": "Мастер не найден"}, 404
+            return {"success": True, "master": master_data}, 200
 
+        # Ответ кешируется с ETag/Last-Modified (core/ajax_cache.py)
+        return cached_master_json(request, "master_info", master_id, build)
+
+
+class MastersInfoBatchAjaxView(View):
+    """
+    Пакетная версия MasterInfoAjaxView: данные нескольких мастеров за один запрос.
+    GET-параметры: master_id=1&master_id=2 или ids=1,2 (не больше MASTER_INFO_BATCH_MAX).
+    Ответ: {"success": true, "masters": {"1": {...}}, "not_found": [...]}.
+    Требует заголовок X-Requested-With, кешируется с ETag/Last-Modified (core/ajax_cache.py).
+    """
+    def get(self, request, *args, **kwargs):
+        if not request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            return FastJsonResponse({"success": False, "error": "Недопустимый запрос"}, status=400)
+
+        raw_ids = request.GET.getlist("master_id") + [
+            value for value in request.GET.get("ids", "").split(",") if value.strip()
+        ]
         try:
-            master = Master.objects.get(pk=master_id)
-            master_data = {
-                "id": master.id,
-                "name": f"{master.first_name} {master.last_name}",
-                "experience": master.experience,
-                "photo": master.photo.url if master.photo else None,
-                "services": list(master.services.values("id", "name", "price")),
-            }
-            return JsonResponse({"success": True, "master": master_data})
-        except Master.DoesNotExist:
-            return JsonResponse({"success": False, "error": "Мастер не найден"}, status=404)
+            # Порядок и дубликаты не влияют на ответ - сортируем для стабильного ключа кеша
+            master_ids = sorted({int(value) for value in raw_ids})
+        except ValueError:
+            return FastJsonResponse({"success": False, "error": "Неверный ID мастера"}, status=400)
+        if not master_ids:
+            return FastJsonResponse({"success": False, "error": "Не указаны ID мастеров"}, status=400)
+        if len(master_ids) > settings.MASTER_INFO_BATCH_MAX:
+            return FastJsonResponse(
+                {"success": False, "error": f"Не больше {settings.MASTER_INFO_BATCH_MAX} мастеров за запрос"},
+                status=400,
+            )
+
+        def build():
+            masters = get_masters_info(master_ids)
+            return {
+                "success": True,
+                "masters": {str(master_id): data for master_id, data in masters.items()},
+                "not_found": [master_id for master_id in master_ids if master_id not in masters],
+            }, 200
+
+        return cached_masters_json(request, "masters_info_batch", master_ids, build)
 
 
 # --- Этап 1: Базовые CBV ---
@@ -434,7 +692,7 @@ class AboutUsView(TemplateView):
         - Заголовок страницы
         - Контактный email
         """
-        context = super().get_context极端的_data(**kwargs)
+        context = super().get_context_data(**kwargs)
         context["company_name"] = "Барбершоп 'Арбуз'"
         context["start_year"] = 2010
         context["current_year"] = datetime.date.today().year
@@ -25,19 +25,16 @@ if (window._orderFormInitialized) {
     };
   }
   // Асинхронная функция для получения услуг мастера по его ID через AJAX
-  // Использует Fetch API для отправки POST-запроса на сервер
+  // Использует Fetch API для отправки GET-запроса на сервер
   async function getServicesByMasterId(masterId, servicesUrl, csrfToken) {
     console.log(`Запрашиваем услуги для мастера с id=${masterId}`);
     try {
-      // Отправляем POST-запрос на сервер Django
-      const response = await fetch(servicesUrl, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json", // Формат данных - JSON
-          "X-CSRFToken": csrfToken, // Защита от CSRF-атак
-        },
-        // Передаём ID мастера в теле запроса
-        body: JSON.stringify({ master_id: masterId }),
+      // GET, а не POST: ответ кешируется браузером, и при повторном выборе мастера
+      // сервер отвечает 304 по ETag, не обращаясь к базе
+      const url = `${servicesUrl}?master_id=${encodeURIComponent(masterId)}`;
+      const response = await fetch(url, {
+        method: "GET",
+        headers: { Accept: "application/json" },
       });
       // Проверяем статус ответа
       if (!response.ok) {
@@ -82,28 +82,15 @@ function initMasterInfoLoader() {
   const masterInfoDiv = document.getElementById("master-info");
 
   if (masterSelect && masterInfoDiv) {
+    // Данные всех мастеров из списка загружаются одним пакетным запросом,
+    // после этого смена мастера в списке не требует запросов к серверу
+    const mastersCache = {};
+    const batchLoaded = prefetchMasters(masterSelect, mastersCache);
+
     masterSelect.addEventListener("change", function () {
       const masterId = this.value;
       if (masterId) {
-        fetch(`/barbershop/api/master-info/?master_id=${masterId}`, {
-          headers: {
-            "X-Requested-With": "XMLHttpRequest",
-          },
-        })
-          .then((response) => response.json())
-          .then((data) => {
-            if (data.success) {
-              displayMasterInfo(data.master);
-            } else {
-              console.error("Ошибка:", data.error);
-              masterInfoDiv.innerHTML = `<div class="alert alert-danger">${data.error}</div>`;
-            }
-          })
-          .catch((error) => {
-            console.error("Ошибка загрузки данных:", error);
-            masterInfoDiv.innerHTML =
-              '<div class="alert alert-danger">Ошибка загрузки данных о мастере</div>';
-          });
+        batchLoaded.then(() => loadMasterInfo(masterId));
       } else {
         masterInfoDiv.innerHTML = "";
       }
@@ -113,6 +100,59 @@ function initMasterInfoLoader() {
     if (masterSelect.value) {
       masterSelect.dispatchEvent(new Event("change"));
     }
+
+    function loadMasterInfo(masterId) {
+      if (mastersCache[masterId]) {
+        displayMasterInfo(mastersCache[masterId]);
+        return;
+      }
+      // Мастера нет в пакетном ответе - запрашиваем его отдельно
+      fetch(`/barbershop/api/master-info/?master_id=${masterId}`, {
+        headers: {
+          "X-Requested-With": "XMLHttpRequest",
+        },
+      })
+        .then((response) => response.json())
+        .then((data) => {
+          if (data.success) {
+            displayMasterInfo(data.master);
+          } else {
+            console.error("Ошибка:", data.error);
+            masterInfoDiv.innerHTML = `<div class="alert alert-danger">${data.error}</div>`;
+          }
+        })
+        .catch((error) => {
+          console.error("Ошибка загрузки данных:", error);
+          masterInfoDiv.innerHTML =
+            '<div class="alert alert-danger">Ошибка загрузки данных о мастере</div>';
+        });
+    }
+  }
+
+  /**
+   * Пакетная загрузка данных мастеров из выпадающего списка (api/masters-info/).
+   * Ошибка не критична - тогда мастер загрузится отдельным запросом при выборе
+   */
+  function prefetchMasters(select, cache) {
+    const ids = Array.from(select.options)
+      .map((option) => option.value)
+      .filter(Boolean)
+      .slice(0, 50); // Ограничение пакета на сервере - MASTER_INFO_BATCH_MAX
+    if (ids.length === 0) {
+      return Promise.resolve();
+    }
+    return fetch(`/barbershop/api/masters-info/?ids=${ids.join(",")}`, {
+      headers: {
+        "X-Requested-With": "XMLHttpRequest",
+      },
+    })
+      .then((response) => response.json())
+      .then((data) => {
+        if (data.success) {
+          Object.assign(cache, data.masters);
+        }
+      })
+      .catch((error) => console.error("Ошибка пакетной загрузки мастеров:", error));
   }
 
   /**